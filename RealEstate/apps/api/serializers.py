@@ -1,8 +1,9 @@
 from rest_framework import serializers
 from django.utils.translation import ugettext as _
 
-from RealEstate.apps.core.models import (House, Homebuyer, Couple, CategoryWeight,
-                                         Grade, Category)
+from RealEstate.apps.core.identity import get_identity
+from RealEstate.apps.core.models import (House, CategoryWeight, Grade,
+                                         Category)
 
 class APIUserSerializer(serializers.Serializer):
 
@@ -16,14 +17,12 @@ class APIUserSerializer(serializers.Serializer):
 
     def validate(self, attrs):
 
-        user = self.context['request'].user
+        request = self.context['request']
 
-        homebuyer = Homebuyer.objects.filter(user=user)
-
-        if not homebuyer:
+        if get_identity(request).homebuyer is None:
             msg = _('Only home buyers are allowed to use this functionality.')
             raise serializers.ValidationError(msg)
-        return user
+        return request.user
 
 class APIHouseSerializer(serializers.ModelSerializer):
 
@@ -70,19 +69,16 @@ class APIHouseParamSerializer(serializers.Serializer):
         return None
 
     def check(self):
-        user = self.context['request'].user
+        couple = get_identity(self.context['request']).couple
         pid = self.data['id']
-        house = House.objects.filter(pk=pid)
+        house = House.objects.filter(pk=pid).values_list('couple_id', flat=True)
 
-        if house.count() < 1:
+        if not house:
             code = 202
             msg = 'House ID invalid'
             return {'code': code, 'message': msg}
 
-        couple = Couple.objects.filter(homebuyer__user=user)
-        houses = House.objects.filter(couple=couple, pk=pid)
-
-        if houses.count() < 1:
+        if couple is None or house[0] != couple.pk:
             code = 203
             msg = 'No such house under current user'
             return {'code': code, 'message': msg}
@@ -111,13 +107,12 @@ class APIHouseFullParamSerializer(APIHouseParamSerializer):
         if d is not None:
             return d
 
-        user = self.context['request'].user
-        couple = Couple.objects.filter(homebuyer__user=user)
+        couple = get_identity(self.context['request']).couple
 
         pcat = self.data['category']
         categ = Category.objects.filter(pk=pcat, couple=couple)
 
-        if categ.count() < 1:
+        if not categ.exists():
             code = 204
             msg = 'No such category under current user'
             return {'code': code, 'message': msg}
@@ -136,8 +131,14 @@ class APICategoryParamSerializer(serializers.Serializer):
 
     def val(self):
 
-        couple = Couple.objects.filter(homebuyer__user=self.context['request'].user)
+        couple = get_identity(self.context['request']).couple
         cat = Category.objects.filter(couple=couple, pk=self.data['category'])
 
-        if cat.count() < 1:
+        if not cat.exists():
                 return {'code': 202, 'message': 'No such category under the user.'}
+
+
+class APIGradeBatchItemSerializer(serializers.Serializer):
+    house = serializers.IntegerField(required=True)
+    category = serializers.IntegerField(required=True)
+    score = serializers.IntegerField(max_value=5, min_value=1, required=True)
@@ -1,3 +1,197 @@
-from django.test import TestCase
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
-# Create your tests here.
+import json
+
+from RealEstate.apps.core.models import Category, Grade, House, HouseScore
+from RealEstate.apps.core.querybudget import QueryBudgetTestMixin
+from RealEstate.apps.core.tests import CoupleTestMixin
+
+
+class APIHouseViewTest(QueryBudgetTestMixin, CoupleTestMixin, TestCase):
+    def setUp(self):
+        super(APIHouseViewTest, self).setUp()
+        self.house = House.objects.create(couple=self.couple, nickname='A')
+        self.category = Category.objects.filter(couple=self.couple).first()
+        self.client.login(email='hb1@test.com', password='password')
+
+    @override_settings(SPARSE_GRADES=True)
+    def test_sparse_grades_read_and_written(self):
+        house = House.objects.create(couple=self.couple, nickname='B')
+        response = self.client.get('/api/houses/', {'id': house.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(c['score'] for c in response.data['category']),
+                         set([3]))
+
+        response = self.client.put(
+            '/api/houses/?id={house}&category={category}&score=5'.format(
+                house=house.id, category=self.category.id))
+        self.assertEqual(response.data['score'], 5)
+        self.assertEqual(
+            Grade.objects.get(house=house, category=self.category).score, 5)
+
+    def test_identity_resolved_once(self):
+        url = '/api/houses/?id={house}'.format(house=self.house.id)
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['category']), 3)
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/categories/')
+        self.assertEqual(len(response.data['category']), 3)
+
+    def test_expand_grades(self):
+        house = House.objects.create(couple=self.couple, nickname='B')
+        Grade.objects.set_scores(self.homebuyers[0], {
+            (house.id, self.category.id): 5})
+        with self.assertNumQueries(6):
+            response = self.client.get('/api/houses/', {'expand': 'grades'})
+        self.assertEqual([h['id'] for h in response.data['house']],
+                         [self.house.id, house.id])
+        for h in response.data['house']:
+            scores = dict((c['id'], c['score']) for c in h['category'])
+            self.assertEqual(len(scores), 3)
+            self.assertEqual(scores.pop(self.category.id),
+                             5 if h['id'] == house.id else 3)
+            self.assertEqual(set(scores.values()), set([3]))
+        self.assertWithinQueryBudget(response, 'APIHouseView')
+
+    def test_within_query_budget(self):
+        self.assertWithinQueryBudget(
+            self.client.get('/api/houses/', {'id': self.house.id}),
+            'APIHouseView')
+        self.assertWithinQueryBudget(self.client.get('/api/categories/'),
+                                     'APICategoryView')
+
+    def test_not_modified(self):
+        for url in ('/api/houses/', '/api/categories/'):
+            etag = self.client.get(url)['ETag']
+            with self.assertNumQueries(3):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+        House.objects.create(couple=self.couple, nickname='B')
+        response = self.client.get('/api/houses/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['house']), 2)
+
+
+class APIGradeBatchViewTest(CoupleTestMixin, TestCase):
+    def setUp(self):
+        super(APIGradeBatchViewTest, self).setUp()
+        self.houses = [House.objects.create(couple=self.couple, nickname=n)
+                       for n in ('A', 'B')]
+        self.categories = list(Category.objects.filter(couple=self.couple))
+        other_couple, _ = self._create_couple(prefix='other')
+        self.other_house = House.objects.create(couple=other_couple,
+                                                nickname='X')
+        self.client.login(email='hb1@test.com', password='password')
+
+    def _post(self, items):
+        return self.client.post('/api/grades/batch/', json.dumps(items),
+                                content_type='application/json')
+
+    def test_batch(self):
+        items = [{'house': house.id, 'category': category.id, 'score': 5}
+                 for house in self.houses for category in self.categories]
+        items.append({'house': self.other_house.id,
+                      'category': self.categories[0].id, 'score': 1})
+        items.append({'house': self.houses[0].id, 'category': 0, 'score': 1})
+        items.append({'house': self.houses[0].id, 'score': 9})
+        response = self._post(items)
+
+        self.assertEqual(response.status_code, 200)
+        codes = [result['code'] for result in response.data['results']]
+        self.assertEqual(codes, [101] * 6 + [203, 204, 300])
+        self.assertEqual(
+            set(Grade.objects.filter(homebuyer=self.homebuyers[0])
+                .values_list('score', flat=True)), set([5]))
+        self.assertEqual(
+            set(Grade.objects.filter(homebuyer=self.homebuyers[1])
+                .values_list('score', flat=True)), set([3]))
+        self.assertEqual(HouseScore.objects.rebuild(dry_run=True), [])
+
+    def test_query_count_independent_of_batch_size(self):
+        self.houses.extend(
+            House.objects.create(couple=self.couple, nickname=str(n))
+            for n in range(9))
+        # Scores are written with one UPDATE per distinct score, and house
+        # scores with one per distinct change to a house's sum, so both
+        # batches score two categories of each of their houses the same.
+        items = [{'house': house.id, 'category': category.id, 'score': 2}
+                 for house in self.houses for category in self.categories[:2]]
+        counts = []
+        for batch in (items[:2], items[2:22]):
+            with CaptureQueriesContext(connection) as queries:
+                response = self._post(batch)
+            self.assertEqual([result['code'] for result
+                              in response.data['results']],
+                             [101] * len(batch))
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+@override_settings(SYNC_CURSOR_LAG=0)
+class APISyncViewTest(QueryBudgetTestMixin, CoupleTestMixin, TestCase):
+    def setUp(self):
+        super(APISyncViewTest, self).setUp()
+        self.houses = [House.objects.create(couple=self.couple, nickname=n)
+                       for n in ('A', 'B')]
+        self.category = Category.objects.filter(couple=self.couple).first()
+        self.client.login(email='hb1@test.com', password='password')
+
+    def _sync(self, since=None):
+        data = {} if since is None else {'since': since}
+        return self.client.get('/api/sync/', data)
+
+    def test_full_then_delta(self):
+        response = self._sync()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['full'])
+        self.assertEqual(len(response.data['houses']), 2)
+        self.assertEqual(len(response.data['grades']), 6)
+        cursor = response.data['cursor']
+
+        response = self._sync(cursor)
+        self.assertFalse(response.data['full'])
+        self.assertEqual(response.data['houses'], [])
+        self.assertEqual(response.data['grades'], [])
+
+        Grade.objects.set_scores(self.homebuyers[0], {
+            (self.houses[0].id, self.category.id): 5})
+        deleted_id = self.houses[1].id
+        self.houses[1].delete()
+        response = self._sync(cursor)
+        self.assertWithinQueryBudget(response, 'APISyncView')
+        self.assertEqual(response.data['grades'], [{
+            'house': self.houses[0].id, 'category': self.category.id,
+            'score': 5}])
+        self.assertEqual(response.data['deleted'],
+                         {'houses': [deleted_id], 'categories': []})
+        self.assertGreaterEqual(response.data['cursor'], cursor)
+
+    def test_bad_cursor(self):
+        future = self._sync().data['cursor'] + 60 * 10 ** 6
+        for since in ('soon', '-1', '300000000000000000', str(future)):
+            response = self._sync(since)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data['code'], 300)
+
+
+@override_settings(LOGIN_THROTTLE_RATES={'ip': (10, 10), 'account': (2, 60)})
+class APIObtainTokenViewTest(CoupleTestMixin, TestCase):
+    def setUp(self):
+        super(APIObtainTokenViewTest, self).setUp()
+        caches['default'].clear()
+
+    def _auth(self, password):
+        return self.client.post('/api/auth/', {'email': 'hb1@test.com',
+                                               'password': password})
+
+    def test_throttled(self):
+        self.assertEqual(self._auth('password').status_code, 200)
+        self.assertEqual(self._auth('wrong').status_code, 400)
+        self.assertEqual(self._auth('wrong').status_code, 400)
+        response = self._auth('password')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
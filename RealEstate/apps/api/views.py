@@ -1,14 +1,52 @@
 from rest_framework_jwt.authentication import JSONWebTokenAuthentication
+from rest_framework_jwt.views import ObtainJSONWebToken
+from rest_framework.exceptions import Throttled
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.utils.decorators import method_decorator
+from django.utils.translation import ugettext as _
+
 from .serializers import (APIUserSerializer, APIHouseSerializer, APIHouseParamSerializer,
                           APIHouseFullParamSerializer, APICategoryWeightSerializer,
-                          APICategoryParamSerializer, APIGradeSerializer)
+                          APICategoryParamSerializer, APIGradeSerializer,
+                          APIGradeBatchItemSerializer)
 from .utils import jwt_payload_handler
 
-from RealEstate.apps.core.models import House, Category, Couple, Grade, CategoryWeight, Homebuyer
+from RealEstate.apps.core.conditional import couple_condition, couple_etag
+from RealEstate.apps.core.identity import get_identity
+from RealEstate.apps.core.models import House, Category, Grade, CategoryWeight
+from RealEstate.apps.core.sync import changes, parse_cursor
+from RealEstate.apps.core.throttling import LoginThrottle
+
+
+def _couple_etag(request, *args, **kwargs):
+    homebuyer = get_identity(request).homebuyer
+    if homebuyer is None:
+        return None
+    # The couple was loaded with the homebuyer, so this costs no query.
+    return couple_etag(request, homebuyer.couple)
+
+
+class APIObtainTokenView(ObtainJSONWebToken):
+    """
+    JWT login, throttled per client IP and per account like the web login.
+    A throttled attempt gets a 429 response with a Retry-After header.
+    """
+    def post(self, request, *args, **kwargs):
+        data = request.data
+        email = data.get('email') if hasattr(data, 'get') else None
+        throttle = LoginThrottle.from_request(request, email)
+        retry_after = throttle.attempt()
+        if retry_after:
+            raise Throttled(wait=retry_after)
+
+        response = super(APIObtainTokenView, self).post(request)
+        if response.status_code == status.HTTP_200_OK:
+            throttle.succeeded()
+        return response
+
 
 class APIUserInfoView(APIView):
     """
@@ -28,30 +66,48 @@ class APIUserInfoView(APIView):
             return Response(response_data)
         return Response({'message': serializer.errors['non_field_errors'][0]}, status=status.HTTP_400_BAD_REQUEST)
 
+
 class APIHouseView(APIView):
     """
     API for listing houses, adding house and getting score of house
     """
     serializer_class = APIHouseSerializer
 
+    '''
+    List houses or get the scores of a house
+    Without an id, lists the houses of the current user's couple; with
+    ?expand=grades each house also carries the user's score in every
+    category, so one request covers all houses.  With an id, returns the
+    user's score for that house in every category.
+    '''
+    @method_decorator(couple_condition(_couple_etag))
     def get(self, request, *args, **kwargs):
         hid = self.request.query_params.get('id', None)
-        user = self.request.user
-        couple = Couple.objects.filter(homebuyer__user=user)
+        identity = get_identity(request)
         serializer = APIUserSerializer(data=request.data, context={'request': self.request})
 
         if not serializer.is_valid():
             return Response({'code': 201, 'message': serializer.errors['non_field_errors'][0]},
                             status=status.HTTP_400_BAD_REQUEST)
 
+        # Grade rows may not exist yet (see settings.SPARSE_GRADES), in
+        # which case the category has the default score.
+        default_score = Grade._meta.get_field('score').default
+
         if hid is None:
 
-            house = House.objects.filter(couple=couple)
+            house = list(House.objects.filter(couple=identity.couple))
 
-            if house.count() < 1:
+            if len(house) < 1:
                 return Response({'code': 202, 'message': 'No house under current user.'},
                                 status=status.HTTP_400_BAD_REQUEST)
 
+            if 'grades' in self.request.query_params.getlist('expand'):
+                category = list(Category.objects.filter(couple=identity.couple))
+                scores = Grade.objects.scores_by_house(identity.homebuyer)
+            else:
+                category = None
+
             houses = []
             for h in house:
                 content = {
@@ -59,6 +115,13 @@ class APIHouseView(APIView):
                     'nickname': h.nickname,
                     'address': h.address
                 }
+                if category is not None:
+                    house_scores = scores.get(h.pk, {})
+                    content['category'] = [{
+                        'id': c.pk,
+                        'summary': c.summary,
+                        'score': house_scores.get(c.pk, default_score)
+                    } for c in category]
                 houses.append(content)
 
             query = {
@@ -74,20 +137,15 @@ class APIHouseView(APIView):
             else:
                 return Response({'code': 300, 'message': 'Format error'}, status=status.HTTP_400_BAD_REQUEST)
 
-            category = Category.objects.filter(couple=couple)
-
-            h = House.objects.filter(pk=hid)
-
+            house = House(pk=paramser.data['id'], couple=identity.couple)
             categories = []
-            for c in category:
-                grade = Grade.objects.filter(category=c, house=h, homebuyer__user=user)
-                if grade.count() > 0:
-                    content = {
-                        'id': c.pk,
-                        'summary': c.summary,
-                        'score': grade[0].score
-                    }
-                    categories.append(content)
+            for c, score in Category.objects.with_scores(identity.homebuyer, house):
+                content = {
+                    'id': c.pk,
+                    'summary': c.summary,
+                    'score': score if score is not None else default_score
+                }
+                categories.append(content)
 
             if len(categories) < 1:
                 return Response({'code': 204, 'message': 'No category under the house.'},
@@ -125,19 +183,18 @@ class APIHouseView(APIView):
         else:
             return Response({'code': 300, 'message': 'Format error'}, status=status.HTTP_400_BAD_REQUEST)
 
-        house = House.objects.filter(pk=hid)
-        category = Category.objects.filter(pk=cat)
-        homebuyer = Homebuyer.objects.filter(user=request.user)
-        grade = Grade.objects.filter(house=house, category=category, homebuyer=homebuyer)
+        homebuyer = get_identity(request).homebuyer
+        grade = Grade.objects.filter(house_id=hid, category_id=cat, homebuyer=homebuyer)
 
         data = {
             'house': hid,
             'category': cat,
-            'homebuyer': homebuyer[0].pk,
+            'homebuyer': homebuyer.pk,
             'score': score
         }
 
-        ser = APIGradeSerializer(instance=grade[0], data=data)
+        # With sparse grades the row is created on the first score.
+        ser = APIGradeSerializer(instance=grade.first(), data=data)
 
         if ser.is_valid():
             c = ser.save()
@@ -158,14 +215,14 @@ class APIHouseView(APIView):
             return Response({'code': 201, 'message': serializer.errors['non_field_errors'][0]},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        couple = Couple.objects.filter(homebuyer__user=request.user)
+        couple = get_identity(request).couple
 
         data = request.data
 
         if 'nickname' not in data or 'address' not in data:
             return Response({'code': 300, 'message': 'Format error'}, status=status.HTTP_400_BAD_REQUEST)
 
-        data['couple'] = couple[0].pk
+        data['couple'] = couple.pk
 
         ser = APIHouseSerializer(data=data)
 
@@ -185,10 +242,12 @@ class APIHouseView(APIView):
             return Response({'code': 202, 'message': ser.errors['non_field_errors'][0]},
                             status=status.HTTP_400_BAD_REQUEST)
 
+
 class APICategoryView(APIView):
     """
     API for listing categories and ranking categories
     """
+    @method_decorator(couple_condition(_couple_etag))
     def get(self, request, *args, **kwargs):
         serializer = APIUserSerializer(data=request.data, context={'request': self.request})
 
@@ -196,21 +255,19 @@ class APICategoryView(APIView):
             return Response({'code': 201, 'message': serializer.errors['non_field_errors'][0]},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        couple = Couple.objects.filter(homebuyer__user=request.user)
-        category = Category.objects.filter(couple=couple)
+        homebuyer = get_identity(request).homebuyer
+        category = Category.objects.with_weights(homebuyer)
 
-        if category.count() < 1:
+        if len(category) < 1:
                 return Response({'code': 202, 'message': 'No category under the user.'},
                                 status=status.HTTP_400_BAD_REQUEST)
 
         categories = []
-        for c in category:
-            cweight = CategoryWeight.objects.filter(homebuyer__user=request.user, category=c)
-
-            if cweight.count() < 1:
+        for c, weight in category:
+            if weight is None:
                 w = 'NAN'
             else:
-                w = cweight[0].weight
+                w = weight
             content = {
                 'id': c.pk,
                 'summary': c.summary,
@@ -243,13 +300,11 @@ class APICategoryView(APIView):
         else:
             return Response({'code': 300, 'message': 'Format error'}, status=status.HTTP_400_BAD_REQUEST)
 
-        cg = Category.objects.filter(pk=cid)
-        cgw = CategoryWeight.objects.filter(category=cg, homebuyer__user=request.user)
-
-        hb = Homebuyer.objects.filter(user=request.user)
+        hb = get_identity(request).homebuyer
+        cgw = CategoryWeight.objects.filter(category_id=cid, homebuyer=hb)
 
         data = {
-            'homebuyer': int(hb[0].pk),
+            'homebuyer': int(hb.pk),
             'category': cid,
             'weight': int(w)
         }
@@ -262,3 +317,90 @@ class APICategoryView(APIView):
         else:
             return Response({'code': 203, 'message': ser.errors['non_field_errors'][0]},
                             status=status.HTTP_400_BAD_REQUEST)
+
+
+class APIGradeBatchView(APIView):
+    """
+    API for grading many house/category pairs in one request
+    """
+
+    '''
+    Grade a batch
+    The request body is a list of {"house": id, "category": id, "score": n}
+    objects.  Ownership of every house/category pair is checked with a
+    single query, then all valid scores are written in one transaction.  If
+    the same pair appears more than once, the last score wins.  The response
+    contains a result for each item, in the order they were sent.
+    '''
+    def post(self, request, *args, **kwargs):
+        homebuyer = get_identity(request).homebuyer
+        if homebuyer is None:
+            msg = _('Only home buyers are allowed to use this functionality.')
+            return Response({'code': 201, 'message': msg},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({'code': 300, 'message': 'Format error'}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = []
+        valid = []
+        for item in items:
+            ser = APIGradeBatchItemSerializer(data=item if isinstance(item, dict) else {})
+            if ser.is_valid():
+                results.append(dict(ser.validated_data))
+                valid.append(results[-1])
+            else:
+                results.append({'code': 300, 'message': 'Format error'})
+
+        # One query returns every (house, category) pair of the batch that
+        # belongs to the homebuyer's couple.
+        pairs = set(
+            House.objects
+            .filter(couple_id=homebuyer.couple_id,
+                    id__in=[item['house'] for item in valid],
+                    couple__category__id__in=[item['category'] for item in valid])
+            .values_list('id', 'couple__category__id'))
+        owned_houses = set(house for house, category in pairs)
+
+        scores = {}
+        for item in valid:
+            key = (item['house'], item['category'])
+            if key in pairs:
+                scores[key] = item['score']
+                item.update({'code': 101, 'message': 'OK'})
+            elif item['house'] not in owned_houses:
+                item.update({'code': 203, 'message': 'No such house under current user'})
+            else:
+                item.update({'code': 204, 'message': 'No such category under current user'})
+
+        Grade.objects.set_scores(homebuyer, scores)
+        return Response({'code': 101, 'message': 'OK', 'results': results})
+
+
+class APISyncView(APIView):
+    """
+    API for syncing the changes since the last sync
+    """
+
+    '''
+    Get changes
+    Returns the houses and categories of the current user's couple, and the
+    user's grades and weights, that changed since the `since` cursor, with
+    the IDs of the houses and categories deleted since then under
+    "deleted".  The response's "cursor" is the `since` to send next time.
+    Without `since`, everything is returned and "full" is true.
+    '''
+    def get(self, request, *args, **kwargs):
+        homebuyer = get_identity(request).homebuyer
+        if homebuyer is None:
+            msg = _('Only home buyers are allowed to use this functionality.')
+            return Response({'code': 201, 'message': msg},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            since = parse_cursor(request.query_params.get('since'))
+        except ValueError:
+            return Response({'code': 300, 'message': 'Format error'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(changes(homebuyer, since))
@@ -0,0 +1 @@
+default_app_config = 'RealEstate.apps.core.apps.CoreConfig'
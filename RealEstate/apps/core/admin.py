@@ -7,8 +7,8 @@ from django.core.urlresolvers import reverse
 from django.utils.html import format_html
 
 from RealEstate.apps.core.models import (Category, CategoryWeight, Couple,
-                                         Grade, Homebuyer, House, Realtor,
-                                         User)
+                                         Grade, Homebuyer, House,
+                                         OutgoingEmail, Realtor, User)
 from RealEstate.apps.core.forms import UserChangeForm, UserCreationForm
 
 admin.site.site_header = "Real Estate Admin"
@@ -148,6 +148,14 @@ class HouseAdmin(BaseAdmin):
     list_display = ('nickname', 'address')
 
 
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(BaseAdmin):
+    list_display = ('subject', 'recipient', 'status', 'attempts',
+                    'created_at', 'sent_at')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'sent_at', 'attempts', 'last_error')
+
+
 @admin.register(Realtor)
 class RealtorAdmin(BaseAdmin):
     list_display = ('__unicode__', 'user_link', 'phone')
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    name = 'RealEstate.apps.core'
+    verbose_name = "Core"
+
+    def ready(self):
+        """
+        Import modules that register signal handlers.
+        """
+        from RealEstate.apps.core import reports, signals  # noqa
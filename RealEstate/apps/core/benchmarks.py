@@ -0,0 +1,245 @@
+"""
+Synthetic benchmark data and a benchmark runner for the pages and API
+endpoints on the hot path.
+
+seed() fills the database with realtors, couples, houses, categories and a
+fully graded matrix, using bulk inserts throughout.  Every seeded user has
+an @benchmark.invalid address, so a seed can be told apart from real data
+and removed again with clear().
+
+run() logs in as a seeded realtor and homebuyer and requests each page a
+number of times through the test client, recording the status code, the
+number of queries and the time taken for every request.  Used by the
+seed_benchmark and run_benchmarks management commands.
+"""
+import datetime
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from RealEstate.apps.core import models as core_models
+from RealEstate.apps.core.models import (Category, CategoryWeight, Couple,
+                                         Grade, Homebuyer, House, HouseScore,
+                                         Realtor, User, grade_matrix_changed)
+
+__all__ = ['BENCHMARKS', 'clear', 'run', 'seed']
+
+_DOMAIN = '@benchmark.invalid'
+_REALTOR_EMAIL = 'seed-realtor-{r}' + _DOMAIN
+_HOMEBUYER_EMAIL = 'seed-homebuyer-{r}-{c}-{n}' + _DOMAIN
+
+# (name, role, url) for each benchmark.  The url is formatted with the
+# couple and house being used.
+BENCHMARKS = (
+    ('dashboard-realtor', 'realtor', '/dashboard/'),
+    ('dashboard-homebuyer', 'homebuyer', '/dashboard/'),
+    ('report', 'homebuyer', '/report/{couple_id}/'),
+    ('eval', 'homebuyer', '/eval/{house_id}/'),
+    ('categories', 'homebuyer', '/categories/'),
+    ('api-houses', 'homebuyer', '/api/houses/'),
+    ('api-categories', 'homebuyer', '/api/categories/'),
+)
+
+
+def _seeded_users():
+    return User.objects.filter(email__startswith='seed-',
+                               email__endswith=_DOMAIN)
+
+
+def clear():
+    """
+    Deletes all seeded data.  Returns the number of users deleted.
+    """
+    users = _seeded_users()
+    count = users.count()
+    couple_ids = list(Couple.objects.filter(realtor__user__in=users)
+                      .values_list('id', flat=True))
+    with transaction.atomic():
+        # The grade matrix is deleted with one statement per table.  A plain
+        # delete() would load every row and send post_delete for it, which
+        # looks up the couple of each Grade and rebuilds the HouseScore rows
+        # for each Category; the matrix is gone wholesale here, so the only
+        # follow-up needed is dropping the cached reports.
+        for model, field in ((HouseScore, 'couple_id'),
+                             (Grade, 'homebuyer__couple_id'),
+                             (CategoryWeight, 'homebuyer__couple_id'),
+                             (House, 'couple_id'),
+                             (Category, 'couple_id')):
+            model.objects.filter(**{field + '__in': couple_ids}) \
+                ._raw_delete(connection.alias)
+        for couple_id in couple_ids:
+            grade_matrix_changed.send(sender=Grade, couple_id=couple_id)
+        Couple.objects.filter(id__in=couple_ids).delete()
+        users.delete()
+    return count
+
+
+def _category_summaries(count):
+    summaries = sorted(category['summary']
+                       for category in core_models._CATEGORIES.values())
+    summaries.extend('Category {n}'.format(n=n)
+                     for n in xrange(len(summaries), count))
+    return summaries[:count]
+
+
+def _seed_realtor(r, couples, houses, categories, password, rng):
+    """
+    Creates one realtor and their couples.  The rows are inserted table by
+    table with bulk_create, which returns no IDs on every backend, so each
+    table is read back by its parent IDs before the next one is built.
+    """
+    realtor_user = User(email=_REALTOR_EMAIL.format(r=r), password=password,
+                        first_name='Realtor{r}'.format(r=r),
+                        last_name='Benchmark', email_confirmed=True)
+    realtor_user.save()
+    realtor = Realtor.objects.create(user=realtor_user)
+
+    # bulk_create skips Couple's post_save, so no default categories.
+    Couple.objects.bulk_create(Couple(realtor=realtor)
+                               for _ in xrange(couples))
+    couple_ids = list(realtor.couple_set.order_by('id')
+                      .values_list('id', flat=True))
+
+    User.objects.bulk_create(
+        User(email=_HOMEBUYER_EMAIL.format(r=r, c=c, n=n), password=password,
+             first_name='Homebuyer{c}{n}'.format(c=c, n=n),
+             last_name='Benchmark', email_confirmed=True)
+        for c in xrange(couples) for n in (1, 2))
+    user_ids = dict(User.objects.filter(
+        email__startswith='seed-homebuyer-{r}-'.format(r=r),
+        email__endswith=_DOMAIN).values_list('email', 'id'))
+    Homebuyer.objects.bulk_create(
+        Homebuyer(couple_id=couple_id,
+                  user_id=user_ids[_HOMEBUYER_EMAIL.format(r=r, c=c, n=n)])
+        for c, couple_id in enumerate(couple_ids) for n in (1, 2))
+
+    summaries = _category_summaries(categories)
+    Category.objects.bulk_create(
+        Category(couple_id=couple_id, summary=summary)
+        for couple_id in couple_ids for summary in summaries)
+    House.objects.bulk_create(
+        House(couple_id=couple_id, nickname='House {n}'.format(n=n),
+              address='{n} Benchmark Way'.format(n=n))
+        for couple_id in couple_ids for n in xrange(houses))
+
+    def _ids_by_couple(model):
+        ids = dict((couple_id, []) for couple_id in couple_ids)
+        for pk, couple_id in (model.objects.filter(couple_id__in=couple_ids)
+                              .order_by('id')
+                              .values_list('id', 'couple_id')):
+            ids[couple_id].append(pk)
+        return ids
+
+    homebuyer_ids = _ids_by_couple(Homebuyer)
+    category_ids = _ids_by_couple(Category)
+    house_ids = _ids_by_couple(House)
+    for couple_id in couple_ids:
+        CategoryWeight.objects.bulk_create(
+            CategoryWeight(homebuyer_id=homebuyer_id, category_id=category_id,
+                           weight=rng.randint(1, 5))
+            for homebuyer_id in homebuyer_ids[couple_id]
+            for category_id in category_ids[couple_id])
+        Grade.objects.bulk_create(
+            Grade(homebuyer_id=homebuyer_id, house_id=house_id,
+                  category_id=category_id, score=rng.randint(1, 5))
+            for homebuyer_id in homebuyer_ids[couple_id]
+            for house_id in house_ids[couple_id]
+            for category_id in category_ids[couple_id])
+    homebuyers = Homebuyer.objects.filter(couple_id__in=couple_ids)
+    Homebuyer.objects.sync_category_weight_totals(homebuyers)
+    HouseScore.objects.rebuild(homebuyers=homebuyers)
+
+
+def seed(realtors, couples, houses, categories, password, seed=0):
+    """
+    Creates `realtors` realtors with `couples` registered couples each.
+    Every couple gets `houses` houses and `categories` categories, and both
+    homebuyers grade every house in every category with a random score.
+    All seeded users can log in with `password`.  Each realtor is created
+    in its own transaction, so memory use does not grow with `realtors`.
+    """
+    rng = random.Random(seed)
+    # Hashing is slow on purpose, so hash the shared password once.
+    password = make_password(password)
+    for r in xrange(realtors):
+        with transaction.atomic():
+            _seed_realtor(r, couples, houses, categories, password, rng)
+
+
+def _counts():
+    return {
+        'realtors': Realtor.objects.count(),
+        'couples': Couple.objects.count(),
+        'homebuyers': Homebuyer.objects.count(),
+        'houses': House.objects.count(),
+        'categories': Category.objects.count(),
+        'grades': Grade.objects.count(),
+    }
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def run(password, repeat=5, realtor_email=None):
+    """
+    Runs every benchmark `repeat` times against the first seeded realtor
+    (or `realtor_email`), one of their couples and that couple's first
+    homebuyer and house.  Returns a dict that can be dumped as JSON.  The
+    first request of each benchmark is reported separately, since it is
+    the one that fills any caches.
+    """
+    realtor = Realtor.objects.select_related('user').get(
+        user__email=realtor_email or _REALTOR_EMAIL.format(r=0))
+    couple = realtor.couple_set.order_by('id')[0]
+    homebuyer = couple.homebuyer_set.select_related('user').order_by('id')[0]
+    house = couple.house_set.order_by('id')[0]
+    urls = {'couple_id': couple.id, 'house_id': house.id}
+
+    clients = {}
+    for role, user in (('realtor', realtor.user),
+                       ('homebuyer', homebuyer.user)):
+        clients[role] = Client()
+        if not clients[role].login(email=user.email, password=password):
+            raise ValueError("Cannot log in as {email}.".format(
+                email=user.email))
+
+    results = []
+    for name, role, url in BENCHMARKS:
+        url = url.format(**urls)
+        runs = []
+        for _ in xrange(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.time()
+                response = clients[role].get(url)
+                elapsed = time.time() - start
+            runs.append({'status': response.status_code,
+                         'queries': len(queries),
+                         'ms': round(elapsed * 1000, 2)})
+        times = [each['ms'] for each in runs]
+        results.append({
+            'name': name,
+            'role': role,
+            'url': url,
+            'first': runs[0],
+            'runs': runs,
+            'min_ms': min(times),
+            'median_ms': _median(times),
+            'max_ms': max(times),
+        })
+
+    return {
+        'timestamp': datetime.datetime.utcnow().isoformat() + 'Z',
+        'database': connection.vendor,
+        'repeat': repeat,
+        'counts': _counts(),
+        'benchmarks': results,
+    }
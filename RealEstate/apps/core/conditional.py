@@ -0,0 +1,50 @@
+"""
+Conditional GET for responses built from one couple's data.  Every change
+to the couple's homebuyers, houses, categories, grades or weights bumps
+Couple.version (see signals.py), so the version, with the user the response
+was built for, identifies the response body: couple_etag() turns them into
+a strong ETag without loading anything else.
+
+couple_condition() wraps a view with Django's condition(), so a request
+whose If-None-Match still matches gets a 304 without the view running.
+The responses are also marked private and no-cache, so browsers and
+clients revalidate every time instead of guessing how long they are fresh.
+"""
+import hashlib
+from functools import wraps
+
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+__all__ = ['couple_condition', 'couple_etag']
+
+
+def couple_etag(request, couple, *extra):
+    """
+    Returns the ETag for a response about the couple, built for the
+    request's user, or None if couple is None.  Any `extra` values the
+    response also depends on are folded in.
+    """
+    if couple is None:
+        return None
+    parts = [couple.id, couple.version, request.user.pk] + list(extra)
+    return hashlib.sha1(u':'.join(map(unicode, parts))
+                        .encode('utf-8')).hexdigest()
+
+
+def couple_condition(etag_func):
+    """
+    View decorator: answers If-None-Match with 304 when etag_func, called
+    with the view's arguments, returns the ETag the client already has.
+    """
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func)(view)
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.has_header('ETag'):
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return inner
+    return decorator
@@ -0,0 +1,132 @@
+"""
+Streaming exports of Grade and CategoryWeight rows, joined with the names
+of the house, category and homebuyer they belong to.  Rows are read in
+fixed-size batches keyed on ID and written out one line at a time, so
+memory use stays constant no matter how many rows are exported.  Used by
+ExportView and the export_grades management command.
+
+Exports can be limited to a realtor, a couple, and rows last updated in a
+[since, until) window.
+"""
+import csv
+import datetime
+import json
+from collections import OrderedDict
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from RealEstate.apps.core.models import CategoryWeight, Grade
+
+__all__ = ['EXPORTS', 'FORMATS', 'export_lines', 'parse_moment']
+
+
+# (column name, values_list lookup) for each export.
+EXPORTS = {
+    'grades': (Grade, (
+        ('id', 'id'),
+        ('couple', 'homebuyer__couple_id'),
+        ('homebuyer', 'homebuyer__user__email'),
+        ('house_id', 'house_id'),
+        ('house', 'house__nickname'),
+        ('category_id', 'category_id'),
+        ('category', 'category__summary'),
+        ('score', 'score'),
+    )),
+    'weights': (CategoryWeight, (
+        ('id', 'id'),
+        ('couple', 'homebuyer__couple_id'),
+        ('homebuyer', 'homebuyer__user__email'),
+        ('category_id', 'category_id'),
+        ('category', 'category__summary'),
+        ('weight', 'weight'),
+    )),
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+_BATCH_SIZE = 2000
+
+
+class _Echo(object):
+    """
+    File-like object that hands back what csv.writer writes to it, so each
+    row can be yielded as soon as it is formatted.
+    """
+    def write(self, value):
+        return value
+
+
+def parse_moment(value):
+    """
+    Returns the aware datetime for an ISO 8601 date or date and time.  A
+    date is the start of that day, and times without an offset are in the
+    current time zone.  Raises ValueError if the value is neither.
+    """
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(
+                "Expected a date or date and time: {value}".format(
+                    value=value))
+        moment = datetime.datetime.combine(day, datetime.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _rows(kind, realtor=None, couple=None, since=None, until=None,
+          batch_size=_BATCH_SIZE):
+    """
+    Yields value tuples for the export, batch by batch in ID order.  Each
+    batch is its own query with an id > last-seen filter, so the database
+    driver never holds more than one batch either.
+    """
+    model, columns = EXPORTS[kind]
+    queryset = model.objects.order_by('id')
+    if realtor is not None:
+        queryset = queryset.filter(homebuyer__couple__realtor=realtor)
+    if couple is not None:
+        queryset = queryset.filter(homebuyer__couple=couple)
+    if since is not None:
+        queryset = queryset.filter(updated_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(updated_at__lt=until)
+    lookups = [lookup for _, lookup in columns]
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id)
+                     .values_list(*lookups)[:batch_size])
+        for row in batch:
+            yield row
+        if len(batch) < batch_size:
+            return
+        last_id = batch[-1][0]
+
+
+def export_lines(kind, format, realtor=None, couple=None, since=None,
+                 until=None):
+    """
+    Yields the export one line at a time: a header row and one row per
+    record for CSV, one JSON object per record for NDJSON.  since and until
+    are datetimes; only rows updated at or after since, and before until,
+    are exported.
+    """
+    names = [name for name, _ in EXPORTS[kind][1]]
+    rows = _rows(kind, realtor=realtor, couple=couple, since=since,
+                 until=until)
+    if format == 'ndjson':
+        for row in rows:
+            yield json.dumps(OrderedDict(zip(names, row))) + '\n'
+        return
+
+    writer = csv.writer(_Echo())
+    yield writer.writerow(names)
+    for row in rows:
+        yield writer.writerow([
+            value.encode('utf-8') if isinstance(value, unicode) else value
+            for value in row])
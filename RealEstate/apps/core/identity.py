@@ -0,0 +1,96 @@
+"""
+Per-request cache of who the current user is.  Resolving user -> role ->
+couple -> homebuyers used to be repeated by every view, permission check and
+API serializer that touched a request; RequestIdentity does it once, on first
+use, and every later lookup in the same request is free.
+
+RequestIdentityMiddleware attaches a RequestIdentity to each request as
+``request.identity``.  DRF requests proxy attribute access to the wrapped
+HttpRequest, so ``request.identity`` works in API views and serializers too.
+"""
+from RealEstate.apps.core.models import User
+
+__all__ = ['RequestIdentity', 'RequestIdentityMiddleware', 'get_identity']
+
+
+class RequestIdentity(object):
+    """
+    Lazily resolves the role, couple and homebuyers of the request's user.
+    The user is read from the request on each access and the cached values
+    are dropped if it changes, e.g. when DRF authenticates a JWT after the
+    middleware has run.
+    """
+    def __init__(self, request):
+        self._request = request
+        self._user_id = None
+        self._cache = {}
+
+    def _get(self, name, load):
+        user = getattr(self._request, 'user', None)
+        user_id = user.pk if user is not None else None
+        if user_id != self._user_id:
+            self._cache = {}
+            self._user_id = user_id
+        if name not in self._cache:
+            self._cache[name] = load(user_id) if user_id else None
+        return self._cache[name]
+
+    @property
+    def role(self):
+        """
+        The Homebuyer or Realtor instance of the user, or None.  Both roles
+        and the homebuyer's couple are fetched with the user in one query.
+        """
+        return self._get('role', lambda user_id: (
+            User.objects.select_related('homebuyer__couple', 'realtor')
+            .get(pk=user_id).role_object))
+
+    @property
+    def homebuyer(self):
+        role = self.role
+        return role if role and role.role_type == 'Homebuyer' else None
+
+    @property
+    def realtor(self):
+        role = self.role
+        return role if role and role.role_type == 'Realtor' else None
+
+    @property
+    def couple(self):
+        """
+        The couple of the user if they are a homebuyer, otherwise None.
+        """
+        homebuyer = self.homebuyer
+        return homebuyer.couple if homebuyer else None
+
+    @property
+    def homebuyers(self):
+        """
+        Both homebuyers of the user's couple, with their users loaded.
+        """
+        couple = self.couple
+        if couple is None:
+            return []
+        return self._get('homebuyers', lambda user_id: list(
+            couple.homebuyer_set.select_related('user')))
+
+
+def get_identity(request):
+    """
+    Returns the RequestIdentity attached to the request, attaching one first
+    if the middleware has not run (e.g. for requests built by hand in tests).
+    """
+    request = getattr(request, '_request', request)
+    identity = getattr(request, 'identity', None)
+    if identity is None:
+        identity = request.identity = RequestIdentity(request)
+    return identity
+
+
+class RequestIdentityMiddleware(object):
+    """
+    Attaches a RequestIdentity to every request.  Must come after
+    AuthenticationMiddleware.
+    """
+    def process_request(self, request):
+        request.identity = RequestIdentity(request)
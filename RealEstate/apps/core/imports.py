@@ -0,0 +1,130 @@
+"""
+Bulk import of houses from CSV or JSON.  Each row names a couple ID, a
+nickname and an optional address.  Rows are validated in Python, checked
+against the couples the importer may use and against existing houses with
+one query each, and the valid rows are inserted with bulk_create in a
+single transaction.  The grade matrix of each affected couple is filled
+once at the end, rather than once per house as House.save() would.
+"""
+import csv
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from RealEstate.apps.core.models import (Couple, Grade, House,
+                                         grade_matrix_changed)
+
+__all__ = ['HouseImport', 'parse_house_rows']
+
+_FIELDS = ('couple', 'nickname', 'address')
+
+
+def parse_house_rows(data, format):
+    """
+    Returns a list of row dicts from CSV text with a header row, or a JSON
+    list of objects.  Raises ValueError if the data cannot be parsed.
+    """
+    if format == 'json':
+        rows = json.loads(data)
+        if not isinstance(rows, list) or not all(
+                isinstance(row, dict) for row in rows):
+            raise ValueError("Expected a JSON list of objects.")
+        return rows
+    if format == 'csv':
+        # Line ends are kept, so newlines inside quoted fields survive.
+        reader = csv.DictReader(data.splitlines(True))
+        if not reader.fieldnames or not set(_FIELDS[:2]).issubset(
+                reader.fieldnames):
+            raise ValueError("CSV header must include couple and nickname.")
+        # Fields past the header end up in a list under the None key, which
+        # HouseImport reports as an error for the row.
+        return [{key: value.decode('utf-8') if isinstance(value, str)
+                 else value
+                 for key, value in row.items()} for row in reader]
+    raise ValueError("Unknown format: {format}".format(format=format))
+
+
+class HouseImport(object):
+    """
+    Imports houses for the couples of a realtor, or for any couple if no
+    realtor is given.  run() returns (number of houses created, errors),
+    where errors is a list of {'row': <1-based row number>, 'errors': [...]}
+    for each row that was not imported.
+    """
+    def __init__(self, rows, realtor=None):
+        self.rows = rows
+        self.realtor = realtor
+
+    def _clean(self, row):
+        """
+        Returns a validated, unsaved House for the row.  Raises
+        ValidationError with the row's problems otherwise.
+        """
+        if row.get(None):
+            raise ValidationError("Row has more fields than the header.")
+        try:
+            couple_id = int(row.get('couple'))
+        except (TypeError, ValueError):
+            raise ValidationError("Couple must be an ID.")
+        for field in _FIELDS[1:]:
+            value = row.get(field)
+            if value is not None and not isinstance(value, basestring):
+                raise ValidationError(u"{field}: must be text.".format(
+                    field=field))
+        house = House(couple_id=couple_id,
+                      nickname=row.get('nickname') or '',
+                      address=row.get('address') or '')
+        try:
+            # The couple is checked for all rows at once in run().
+            house.clean_fields(exclude=['couple'])
+        except ValidationError as e:
+            raise ValidationError([
+                u"{field}: {message}".format(field=field, message=message)
+                for field, messages in sorted(e.message_dict.items())
+                for message in messages])
+        return house
+
+    def run(self):
+        results = []
+        houses = []
+        for number, row in enumerate(self.rows, 1):
+            result = {'row': number, 'errors': []}
+            results.append(result)
+            try:
+                houses.append((result, self._clean(row)))
+            except ValidationError as e:
+                result['errors'] = e.messages
+
+        couples = (self.realtor.couple_set if self.realtor
+                   else Couple.objects.all())
+        couple_ids = set(
+            couples.filter(id__in=set(h.couple_id for _, h in houses))
+            .order_by().values_list('id', flat=True))
+        taken = set(
+            House.objects.filter(couple_id__in=couple_ids,
+                                 nickname__in=set(h.nickname
+                                                  for _, h in houses))
+            .order_by().values_list('couple_id', 'nickname'))
+
+        new_houses = []
+        for result, house in houses:
+            key = (house.couple_id, house.nickname)
+            if house.couple_id not in couple_ids:
+                result['errors'] = ["No such couple."]
+            elif key in taken:
+                result['errors'] = [u"House '{nickname}' already exists."
+                                    .format(nickname=house.nickname)]
+            else:
+                taken.add(key)
+                new_houses.append(house)
+
+        with transaction.atomic():
+            House.objects.bulk_create(new_houses)
+            # bulk_create sends no post_save signals, so fill each couple's
+            # grade matrix here, once.
+            for couple_id in sorted(set(h.couple_id for h in new_houses)):
+                Couple(id=couple_id).fill_grade_matrix()
+                grade_matrix_changed.send(sender=Grade, couple_id=couple_id)
+        return (len(new_houses),
+                [result for result in results if result['errors']])
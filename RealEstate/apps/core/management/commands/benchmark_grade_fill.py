@@ -0,0 +1,87 @@
+"""
+Time Couple.fill_grade_matrix() at increasing couple sizes.
+
+python manage.py benchmark_grade_fill [--sizes 25x5,50x10,100x20,200x30]
+
+Everything is created inside a transaction that is rolled back afterwards,
+so this is safe to run against a development database.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from RealEstate.apps.core.models import (Category, Couple, Homebuyer, House,
+                                         Realtor, User)
+
+_DEFAULT_SIZES = '25x5,50x10,100x20,200x30'
+
+
+class Command(BaseCommand):
+    help = ("Benchmark filling the Grade/CategoryWeight matrix for a couple "
+            "with HOUSESxCATEGORIES houses and categories.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default=_DEFAULT_SIZES,
+                            help="Comma separated HOUSESxCATEGORIES sizes "
+                                 "(default: {0}).".format(_DEFAULT_SIZES))
+
+    def _parse_sizes(self, sizes):
+        try:
+            return [tuple(int(n) for n in size.split('x'))
+                    for size in sizes.split(',')]
+        except ValueError:
+            raise CommandError("Sizes must look like 200x30.")
+
+    def _create_couple(self, label):
+        def _user(name):
+            return User.objects.create_user(
+                email='{name}-{label}@benchmark.invalid'.format(name=name,
+                                                               label=label),
+                first_name=name, last_name='Benchmark')
+
+        realtor = Realtor.objects.create(user=_user('realtor'))
+        couple = Couple.objects.create(realtor=realtor)
+        for name in ('first', 'second'):
+            Homebuyer.objects.create(user=_user(name), couple=couple)
+        return couple
+
+    def _time(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.time()
+            func()
+            elapsed = time.time() - start
+        return elapsed, len(queries)
+
+    def handle(self, *args, **options):
+        sizes = self._parse_sizes(options['sizes'])
+        self.stdout.write("{0:>7} {1:>11} {2:>7} {3:>12} {4:>8} {5:>12} {6:>8}"
+                          .format('houses', 'categories', 'grades',
+                                  'full fill s', 'queries', 'add house s',
+                                  'queries'))
+        for houses, categories in sizes:
+            with transaction.atomic():
+                couple = self._create_couple('{0}x{1}'.format(houses,
+                                                              categories))
+                # bulk_create skips the post_save fill, so the whole matrix
+                # is created by the timed call below.
+                Category.objects.bulk_create(
+                    Category(couple=couple, summary='Category {0}'.format(n))
+                    for n in xrange(categories))
+                House.objects.bulk_create(
+                    House(couple=couple, nickname='House {0}'.format(n))
+                    for n in xrange(houses))
+
+                fill_time, fill_queries = self._time(couple.fill_grade_matrix)
+                grades = couple.homebuyer_set.count() * houses * (
+                    couple.category_set.count())
+                add_time, add_queries = self._time(
+                    lambda: House.objects.create(couple=couple,
+                                                 nickname='One more'))
+                transaction.set_rollback(True)
+
+            self.stdout.write(
+                "{0:>7} {1:>11} {2:>7} {3:>12.3f} {4:>8} {5:>12.3f} {6:>8}"
+                .format(houses, categories, grades, fill_time, fill_queries,
+                        add_time, add_queries))
@@ -0,0 +1,45 @@
+"""
+Export Grade or CategoryWeight rows as CSV or NDJSON.
+
+python manage.py export_grades [--weights] [--format csv|ndjson]
+                               [--realtor ID] [--couple ID]
+                               [--since DATE] [--until DATE] [--output FILE]
+"""
+from django.core.management.base import BaseCommand
+
+from RealEstate.apps.core.exports import FORMATS, export_lines, parse_moment
+
+
+class Command(BaseCommand):
+    help = ("Stream Grade rows (or CategoryWeight rows with --weights), "
+            "joined with house, category and homebuyer names, to stdout or "
+            "a file.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--weights', action='store_true', default=False,
+                            help="Export category weights instead of grades.")
+        parser.add_argument('--format', choices=sorted(FORMATS),
+                            default='csv', help="Output format.")
+        parser.add_argument('--realtor', type=int,
+                            help="Only couples of this realtor ID.")
+        parser.add_argument('--couple', type=int,
+                            help="Only this couple ID.")
+        parser.add_argument('--since', type=parse_moment,
+                            help="Only rows updated at or after this ISO "
+                                 "date or date and time.")
+        parser.add_argument('--until', type=parse_moment,
+                            help="Only rows updated before this ISO date or "
+                                 "date and time.")
+        parser.add_argument('--output', help="Write to this file.")
+
+    def handle(self, *args, **options):
+        lines = export_lines('weights' if options['weights'] else 'grades',
+                             options['format'], realtor=options['realtor'],
+                             couple=options['couple'], since=options['since'],
+                             until=options['until'])
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,45 @@
+"""
+Import houses from a CSV or JSON file.
+
+python manage.py import_houses FILE [--format csv|json] [--realtor ID]
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from RealEstate.apps.core.imports import HouseImport, parse_house_rows
+from RealEstate.apps.core.models import Realtor
+
+
+class Command(BaseCommand):
+    help = ("Create houses from a file of (couple, nickname, address) rows. "
+            "CSV files need a header row; JSON files hold a list of "
+            "objects.  Rows with errors are reported and skipped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="CSV or JSON file to import.")
+        parser.add_argument('--format', choices=('csv', 'json'),
+                            help="File format (default: from the extension).")
+        parser.add_argument('--realtor', type=int,
+                            help="Only allow couples of this realtor ID.")
+
+    def handle(self, *args, **options):
+        path = options['file']
+        format = options['format'] or (
+            'json' if path.lower().endswith('.json') else 'csv')
+        realtor = None
+        if options['realtor']:
+            try:
+                realtor = Realtor.objects.get(id=options['realtor'])
+            except Realtor.DoesNotExist:
+                raise CommandError("No such realtor.")
+        try:
+            with open(path, 'rb') as data:
+                rows = parse_house_rows(data.read(), format)
+        except (IOError, ValueError) as e:
+            raise CommandError(e)
+
+        created, errors = HouseImport(rows, realtor=realtor).run()
+        for error in errors:
+            self.stderr.write("Row {row}: {errors}".format(
+                row=error['row'], errors='; '.join(error['errors'])))
+        self.stdout.write("Created {created} house(s), skipped {skipped}."
+                          .format(created=created, skipped=len(errors)))
@@ -0,0 +1,34 @@
+"""
+Delete Grade rows that only hold the default score.
+
+python manage.py prune_default_grades
+
+Only valid with settings.SPARSE_GRADES, where a missing Grade row is read as
+the default score, so reports and HouseScore aggregates are unaffected.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from RealEstate.apps.core.models import Couple, Grade
+
+
+class Command(BaseCommand):
+    help = ("Delete Grade rows holding the default score.  Requires "
+            "SPARSE_GRADES = True.")
+
+    def handle(self, *args, **options):
+        if not settings.SPARSE_GRADES:
+            raise CommandError("SPARSE_GRADES is off; every house/category "
+                               "combination is expected to have a Grade.")
+
+        default_score = Grade._meta.get_field('score').default
+        total = 0
+        for couple in Couple.objects.all().iterator():
+            grades = Grade.objects.filter(homebuyer__couple=couple,
+                                          score=default_score)
+            count = grades.count()
+            if count:
+                grades.delete()
+                total += count
+        self.stdout.write("Deleted {count} default grade(s).".format(
+            count=total))
@@ -0,0 +1,47 @@
+"""
+Rebuild or verify the denormalized HouseScore aggregates.
+
+python manage.py rebuild_house_scores [--couple ID ...] [--verify]
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from RealEstate.apps.core.models import Homebuyer, HouseScore
+
+
+class Command(BaseCommand):
+    help = ("Recompute HouseScore rows from the Grade and CategoryWeight "
+            "tables.  With --verify, only report rows that are missing or "
+            "out of date.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--couple', type=int, action='append',
+                            dest='couples', default=[],
+                            help="Only this couple ID (may be repeated).")
+        parser.add_argument('--verify', action='store_true', default=False,
+                            help="Report mismatches without writing.")
+
+    def handle(self, *args, **options):
+        homebuyers = Homebuyer.objects.all()
+        if options['couples']:
+            homebuyers = homebuyers.filter(couple_id__in=options['couples'])
+
+        verify = options['verify']
+        mismatches = HouseScore.objects.rebuild(homebuyers=homebuyers,
+                                                dry_run=verify)
+        verbosity = int(options['verbosity'])
+        if verbosity > 1 or verify:
+            for house_id, homebuyer_id, stored, expected in mismatches:
+                self.stdout.write(
+                    "House {house} / Homebuyer {homebuyer}: stored {stored}, "
+                    "expected {expected}".format(
+                        house=house_id, homebuyer=homebuyer_id,
+                        stored='missing' if stored is None else stored,
+                        expected=expected))
+
+        if verify and mismatches:
+            raise CommandError("{count} house score(s) out of date."
+                               .format(count=len(mismatches)))
+        action = "verified" if verify else "rebuilt"
+        self.stdout.write("House scores {action} ({count} fixed)."
+                          .format(action=action,
+                                  count=0 if verify else len(mismatches)))
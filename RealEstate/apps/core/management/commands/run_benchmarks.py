@@ -0,0 +1,53 @@
+"""
+Time the hot pages and API endpoints against seeded benchmark data.
+
+python manage.py run_benchmarks [--repeat N] [--output FILE]
+
+Run seed_benchmark first.  The results are written as JSON so that runs
+before and after a change can be compared.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from RealEstate.apps.core import benchmarks
+from RealEstate.apps.core.models import Realtor
+
+
+class Command(BaseCommand):
+    help = ("Request each benchmarked page several times as a seeded "
+            "realtor or homebuyer, and record queries and timings.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5,
+                            help="Requests per page (default: 5).")
+        parser.add_argument('--realtor',
+                            help="Email of the realtor to benchmark as "
+                                 "(default: the first seeded realtor).")
+        parser.add_argument('--password', default='benchmark',
+                            help="Password of the seeded users.")
+        parser.add_argument('--output', default='benchmark-results.json',
+                            help="JSON file to write the results to.")
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError("--repeat must be at least 1.")
+        try:
+            results = benchmarks.run(options['password'],
+                                     repeat=options['repeat'],
+                                     realtor_email=options['realtor'])
+        except (Realtor.DoesNotExist, IndexError, ValueError) as e:
+            raise CommandError("Cannot run benchmarks, is the database "
+                               "seeded? ({error})".format(error=e))
+
+        with open(options['output'], 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+        self.stdout.write("{0:<22} {1:>7} {2:>8} {3:>10} {4:>10}".format(
+            'benchmark', 'status', 'queries', 'first ms', 'median ms'))
+        for result in results['benchmarks']:
+            self.stdout.write("{0:<22} {1:>7} {2:>8} {3:>10} {4:>10}".format(
+                result['name'], result['first']['status'],
+                result['runs'][-1]['queries'], result['first']['ms'],
+                result['median_ms']))
+        self.stdout.write("Results written to {output}.".format(
+            output=options['output']))
@@ -0,0 +1,50 @@
+"""
+Fill the database with synthetic benchmark data.
+
+python manage.py seed_benchmark [--realtors N] [--couples N] [--houses N]
+                                [--categories N] [--seed N] [--clear]
+
+Seeded users have @benchmark.invalid addresses; use --clear to remove a
+previous seed first.  Run run_benchmarks afterwards to time the pages.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from RealEstate.apps.core import benchmarks
+
+
+class Command(BaseCommand):
+    help = ("Create realtors, couples, houses, categories and a fully "
+            "graded matrix for benchmarking, with bulk inserts.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--realtors', type=int, default=10,
+                            help="Number of realtors (default: 10).")
+        parser.add_argument('--couples', type=int, default=20,
+                            help="Couples per realtor (default: 20).")
+        parser.add_argument('--houses', type=int, default=25,
+                            help="Houses per couple (default: 25).")
+        parser.add_argument('--categories', type=int, default=10,
+                            help="Categories per couple (default: 10).")
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Random seed for the grades and weights.")
+        parser.add_argument('--password', default='benchmark',
+                            help="Password for every seeded user.")
+        parser.add_argument('--clear', action='store_true', default=False,
+                            help="Delete previously seeded data first.")
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.stdout.write("Deleted {count} seeded user(s).".format(
+                count=benchmarks.clear()))
+        elif benchmarks._seeded_users().exists():
+            raise CommandError("The database is already seeded; "
+                               "use --clear to replace the seed.")
+
+        start = time.time()
+        benchmarks.seed(options['realtors'], options['couples'],
+                        options['houses'], options['categories'],
+                        options['password'], seed=options['seed'])
+        self.stdout.write("Seeded in {seconds:.1f}s: {counts}".format(
+            seconds=time.time() - start, counts=benchmarks._counts()))
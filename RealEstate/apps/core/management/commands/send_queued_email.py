@@ -0,0 +1,40 @@
+"""
+Deliver queued OutgoingEmail rows.
+
+python manage.py send_queued_email [--limit N] [--loop [--interval SECONDS]]
+
+Run a single worker at a time; two workers draining the same outbox could
+send an email twice.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from RealEstate.apps.core.models import OutgoingEmail
+
+
+class Command(BaseCommand):
+    help = ("Send the queued emails that are due, over one connection to the "
+            "email backend.  With --loop, keep polling the outbox.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100,
+                            help="Most emails to send per batch.")
+        parser.add_argument('--loop', action='store_true', default=False,
+                            help="Keep running, polling for new emails.")
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        verbosity = int(options['verbosity'])
+        while True:
+            sent, failed = OutgoingEmail.objects.send_queued(
+                limit=options['limit'])
+            if sent or failed or verbosity > 1:
+                self.stdout.write("Sent {sent} email(s), {failed} failed."
+                                  .format(sent=sent, failed=failed))
+            if not options['loop']:
+                break
+            # A full batch means there may be more due right away.
+            if sent + failed < options['limit']:
+                time.sleep(options['interval'])
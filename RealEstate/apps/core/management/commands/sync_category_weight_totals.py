@@ -0,0 +1,45 @@
+"""
+Re-sync or verify the stored Homebuyer.category_weight_total values.
+
+python manage.py sync_category_weight_totals [--couple ID ...] [--verify]
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from RealEstate.apps.core.models import Homebuyer
+
+
+class Command(BaseCommand):
+    help = ("Recompute each homebuyer's category weight total from the "
+            "CategoryWeight table.  With --verify, only report totals that "
+            "are out of date.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--couple', type=int, action='append',
+                            dest='couples', default=[],
+                            help="Only this couple ID (may be repeated).")
+        parser.add_argument('--verify', action='store_true', default=False,
+                            help="Report mismatches without writing.")
+
+    def handle(self, *args, **options):
+        homebuyers = Homebuyer.objects.all()
+        if options['couples']:
+            homebuyers = homebuyers.filter(couple_id__in=options['couples'])
+
+        verify = options['verify']
+        mismatches = Homebuyer.objects.sync_category_weight_totals(
+            homebuyers=homebuyers, dry_run=verify)
+        verbosity = int(options['verbosity'])
+        if verbosity > 1 or verify:
+            for homebuyer_id, stored, expected in mismatches:
+                self.stdout.write(
+                    "Homebuyer {homebuyer}: stored {stored}, expected "
+                    "{expected}".format(homebuyer=homebuyer_id,
+                                        stored=stored, expected=expected))
+
+        if verify and mismatches:
+            raise CommandError("{count} category weight total(s) out of "
+                               "date.".format(count=len(mismatches)))
+        action = "verified" if verify else "synced"
+        self.stdout.write("Category weight totals {action} ({count} fixed)."
+                          .format(action=action,
+                                  count=0 if verify else len(mismatches)))
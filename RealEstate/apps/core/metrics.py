@@ -0,0 +1,359 @@
+"""
+In-process metrics, shared across worker processes through files.
+
+Each process keeps its counters and histograms in memory and writes them
+to its own JSON file in settings.METRICS_DIR, at most once every
+settings.METRICS_FLUSH_INTERVAL seconds and when the process exits.
+Reading the metrics sums the files of every process, including those of
+processes that have since exited, so totals never go backwards when a
+worker is restarted.  Nothing needs to run besides the app itself.
+
+The file names include a random token as well as the PID, so a new
+process that reuses an old PID starts a file of its own.  Reading also
+merges the files of processes that have exited into a single totals file
+and removes them, so the directory does not grow with every restart.
+Whether a process has exited is checked by PID, so the directory must
+not be shared between hosts.
+
+A process only flushes when it records something, so the numbers of an
+idle worker can lag by up to one flush interval.  The directory may be
+emptied whenever every process is stopped; Prometheus treats the drop as
+a counter reset.
+
+MetricsMiddleware records the latency and database time of every request,
+by view; the outbox and the login throttle count their own events.  The
+/metrics/ view serves everything in the Prometheus text format to staff
+users.
+"""
+import atexit
+import errno
+import fcntl
+import glob
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+__all__ = ['Counter', 'Histogram', 'MetricsMiddleware', 'Registry',
+           'registry']
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                    10.0)
+
+_PROCESS_FILE = re.compile(r'^metrics-(\d+)-\w+\.json$')
+
+
+def _exited(pid):
+    """
+    Returns whether no process with the PID is running on this host.
+    """
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.ESRCH
+    return False
+
+
+def _read(path):
+    try:
+        with open(path) as data:
+            return json.load(data)
+    except (IOError, ValueError):
+        # Missing, or the file of a process that died while creating it.
+        return None
+
+
+def _write(path, data):
+    # Written to a temporary file and renamed, so readers never see a
+    # half-written file.
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as output:
+        json.dump(data, output)
+    os.rename(temporary, path)
+
+
+def _add(data, counters, histograms):
+    for key, value in data['counters']:
+        key = tuple(key)
+        counters[key] = counters.get(key, 0) + value
+    for key, values in data['histograms']:
+        key = tuple(key)
+        totals = histograms.setdefault(key, [0] * len(values))
+        histograms[key] = [a + b for a, b in zip(totals, values)]
+
+
+def _dump(counters, histograms):
+    return {
+        'counters': [[list(key), value]
+                     for key, value in counters.items()],
+        'histograms': [[list(key), values]
+                       for key, values in histograms.items()],
+    }
+
+
+class _FileStore(object):
+    """
+    The values recorded by this process, and the file they are flushed to.
+    Counters are stored as {key: value} and histograms as {key: [bucket
+    counts..., sum]}, where key is the metric name and label values.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, 'metrics-{pid}-{token}.json'
+                                 .format(pid=os.getpid(),
+                                         token=uuid.uuid4().hex[:8]))
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.last_flush = 0
+
+    def inc(self, key, amount):
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+        self._maybe_flush()
+
+    def observe(self, key, bucket, buckets, value):
+        with self.lock:
+            values = self.histograms.setdefault(key, [0] * (buckets + 2))
+            values[bucket] += 1
+            values[-1] += value
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if time.time() - self.last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            data = _dump(self.counters, self.histograms)
+            self.last_flush = time.time()
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        _write(self.path, data)
+
+    def collect(self):
+        """
+        Returns the (counters, histograms) of every process, summed.  The
+        files of processes that have exited are merged into the totals file
+        on the way; readers take turns through a lock file, so each file is
+        merged once.
+        """
+        self.flush()
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            return self._merge_and_sum()
+
+    def _merge_and_sum(self):
+        totals_path = os.path.join(self.directory, 'totals.json')
+        totals = _read(totals_path)
+        counters = {}
+        histograms = {}
+        merged = set()
+        if totals is not None:
+            _add(totals, counters, histograms)
+            # Files merged by a reader that stopped before removing them.
+            merged = set(totals['merged'])
+
+        live = []
+        exited = []
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            name = os.path.basename(path)
+            match = _PROCESS_FILE.match(name)
+            if name in merged:
+                os.remove(path)
+            elif match and _exited(int(match.group(1))):
+                data = _read(path)
+                if data is not None:
+                    _add(data, counters, histograms)
+                exited.append(path)
+            else:
+                live.append(path)
+        if exited:
+            data = _dump(counters, histograms)
+            data['merged'] = [os.path.basename(path) for path in exited]
+            _write(totals_path, data)
+            for path in exited:
+                os.remove(path)
+
+        for path in live:
+            data = _read(path)
+            if data is not None:
+                _add(data, counters, histograms)
+        return counters, histograms
+
+
+class _Metric(object):
+    def __init__(self, registry, name, documentation, labels):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError("{name} takes the labels {labels}.".format(
+                name=self.name, labels=', '.join(self.labels)))
+        return (self.name,) + tuple(unicode(labels[label])
+                                    for label in self.labels)
+
+    def _format_labels(self, values, extra=()):
+        pairs = zip(self.labels, values) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(
+            u'{0}="{1}"'.format(label, value.replace('\\', r'\\')
+                                .replace('"', r'\"').replace('\n', r'\n'))
+            for label, value in pairs) + '}'
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry.store().inc(self._key(labels), amount)
+
+    def samples(self, counters, histograms):
+        for key, value in sorted(counters.items()):
+            if key[0] == self.name:
+                yield u'{name}{labels} {value}'.format(
+                    name=self.name, labels=self._format_labels(key[1:]),
+                    value=value)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labels,
+                 buckets=_LATENCY_BUCKETS):
+        super(Histogram, self).__init__(registry, name, documentation,
+                                        labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        bucket = len(self.buckets)
+        for n, bound in enumerate(self.buckets):
+            if value <= bound:
+                bucket = n
+                break
+        self.registry.store().observe(self._key(labels), bucket,
+                                      len(self.buckets), value)
+
+    def samples(self, counters, histograms):
+        bounds = [repr(bound) for bound in self.buckets] + ['+Inf']
+        for key, values in sorted(histograms.items()):
+            if key[0] != self.name:
+                continue
+            cumulative = 0
+            for bound, count in zip(bounds, values[:-1]):
+                cumulative += count
+                yield u'{name}_bucket{labels} {count}'.format(
+                    name=self.name, count=cumulative,
+                    labels=self._format_labels(key[1:], [('le', bound)]))
+            labels = self._format_labels(key[1:])
+            yield u'{name}_sum{labels} {value}'.format(
+                name=self.name, labels=labels, value=values[-1])
+            yield u'{name}_count{labels} {count}'.format(
+                name=self.name, labels=labels, count=cumulative)
+
+
+class Registry(object):
+    """
+    The metrics of the app.  The store is created on first use, for the
+    current settings.METRICS_DIR.
+    """
+    def __init__(self):
+        self.metrics = []
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, documentation, labels=()):
+        metric = Counter(self, name, documentation, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labels=(), **kwargs):
+        metric = Histogram(self, name, documentation, labels, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def store(self):
+        # Keyed by PID too, so that processes forked after the store was
+        # created do not share its file.
+        key = (settings.METRICS_DIR, os.getpid())
+        if key not in self._stores:
+            with self._lock:
+                if key not in self._stores:
+                    self._stores[key] = _FileStore(key[0])
+        return self._stores[key]
+
+    def discard(self, directory):
+        """
+        Drops this process's store for the directory without flushing it,
+        for a directory that is about to be removed; otherwise it would be
+        recreated by the flush when the process exits.
+        """
+        self._stores.pop((directory, os.getpid()), None)
+
+    def flush(self):
+        for (_, pid), store in self._stores.items():
+            if pid == os.getpid():
+                store.flush()
+
+    def exposition(self):
+        """
+        Returns every metric, summed over all processes, in the Prometheus
+        text format.
+        """
+        counters, histograms = self.store().collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append(u'# HELP {name} {documentation}'.format(
+                name=metric.name, documentation=metric.documentation))
+            lines.append(u'# TYPE {name} {kind}'.format(
+                name=metric.name, kind=metric.kind))
+            lines.extend(metric.samples(counters, histograms))
+        return u'\n'.join(lines) + u'\n'
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+REQUEST_LATENCY = registry.histogram(
+    'realestate_request_duration_seconds',
+    "Time taken to handle a request, by view.", ['view'])
+REQUEST_DB_TIME = registry.histogram(
+    'realestate_request_db_seconds',
+    "Time spent in database queries per request, by view.", ['view'])
+EMAILS = registry.counter(
+    'realestate_outgoing_emails_total',
+    "Queued emails sent or failed by the outbox worker.", ['status'])
+LOGIN_THROTTLED = registry.counter(
+    'realestate_login_throttled_total',
+    "Login attempts rejected by the login throttle.")
+
+
+class MetricsMiddleware(object):
+    """
+    Records the latency and database time of each request.  Must come
+    before QueryBudgetMiddleware in MIDDLEWARE_CLASSES: it then times the
+    whole request, and reads the database time from the query stats that
+    QueryBudgetMiddleware leaves on the response.
+    """
+    def process_request(self, request):
+        request._metrics_start = time.time()
+
+    def process_response(self, request, response):
+        start = getattr(request, '_metrics_start', None)
+        if start is None:
+            return response
+        stats = getattr(response, 'query_stats', None)
+        view = stats.view if stats is not None else None
+        view = view or 'unresolved'
+        REQUEST_LATENCY.observe(time.time() - start, view=view)
+        if stats is not None:
+            REQUEST_DB_TIME.observe(stats.db_time, view=view)
+        return response
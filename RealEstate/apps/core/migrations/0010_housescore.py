@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import defaultdict
+
+from django.db import models, migrations
+
+
+def fill_house_scores(apps, schema_editor):
+    """
+    Same sums as HouseScore.objects.rebuild(), which historical models do
+    not have: score * weight over the couple's categories, for every house
+    and homebuyer of a couple, with missing rows counting as the defaults.
+    """
+    Category = apps.get_model('core', 'Category')
+    CategoryWeight = apps.get_model('core', 'CategoryWeight')
+    Grade = apps.get_model('core', 'Grade')
+    Homebuyer = apps.get_model('core', 'Homebuyer')
+    House = apps.get_model('core', 'House')
+    HouseScore = apps.get_model('core', 'HouseScore')
+    default_score = Grade._meta.get_field('score').default
+    default_weight = CategoryWeight._meta.get_field('weight').default
+
+    categories = defaultdict(list)
+    for category_id, couple_id in Category.objects.values_list('id',
+                                                               'couple_id'):
+        categories[couple_id].append(category_id)
+    homebuyers = defaultdict(list)
+    for homebuyer_id, couple_id in Homebuyer.objects.values_list('id',
+                                                                 'couple_id'):
+        homebuyers[couple_id].append(homebuyer_id)
+    weights = dict(
+        ((homebuyer_id, category_id), weight)
+        for homebuyer_id, category_id, weight in (
+            CategoryWeight.objects.order_by()
+            .values_list('homebuyer_id', 'category_id', 'weight')))
+
+    sums = {}
+    for house_id, couple_id in House.objects.values_list('id', 'couple_id'):
+        for homebuyer_id in homebuyers[couple_id]:
+            sums[(house_id, homebuyer_id)] = [couple_id, sum(
+                weights.get((homebuyer_id, category_id), default_weight)
+                for category_id in categories[couple_id]) * default_score]
+    for house_id, homebuyer_id, category_id, score in (
+            Grade.objects.order_by()
+            .values_list('house_id', 'homebuyer_id', 'category_id', 'score')
+            .iterator()):
+        if (house_id, homebuyer_id) in sums:
+            sums[(house_id, homebuyer_id)][1] += (score - default_score) * (
+                weights.get((homebuyer_id, category_id), default_weight))
+
+    HouseScore.objects.bulk_create(
+        HouseScore(couple_id=couple_id, house_id=house_id,
+                   homebuyer_id=homebuyer_id, weighted_sum=weighted_sum)
+        for (house_id, homebuyer_id), (couple_id, weighted_sum)
+        in sums.items())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_auto_20150816_1349'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HouseScore',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('weighted_sum', models.PositiveIntegerField(default=0, verbose_name=b'Weighted Sum')),
+                ('couple', models.ForeignKey(verbose_name=b'Couple', to='core.Couple')),
+                ('homebuyer', models.ForeignKey(verbose_name=b'Homebuyer', to='core.Homebuyer')),
+                ('house', models.ForeignKey(verbose_name=b'House', to='core.House')),
+            ],
+            options={
+                'ordering': ['couple', 'house', 'homebuyer'],
+                'verbose_name': 'House Score',
+                'verbose_name_plural': 'House Scores',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='housescore',
+            unique_together=set([('house', 'homebuyer')]),
+        ),
+        migrations.RunPython(fill_house_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_housescore'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutgoingEmail',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('subject', models.CharField(max_length=255, verbose_name=b'Subject')),
+                ('message', models.TextField(verbose_name=b'Message')),
+                ('from_email', models.CharField(max_length=254, verbose_name=b'From', blank=True)),
+                ('recipient', models.EmailField(max_length=254, verbose_name=b'Recipient')),
+                ('status', models.CharField(default=b'queued', max_length=10, verbose_name=b'Status', choices=[(b'queued', b'Queued'), (b'sent', b'Sent'), (b'failed', b'Failed')])),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name=b'Attempts')),
+                ('last_error', models.TextField(verbose_name=b'Last Error', blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name=b'Created At')),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now, verbose_name=b'Next Attempt', db_index=True)),
+                ('sent_at', models.DateTimeField(null=True, verbose_name=b'Sent At', blank=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'verbose_name': 'Outgoing Email',
+                'verbose_name_plural': 'Outgoing Emails',
+            },
+        ),
+    ]
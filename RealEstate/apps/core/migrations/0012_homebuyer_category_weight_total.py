@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def fill_category_weight_totals(apps, schema_editor):
+    Homebuyer = apps.get_model('core', 'Homebuyer')
+    CategoryWeight = apps.get_model('core', 'CategoryWeight')
+    totals = (CategoryWeight.objects.order_by().values('homebuyer_id')
+              .annotate(total=models.Sum('weight'))
+              .values_list('homebuyer_id', 'total'))
+    for homebuyer_id, total in totals:
+        Homebuyer.objects.filter(id=homebuyer_id).update(
+            category_weight_total=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='homebuyer',
+            name='category_weight_total',
+            field=models.PositiveIntegerField(default=0, verbose_name=b'Category Weight Total', editable=False),
+        ),
+        migrations.RunPython(fill_category_weight_totals,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_homebuyer_category_weight_total'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name=b'Updated At', auto_now=True, db_index=True),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='categoryweight',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name=b'Updated At', auto_now=True, db_index=True),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='couple',
+            name='version',
+            field=models.PositiveIntegerField(default=0, verbose_name=b'Version', editable=False),
+        ),
+        migrations.AddField(
+            model_name='grade',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name=b'Updated At', auto_now=True, db_index=True),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='house',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name=b'Updated At', auto_now=True, db_index=True),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_updated_at_and_couple_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('kind', models.CharField(max_length=10, verbose_name=b'Kind', choices=[(b'house', b'House'), (b'category', b'Category')])),
+                ('object_id', models.PositiveIntegerField(verbose_name=b'Object ID')),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name=b'Deleted At', db_index=True)),
+                ('couple_id', models.PositiveIntegerField(verbose_name=b'Couple ID', db_index=True)),
+            ],
+            options={
+                'ordering': ['couple_id', 'deleted_at'],
+                'verbose_name': 'Tombstone',
+                'verbose_name_plural': 'Tombstones',
+            },
+        ),
+    ]
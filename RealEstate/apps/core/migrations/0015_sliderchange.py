@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_tombstone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SliderChange',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('page', models.CharField(max_length=32, verbose_name=b'Page')),
+                ('cell', models.CharField(max_length=64, verbose_name=b'Cell')),
+                ('seq', models.PositiveIntegerField(verbose_name=b'Seq')),
+                ('applied_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name=b'Applied At', db_index=True)),
+                ('homebuyer', models.ForeignKey(verbose_name=b'Homebuyer', to='core.Homebuyer')),
+            ],
+            options={
+                'ordering': ['homebuyer', 'page', 'cell'],
+                'verbose_name': 'Slider Change',
+                'verbose_name_plural': 'Slider Changes',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='sliderchange',
+            unique_together=set([('homebuyer', 'page', 'cell')]),
+        ),
+    ]
@@ -1,19 +1,26 @@
+import datetime
 import itertools
+from collections import defaultdict
 
+from django.apps import apps
 from django.conf import settings
 from django.contrib.auth.models import (AbstractBaseUser, BaseUserManager,
                                         PermissionsMixin)
 from django.core.exceptions import ValidationError
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection, send_mail
 from django.core.urlresolvers import reverse
 from django.core.validators import (MaxValueValidator, MinValueValidator,
                                     RegexValidator)
 from django.db import IntegrityError, models, transaction
-from django.dispatch import receiver
+from django.dispatch import Signal
+from django.utils import timezone
 from django.utils.crypto import get_random_string, hashlib
 
+from RealEstate.apps.core import metrics
+
 __all__ = ['BaseModel', 'Category', 'CategoryWeight', 'Couple', 'Grade',
-           'Homebuyer', 'House', 'Realtor', 'User']
+           'Homebuyer', 'House', 'HouseScore', 'OutgoingEmail', 'Realtor',
+           'SliderChange', 'Tombstone', 'User', 'grade_matrix_changed']
 
 
 _CATEGORIES = {
@@ -82,60 +89,9 @@ _DEFAULT_CATEGORIES = [
     _CATEGORIES['mortgage']
 ]
 
-
-@receiver(models.signals.post_save)
-def _add_default_categories(sender, instance, created, **kwargs):
-    """
-    Add default categories for a couple when the first Homebuyer registers.
-    """
-    if created and sender == Couple:
-        couple = instance
-        categories = [Category(couple_id=couple.id, **category_data)
-                      for category_data in _DEFAULT_CATEGORIES]
-        with transaction.atomic():
-            created_categories = Category.objects.bulk_create(categories)
-            homebuyers = couple.homebuyer_set.all()
-            category_weights = [
-                CategoryWeight(category=category, homebuyer=homebuyer)
-                for category in created_categories
-                for homebuyer in homebuyers]
-            CategoryWeight.objects.bulk_create(category_weights)
-    return
-
-
-@receiver(models.signals.post_save)
-def _add_default_weights_and_grades(sender, instance, created, **kwargs):
-    """
-    When a Homebuyer, Category, or House gets created/saved, make sure
-    CategoryWeight/Grade instances exist for all Homebuyers and all
-    Category/House combinations.
-    """
-    homebuyers = []
-    if sender == Homebuyer:
-        homebuyers = [instance]
-    elif sender in [Category, House]:
-        homebuyers = instance.couple.homebuyer_set.all()
-
-    with transaction.atomic():
-        for homebuyer in homebuyers:
-            unweighted_categories = homebuyer.unweighted_categories()
-            if unweighted_categories:
-                category_weights = map(
-                    lambda category: CategoryWeight(category=category,
-                                                    homebuyer=homebuyer),
-                    unweighted_categories)
-                CategoryWeight.objects.bulk_create(category_weights)
-
-            ungraded_house_categories = homebuyer.ungraded_house_categories()
-            if ungraded_house_categories:
-                def _grade_mapper(house_category):
-                    house, category = house_category
-                    return Grade(house=house, category=category,
-                                 homebuyer=homebuyer)
-
-                grades = map(_grade_mapper, ungraded_house_categories)
-                Grade.objects.bulk_create(grades)
-    return
+# Sent after Grade/CategoryWeight rows for a couple are written in bulk,
+# which bypasses the per-instance save/delete signals.
+grade_matrix_changed = Signal(providing_args=['couple_id'])
 
 
 def _generate_email_confirmation_token():
@@ -235,6 +191,52 @@ class Person(BaseModel):
         abstract = True
 
 
+class CategoryManager(models.Manager):
+    def _with_value(self, couple, model, field, **filters):
+        """
+        Returns a list of (category, value) pairs for each of the couple's
+        categories, where value is `field` of the `model` row for that
+        category matching `filters` (column: value), or None if there is no
+        such row.  The value is selected by a subquery in the same query;
+        `filters` must pick out at most one row per category.
+        """
+        table = model._meta.db_table
+        conditions = ["{table}.{category} = {categories}.{pk}".format(
+            table=table,
+            category=model._meta.get_field('category').column,
+            categories=self.model._meta.db_table,
+            pk=self.model._meta.pk.column)]
+        params = []
+        for column, value in sorted(filters.items()):
+            conditions.append("{table}.{column} = %s".format(table=table,
+                                                             column=column))
+            params.append(value)
+        value_sql = "SELECT {table}.{field} FROM {table} WHERE {where}".format(
+            table=table, field=model._meta.get_field(field).column,
+            where=" AND ".join(conditions))
+        categories = (self.get_queryset().filter(couple=couple)
+                      .extra(select={'merged_value': value_sql},
+                             select_params=params))
+        return [(category, category.merged_value) for category in categories]
+
+    def with_scores(self, homebuyer, house):
+        """
+        Returns the homebuyer's couple's categories paired with the score
+        the homebuyer gave the house in each, or None where there is no
+        grade yet.
+        """
+        return self._with_value(homebuyer.couple_id, Grade, 'score',
+                                homebuyer_id=homebuyer.id, house_id=house.id)
+
+    def with_weights(self, homebuyer):
+        """
+        Returns the homebuyer's couple's categories paired with the weight
+        the homebuyer gave each, or None where there is no weight yet.
+        """
+        return self._with_value(homebuyer.couple_id, CategoryWeight, 'weight',
+                                homebuyer_id=homebuyer.id)
+
+
 class Category(BaseModel):
     """
     Represents a category for a single couple, meaning each couple will define
@@ -247,6 +249,10 @@ class Category(BaseModel):
     description = models.TextField(blank=True, verbose_name="Description")
 
     couple = models.ForeignKey('core.Couple', verbose_name="Couple")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True,
+                                      verbose_name="Updated At")
+
+    objects = CategoryManager()
 
     def __unicode__(self):
         return self.summary
@@ -266,6 +272,52 @@ class Category(BaseModel):
         verbose_name_plural = "Categories"
 
 
+class CategoryWeightManager(models.Manager):
+    def set_weights(self, homebuyer, weights):
+        """
+        Sets many weights for a homebuyer at once, like
+        GradeManager.set_scores().  weights maps category_id to a weight;
+        the caller is responsible for making sure the categories belong to
+        the homebuyer's couple.  The HouseScore aggregates and the
+        homebuyer's category_weight_total are brought up to date in the same
+        transaction.  Returns the number of weights that changed.
+        """
+        if not weights:
+            return 0
+        with transaction.atomic():
+            existing = {
+                category_id: (pk, weight)
+                for pk, category_id, weight in (
+                    self.select_for_update()
+                    .filter(homebuyer=homebuyer, category_id__in=weights)
+                    .order_by()
+                    .values_list('id', 'category_id', 'weight'))}
+
+            ids_by_weight = defaultdict(list)
+            created = []
+            for category_id, weight in weights.items():
+                pk, old_weight = existing.get(category_id, (None, None))
+                if pk is None:
+                    created.append(self.model(homebuyer=homebuyer,
+                                              category_id=category_id,
+                                              weight=weight))
+                elif old_weight != weight:
+                    ids_by_weight[weight].append(pk)
+
+            for weight, ids in ids_by_weight.items():
+                self.filter(id__in=ids).update(weight=weight,
+                                               updated_at=timezone.now())
+            self.bulk_create(created)
+            changed = len(created) + sum(map(len, ids_by_weight.values()))
+            if changed:
+                HouseScore.objects.rebuild(homebuyers=[homebuyer])
+                Homebuyer.objects.sync_category_weight_totals(
+                    Homebuyer.objects.filter(id=homebuyer.id))
+                grade_matrix_changed.send(sender=self.model,
+                                          couple_id=homebuyer.couple_id)
+        return changed
+
+
 class CategoryWeight(BaseModel):
     """
     This is the 'join table' or 'through table' for the many to many
@@ -287,6 +339,10 @@ class CategoryWeight(BaseModel):
         verbose_name="Weight")
     homebuyer = models.ForeignKey('core.Homebuyer', verbose_name="Homebuyer")
     category = models.ForeignKey('core.Category', verbose_name="Category")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True,
+                                      verbose_name="Updated At")
+
+    objects = CategoryWeightManager()
 
     def __unicode__(self):
         return u"{homebuyer} gives {category} a weight of {weight}".format(
@@ -309,6 +365,40 @@ class CategoryWeight(BaseModel):
                                   "Homebuyer.".format(category=self.category))
         return super(CategoryWeight, self).clean()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remember the stored weight so save() can apply the difference to the
+        HouseScore aggregates.
+        """
+        instance = super(CategoryWeight, cls).from_db(db, field_names, values)
+        instance._loaded_weight = instance.weight
+        return instance
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the weight and updates the HouseScore aggregates and the
+        homebuyer's category_weight_total in the same transaction.
+        """
+        adding = self._state.adding
+        if adding:
+            old_weight = self._meta.get_field('weight').default
+        else:
+            old_weight = getattr(self, '_loaded_weight', None)
+        with transaction.atomic():
+            super(CategoryWeight, self).save(*args, **kwargs)
+            HouseScore.objects.apply_weight_change(self, old_weight)
+            if adding:
+                Homebuyer.objects.add_to_category_weight_total(
+                    self.homebuyer_id, self.weight)
+            elif old_weight is not None:
+                Homebuyer.objects.add_to_category_weight_total(
+                    self.homebuyer_id, self.weight - old_weight)
+            else:
+                Homebuyer.objects.sync_category_weight_totals(
+                    Homebuyer.objects.filter(id=self.homebuyer_id))
+        self._loaded_weight = self.weight
+
     class Meta:
         ordering = ['category', 'homebuyer']
         unique_together = (('homebuyer', 'category'),)
@@ -316,6 +406,16 @@ class CategoryWeight(BaseModel):
         verbose_name_plural = "Category Weights"
 
 
+class CoupleManager(models.Manager):
+    def bump_version(self, couple_id):
+        """
+        Increments the couple's version in the database, so concurrent
+        changes cannot overwrite each other's bump.
+        """
+        if couple_id:
+            self.filter(id=couple_id).update(version=models.F('version') + 1)
+
+
 class Couple(BaseModel):
     """
     Represents a couple in our app, or two prospective Homebuyers.  Operating
@@ -329,6 +429,14 @@ class Couple(BaseModel):
     activated but not the other).
     """
     realtor = models.ForeignKey('core.Realtor', verbose_name="Realtor")
+    # Bumped by CoupleManager.bump_version() whenever a Homebuyer, House,
+    # Category, Grade or CategoryWeight of the couple changes (see
+    # signals.py), so responses built from the couple's data can be
+    # versioned by it.
+    version = models.PositiveIntegerField(default=0, editable=False,
+                                          verbose_name="Version")
+
+    objects = CoupleManager()
 
     def __unicode__(self):
         return u", ".join(
@@ -343,21 +451,76 @@ class Couple(BaseModel):
         return homebuyers
 
     def emails(self):
+        # Iterates homebuyer_set.all() so a prefetched set is reused.
         return ','.join(
-            self.homebuyer_set.values_list('user__email', flat=True))
+            homebuyer.email for homebuyer in self.homebuyer_set.all())
+
+    def fill_grade_matrix(self):
+        """
+        Creates every missing CategoryWeight (homebuyer x category) and Grade
+        (homebuyer x house x category) row for this couple.  The existing
+        rows are read once as sets of ID tuples and diffed against the full
+        matrix, so the cost is a fixed number of queries plus one bulk insert
+        per table, regardless of how many houses or categories there are.
+
+        With settings.SPARSE_GRADES, Grade rows are not created at all; a
+        missing Grade is read everywhere as the default score, and a row is
+        only written once a homebuyer actually scores the house.
+
+        Returns a (weights created, grades created) tuple.
+        """
+        homebuyer_ids = list(
+            self.homebuyer_set.order_by().values_list('id', flat=True))
+        if not homebuyer_ids:
+            return (0, 0)
+        category_ids = list(self.category_set.values_list('id', flat=True))
+        house_ids = list(self.house_set.values_list('id', flat=True))
+
+        existing_weights = set(
+            CategoryWeight.objects.filter(homebuyer_id__in=homebuyer_ids)
+            .order_by().values_list('homebuyer_id', 'category_id'))
+        category_weights = [
+            CategoryWeight(homebuyer_id=homebuyer_id, category_id=category_id)
+            for homebuyer_id, category_id
+            in itertools.product(homebuyer_ids, category_ids)
+            if (homebuyer_id, category_id) not in existing_weights]
+
+        grades = []
+        if not settings.SPARSE_GRADES:
+            existing_grades = set(
+                Grade.objects.filter(homebuyer_id__in=homebuyer_ids)
+                .order_by()
+                .values_list('homebuyer_id', 'house_id', 'category_id'))
+            grades = [
+                Grade(homebuyer_id=homebuyer_id, house_id=house_id,
+                      category_id=category_id)
+                for homebuyer_id, house_id, category_id
+                in itertools.product(homebuyer_ids, house_ids, category_ids)
+                if (homebuyer_id, house_id, category_id)
+                not in existing_grades]
+
+        # A new house does not necessarily create any rows above (sparse mode,
+        # or a couple without categories), so also check for missing
+        # HouseScore rows.
+        missing_scores = (HouseScore.objects.filter(couple=self).count() !=
+                          len(homebuyer_ids) * len(house_ids))
+        if category_weights or grades or missing_scores:
+            with transaction.atomic():
+                CategoryWeight.objects.bulk_create(category_weights)
+                if category_weights:
+                    Homebuyer.objects.sync_category_weight_totals(
+                        self.homebuyer_set.all())
+                Grade.objects.bulk_create(grades)
+                # bulk_create skips Grade/CategoryWeight.save(), so bring the
+                # HouseScore aggregates up to date for the new rows here.
+                HouseScore.objects.rebuild(
+                    homebuyers=self.homebuyer_set.all())
+        return (len(category_weights), len(grades))
 
     @property
     def registered(self):
         return self.homebuyer_set.count() == 2
 
-    @property
-    def report_data(self):
-        """
-        Report data for all homebuyers for this Couple, keyed by email.
-        """
-        return {homebuyer.email: homebuyer.report_data
-                for homebuyer in self.homebuyer_set.all()}
-
     def report_url(self):
         if not self.id:
             return None
@@ -369,6 +532,69 @@ class Couple(BaseModel):
         verbose_name_plural = "Couples"
 
 
+class GradeManager(models.Manager):
+    def set_scores(self, homebuyer, scores):
+        """
+        Sets many scores for a homebuyer at once.  scores maps
+        (house_id, category_id) to a score; the caller is responsible for
+        making sure the houses/categories belong to the homebuyer's couple.
+        Existing rows are updated with one UPDATE per distinct score, missing
+        rows (see settings.SPARSE_GRADES) are created with one bulk insert,
+        and the HouseScore aggregates are rebuilt for the homebuyer, all in
+        one transaction.  Returns the number of scores that changed.
+        """
+        if not scores:
+            return 0
+        house_ids = set(house_id for house_id, _ in scores)
+        category_ids = set(category_id for _, category_id in scores)
+        with transaction.atomic():
+            existing = {
+                (house_id, category_id): (pk, score)
+                for pk, house_id, category_id, score in (
+                    self.select_for_update()
+                    .filter(homebuyer=homebuyer, house_id__in=house_ids,
+                            category_id__in=category_ids)
+                    .order_by()
+                    .values_list('id', 'house_id', 'category_id', 'score'))}
+
+            ids_by_score = defaultdict(list)
+            created = []
+            for (house_id, category_id), score in scores.items():
+                pk, old_score = existing.get((house_id, category_id),
+                                             (None, None))
+                if pk is None:
+                    created.append(self.model(homebuyer=homebuyer,
+                                              house_id=house_id,
+                                              category_id=category_id,
+                                              score=score))
+                elif old_score != score:
+                    ids_by_score[score].append(pk)
+
+            for score, ids in ids_by_score.items():
+                self.filter(id__in=ids).update(score=score,
+                                               updated_at=timezone.now())
+            self.bulk_create(created)
+            changed = len(created) + sum(map(len, ids_by_score.values()))
+            if changed:
+                HouseScore.objects.rebuild(homebuyers=[homebuyer])
+                grade_matrix_changed.send(sender=self.model,
+                                          couple_id=homebuyer.couple_id)
+        return changed
+
+    def scores_by_house(self, homebuyer):
+        """
+        Returns every score the homebuyer has given, with one query, as a
+        dict mapping house_id to a dict mapping category_id to the score.
+        Pairs without a grade (see settings.SPARSE_GRADES) are missing.
+        """
+        scores = defaultdict(dict)
+        for house_id, category_id, score in (
+                self.filter(homebuyer=homebuyer)
+                .values_list('house_id', 'category_id', 'score')):
+            scores[house_id][category_id] = score
+        return scores
+
+
 class Grade(BaseModel):
     """
     Each homebuyer will be related to several House and Category instances via
@@ -387,6 +613,10 @@ class Grade(BaseModel):
     house = models.ForeignKey('core.House', verbose_name="House")
     category = models.ForeignKey('core.Category', verbose_name="Category")
     homebuyer = models.ForeignKey('core.Homebuyer', verbose_name="Homebuyer")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True,
+                                      verbose_name="Updated At")
+
+    objects = GradeManager()
 
     def __unicode__(self):
         return (u"{homebuyer} gives {house} a score of {score} for category: "
@@ -411,6 +641,30 @@ class Grade(BaseModel):
                                   "for the same Couple.")
         return super(Grade, self).clean()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remember the stored score so save() can apply the difference to the
+        HouseScore aggregates.
+        """
+        instance = super(Grade, cls).from_db(db, field_names, values)
+        instance._loaded_score = instance.score
+        return instance
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the score and updates the HouseScore aggregate for this
+        house/homebuyer in the same transaction.
+        """
+        if self._state.adding:
+            old_score = self._meta.get_field('score').default
+        else:
+            old_score = getattr(self, '_loaded_score', None)
+        with transaction.atomic():
+            super(Grade, self).save(*args, **kwargs)
+            HouseScore.objects.apply_grade_change(self, old_score)
+        self._loaded_score = self.score
+
     class Meta:
         ordering = ['homebuyer', 'house', 'category', 'score']
         unique_together = (('house', 'category', 'homebuyer'),)
@@ -418,6 +672,51 @@ class Grade(BaseModel):
         verbose_name_plural = "Grades"
 
 
+class HomebuyerManager(models.Manager):
+    def add_to_category_weight_total(self, homebuyer_id, delta):
+        """
+        Adds delta to a homebuyer's stored weight total, in the database, so
+        concurrent weight changes cannot overwrite each other.
+        """
+        if delta:
+            self.filter(id=homebuyer_id).update(
+                category_weight_total=models.F('category_weight_total') +
+                delta)
+
+    def sync_category_weight_totals(self, homebuyers=None, dry_run=False):
+        """
+        Recomputes the stored category_weight_total of the given homebuyers
+        (a queryset, all of them by default) from the CategoryWeight table.
+        Used after CategoryWeight rows are bulk inserted, which skips save(),
+        and by the sync_category_weight_totals command.  Returns a list of
+        (homebuyer_id, stored, expected) tuples for the totals that were
+        wrong.  With dry_run, nothing is written.
+        """
+        if homebuyers is None:
+            homebuyers = self.all()
+        expected = dict(
+            CategoryWeight.objects.filter(homebuyer__in=homebuyers)
+            .order_by().values('homebuyer_id')
+            .annotate(total=models.Sum('weight'))
+            .values_list('homebuyer_id', 'total'))
+        mismatches = [
+            (homebuyer_id, stored, expected.get(homebuyer_id, 0))
+            for homebuyer_id, stored in (
+                homebuyers.order_by()
+                .values_list('id', 'category_weight_total'))
+            if stored != expected.get(homebuyer_id, 0)]
+
+        if not dry_run and mismatches:
+            ids_by_total = defaultdict(list)
+            for homebuyer_id, _, total in mismatches:
+                ids_by_total[total].append(homebuyer_id)
+            with transaction.atomic():
+                for total, ids in ids_by_total.items():
+                    self.filter(id__in=ids).update(
+                        category_weight_total=total)
+        return mismatches
+
+
 class Homebuyer(Person, ValidateCategoryCoupleMixin):
     """
     Represents an individual homebuyer.  The Homebuyer instance must be part
@@ -427,6 +726,13 @@ class Homebuyer(Person, ValidateCategoryCoupleMixin):
     categories = models.ManyToManyField('core.Category',
                                         through='core.CategoryWeight',
                                         verbose_name="Categories")
+    # The sum of the homebuyer's CategoryWeight.weight values, kept up to
+    # date by CategoryWeight.save(), the CategoryWeight post_delete handler
+    # and HomebuyerManager.sync_category_weight_totals() after bulk inserts.
+    category_weight_total = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Category Weight Total")
+
+    objects = HomebuyerManager()
 
     def can_view_report_for_couple(self, couple_id):
         """
@@ -434,15 +740,6 @@ class Homebuyer(Person, ValidateCategoryCoupleMixin):
         """
         return self.couple_id == couple_id
 
-    @property
-    def category_weight_total(self):
-        """
-        Sums up all the weight properties for each CategoryWeight object on the
-        Homebuyer.
-        """
-        total = self.categoryweight_set.aggregate(models.Sum('weight'))
-        return total.get('weight__sum') or 0
-
     def clean(self):
         """
         Homebuyers and Realtors are mutually exclusive.  User instances have
@@ -482,59 +779,6 @@ class Homebuyer(Person, ValidateCategoryCoupleMixin):
                                  "(Couple ID: {id})".format(id=self.couple_id))
         return related_homebuyers.first()
 
-    @property
-    def report_data(self):
-        """
-        Dumps out the homebuyer statistics into a dictionary.  The top level is
-        keyed by Category summaries, meaning an empty dict would be returned
-        for a Homebuyer with no related Category instances.  For each Category,
-        a weight property is given, along with a nested dict of Houses with
-        corresponding grades for that Category/House.
-        """
-        category_weights = self.categoryweight_set.select_related('category')
-        grades = self.grade_set.select_related('category', 'house')
-        data = {
-            category_weight.category.summary: {
-                'weight': category_weight.weight,
-                'houses': {}
-            }
-            for category_weight in category_weights
-        }
-        for grade in grades:
-            summary = grade.category.summary
-            house_nickname = grade.house.nickname
-            data[summary]['houses'][house_nickname] = grade.score
-        return data
-
-    @property
-    def home_report_data(self):
-        """
-        Dumps out the homebuyer statistics into a dictionary.  The top level is
-        keyed by Category summaries, meaning an empty dict would be returned
-        for a Homebuyer with no related Category instances.  For each Category,
-        a weight property is given, along with a nested dict of Houses with
-        corresponding grades for that Category/House.
-        """
-        category_weights = self.categoryweight_set.select_related('category')
-        grades = self.grade_set.select_related('house', 'category')
-        data = {
-            grade.house.nickname:
-            {
-                'weight': 0,
-                'categories': {}
-            }
-            for grade in grades
-        }
-        for grade in grades:
-            summary = grade.category.summary
-            house_nickname = grade.house.nickname
-            for category_weight in category_weights:
-                if category_weight.category.summary == summary:
-                    data[house_nickname]['weight'] = category_weight.weight
-            data[house_nickname]['categories'][summary] = grade.score
-
-        return data
-
     def report_url(self):
         return self.couple.report_url()
 
@@ -542,29 +786,6 @@ class Homebuyer(Person, ValidateCategoryCoupleMixin):
     def role_type(self):
         return 'Homebuyer'
 
-    def ungraded_house_categories(self):
-        """
-        Returns a list of (<House>, <Category>) tuples for which this Homebuyer
-        has no corresponding Grade instance.
-        """
-        houses = self.couple.house_set.all()
-        categories = self.couple.category_set.all()
-        grades = self.grade_set.values_list('house_id', 'category_id')
-        house_categories = itertools.product(houses, categories)
-
-        def _ungraded_filter(house_category):
-            house, category = house_category
-            return (house.id, category.id) not in grades
-
-        return filter(_ungraded_filter, house_categories)
-
-    def unweighted_categories(self):
-        """
-        Returns a Category queryset for which the Homebuyer does not have a
-        corresponding CategoryWeight.
-        """
-        return self.couple.category_set.exclude(categoryweight__homebuyer=self)
-
     class Meta:
         ordering = ['user__email']
         verbose_name = "Homebuyer"
@@ -586,6 +807,8 @@ class House(BaseModel, ValidateCategoryCoupleMixin):
     couple = models.ForeignKey('core.Couple', verbose_name="Couple")
     categories = models.ManyToManyField('core.Category', through='core.Grade',
                                         verbose_name="Categories")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True,
+                                      verbose_name="Updated At")
 
     def __unicode__(self):
         return self.nickname
@@ -621,6 +844,474 @@ class House(BaseModel, ValidateCategoryCoupleMixin):
         verbose_name_plural = "Houses"
 
 
+class HouseScoreManager(models.Manager):
+    """
+    Maintains the HouseScore aggregates.  Score and weight edits are applied
+    as differences to the stored sums; anything that changes the shape of
+    the grade matrix (new houses/categories/homebuyers, deleted categories)
+    goes through rebuild().
+    """
+    def apply_grade_change(self, grade, old_score):
+        """
+        Add (new score - old score) * category weight to the house's sum.
+        If the old score is unknown, or the aggregate row does not exist yet,
+        rebuild the homebuyer's rows instead.
+        """
+        if old_score is not None and old_score == grade.score:
+            return
+        weight = (CategoryWeight.objects
+                  .filter(homebuyer_id=grade.homebuyer_id,
+                          category_id=grade.category_id)
+                  .values_list('weight', flat=True).first())
+        if old_score is not None and weight is not None:
+            updated = (self.filter(house_id=grade.house_id,
+                                   homebuyer_id=grade.homebuyer_id)
+                       .update(weighted_sum=models.F('weighted_sum') +
+                               (grade.score - old_score) * weight))
+            if updated:
+                return
+        self.rebuild(homebuyers=Homebuyer.objects.filter(
+            id=grade.homebuyer_id))
+
+    def apply_weight_change(self, category_weight, old_weight):
+        """
+        Add (new weight - old weight) * score to every house's sum for the
+        homebuyer.  Houses are grouped by their score for the category, so
+        this is at most one UPDATE per possible score.
+        """
+        if old_weight is None:
+            self.rebuild(homebuyers=Homebuyer.objects.filter(
+                id=category_weight.homebuyer_id))
+            return
+        delta = category_weight.weight - old_weight
+        if not delta:
+            return
+
+        default_score = Grade._meta.get_field('score').default
+        houses_by_score = defaultdict(list)
+        grades = (Grade.objects
+                  .filter(homebuyer_id=category_weight.homebuyer_id,
+                          category_id=category_weight.category_id)
+                  .order_by().values_list('house_id', 'score'))
+        for house_id, score in grades:
+            houses_by_score[score].append(house_id)
+
+        rows = self.filter(homebuyer_id=category_weight.homebuyer_id)
+        graded_house_ids = []
+        for score, house_ids in houses_by_score.items():
+            graded_house_ids.extend(house_ids)
+            rows.filter(house_id__in=house_ids).update(
+                weighted_sum=models.F('weighted_sum') + delta * score)
+        rows.exclude(house_id__in=graded_house_ids).update(
+            weighted_sum=models.F('weighted_sum') + delta * default_score)
+
+    def expected(self, homebuyers=None):
+        """
+        Computes the weighted sums from the Grade and CategoryWeight tables.
+        Returns a dict keyed by (house_id, homebuyer_id).  Missing grades and
+        weights count as the model defaults.
+        """
+        if homebuyers is None:
+            homebuyers = Homebuyer.objects.all()
+        homebuyers = dict(homebuyers.order_by().values_list('id', 'couple_id')
+                          if isinstance(homebuyers, models.QuerySet) else
+                          ((hb.id, hb.couple_id) for hb in homebuyers))
+        couple_ids = set(homebuyers.values())
+        default_score = Grade._meta.get_field('score').default
+        default_weight = CategoryWeight._meta.get_field('weight').default
+
+        categories_by_couple = defaultdict(list)
+        for category_id, couple_id in (Category.objects
+                                       .filter(couple_id__in=couple_ids)
+                                       .values_list('id', 'couple_id')):
+            categories_by_couple[couple_id].append(category_id)
+
+        weights = {}
+        for homebuyer_id, category_id, weight in (
+                CategoryWeight.objects
+                .filter(homebuyer_id__in=homebuyers.keys())
+                .order_by()
+                .values_list('homebuyer_id', 'category_id', 'weight')):
+            weights[(homebuyer_id, category_id)] = weight
+
+        # Start every house at "all categories graded with the default", then
+        # correct for the grades that actually exist.
+        base = {
+            homebuyer_id: sum(
+                weights.get((homebuyer_id, category_id), default_weight)
+                for category_id in categories_by_couple[couple_id]
+            ) * default_score
+            for homebuyer_id, couple_id in homebuyers.items()}
+        expected = {}
+        for house_id, couple_id in (House.objects
+                                    .filter(couple_id__in=couple_ids)
+                                    .values_list('id', 'couple_id')):
+            for homebuyer_id, hb_couple_id in homebuyers.items():
+                if hb_couple_id == couple_id:
+                    expected[(house_id, homebuyer_id)] = base[homebuyer_id]
+
+        grades = (Grade.objects
+                  .filter(homebuyer_id__in=homebuyers.keys())
+                  .order_by()
+                  .values_list('house_id', 'homebuyer_id', 'category_id',
+                               'score'))
+        for house_id, homebuyer_id, category_id, score in grades.iterator():
+            weight = weights.get((homebuyer_id, category_id), default_weight)
+            expected[(house_id, homebuyer_id)] += (
+                (score - default_score) * weight)
+        return expected
+
+    def rebuild(self, homebuyers=None, dry_run=False):
+        """
+        Brings the stored aggregates for the given homebuyers (all of them by
+        default) in line with the Grade and CategoryWeight tables.  Returns a
+        list of (house_id, homebuyer_id, stored, expected) tuples for rows
+        that were missing (stored is None) or wrong.  With dry_run, nothing
+        is written.
+        """
+        expected = self.expected(homebuyers)
+        homebuyer_ids = set(homebuyer_id for _, homebuyer_id in expected)
+        stored = {
+            (house_id, homebuyer_id): (pk, weighted_sum)
+            for pk, house_id, homebuyer_id, weighted_sum in (
+                self.filter(homebuyer_id__in=homebuyer_ids)
+                .order_by()
+                .values_list('id', 'house_id', 'homebuyer_id',
+                             'weighted_sum'))}
+        couple_ids = dict(
+            Homebuyer.objects.filter(id__in=homebuyer_ids)
+            .order_by().values_list('id', 'couple_id'))
+
+        mismatches = []
+        missing = []
+        ids_by_delta = defaultdict(list)
+        for key, weighted_sum in expected.items():
+            pk, stored_sum = stored.get(key, (None, None))
+            if stored_sum == weighted_sum:
+                continue
+            mismatches.append(key + (stored_sum, weighted_sum))
+            if pk is None:
+                house_id, homebuyer_id = key
+                missing.append(self.model(couple_id=couple_ids[homebuyer_id],
+                                          house_id=house_id,
+                                          homebuyer_id=homebuyer_id,
+                                          weighted_sum=weighted_sum))
+            else:
+                ids_by_delta[weighted_sum - stored_sum].append(pk)
+
+        if not dry_run and mismatches:
+            with transaction.atomic():
+                self.bulk_create(missing)
+                for delta, ids in ids_by_delta.items():
+                    self.filter(id__in=ids).update(
+                        weighted_sum=models.F('weighted_sum') + delta)
+        return mismatches
+
+    def totals(self, couple):
+        """
+        Returns {house_id: overall score} for a couple, where the overall
+        score is each homebuyer's weighted sum divided by their total weight,
+        averaged over the homebuyers.  This is one query per table involved
+        regardless of how many categories the couple has.
+        """
+        return self.totals_by_couple([couple]).get(couple.id, {})
+
+    def totals_by_couple(self, couples, weight_totals=None):
+        """
+        Same as totals(), for many couples at once: returns
+        {couple_id: {house_id: overall score}}, still in two queries.  A
+        caller that already has the homebuyers loaded can pass
+        weight_totals ({homebuyer_id: category_weight_total}) to save one.
+        """
+        if weight_totals is None:
+            weight_totals = dict(
+                Homebuyer.objects.filter(couple__in=couples)
+                .order_by().values_list('id', 'category_weight_total'))
+        scores = defaultdict(lambda: defaultdict(list))
+        for couple_id, house_id, homebuyer_id, weighted_sum in (
+                self.filter(couple__in=couples)
+                .order_by()
+                .values_list('couple_id', 'house_id', 'homebuyer_id',
+                             'weighted_sum')):
+            total = weight_totals.get(homebuyer_id)
+            scores[couple_id][house_id].append(
+                float(weighted_sum) / total if total else 0.0)
+        return {couple_id: {house_id: round(sum(values) / len(values), 2)
+                            for house_id, values in houses.items()}
+                for couple_id, houses in scores.items()}
+
+
+class HouseScore(BaseModel):
+    """
+    Denormalized per-homebuyer total for a house: the sum over the couple's
+    categories of score * weight.  Maintained by Grade.save(),
+    CategoryWeight.save() and the grade matrix signal handlers, so that
+    overall house scores can be read without touching the Grade table.
+    Use the rebuild_house_scores management command to verify or repair.
+    """
+    weighted_sum = models.PositiveIntegerField(default=0,
+                                               verbose_name="Weighted Sum")
+
+    couple = models.ForeignKey('core.Couple', verbose_name="Couple")
+    house = models.ForeignKey('core.House', verbose_name="House")
+    homebuyer = models.ForeignKey('core.Homebuyer', verbose_name="Homebuyer")
+
+    objects = HouseScoreManager()
+
+    def __unicode__(self):
+        return u"{house}: {weighted_sum} for {homebuyer}".format(
+            house=self.house, weighted_sum=self.weighted_sum,
+            homebuyer=self.homebuyer)
+
+    class Meta:
+        ordering = ['couple', 'house', 'homebuyer']
+        unique_together = (('house', 'homebuyer'),)
+        verbose_name = "House Score"
+        verbose_name_plural = "House Scores"
+
+
+class Tombstone(BaseModel):
+    """
+    Records the deletion of a House or Category, so that clients syncing
+    changes (see the /api/sync/ endpoint) can drop their copy.  Grades and
+    weights are only ever deleted along with their house, category or
+    homebuyer, so they need no tombstones of their own.
+
+    The couple is a plain ID rather than a foreign key, because tombstones
+    are written while a couple's houses and categories are deleted along
+    with the couple itself; they are removed once the couple is gone.
+    """
+    HOUSE = 'house'
+    CATEGORY = 'category'
+    _KIND_CHOICES = ((HOUSE, 'House'), (CATEGORY, 'Category'))
+
+    kind = models.CharField(max_length=10, choices=_KIND_CHOICES,
+                            verbose_name="Kind")
+    object_id = models.PositiveIntegerField(verbose_name="Object ID")
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True,
+                                      verbose_name="Deleted At")
+    couple_id = models.PositiveIntegerField(db_index=True,
+                                            verbose_name="Couple ID")
+
+    def __unicode__(self):
+        return u"{kind} {object_id} deleted at {deleted_at}".format(
+            kind=self.get_kind_display(), object_id=self.object_id,
+            deleted_at=self.deleted_at)
+
+    class Meta:
+        ordering = ['couple_id', 'deleted_at']
+        verbose_name = "Tombstone"
+        verbose_name_plural = "Tombstones"
+
+
+class SliderChangeManager(models.Manager):
+    def _cell_key(self, cell):
+        kind, category_id, house_id = cell
+        return u"{kind}:{category}:{house}".format(
+            kind=kind, category=category_id, house=house_id or '')
+
+    def claim(self, homebuyer, page, seqs):
+        """
+        Takes {cell: seq} for slider changes sent from one page, and returns
+        the set of cells whose seq is newer than the last one applied from
+        that page, recording those seqs as applied.  Must be called in the
+        transaction that applies the changes: the homebuyer's row is locked
+        so that saves racing each other are handled one at a time.  Records
+        older than settings.SLIDER_PAGE_TTL seconds are dropped on the way.
+        """
+        list(Homebuyer.objects.select_for_update()
+             .filter(id=homebuyer.id).values_list('id', flat=True))
+        keys = {self._cell_key(cell): cell for cell in seqs}
+        applied = dict(
+            self.filter(homebuyer=homebuyer, page=page, cell__in=keys)
+            .values_list('cell', 'seq'))
+        fresh = [key for key, cell in keys.items()
+                 if applied.get(key, -1) < seqs[cell]]
+
+        cutoff = timezone.now() - datetime.timedelta(
+            seconds=settings.SLIDER_PAGE_TTL)
+        self.filter(homebuyer=homebuyer).filter(
+            models.Q(page=page, cell__in=fresh) |
+            models.Q(applied_at__lt=cutoff)).delete()
+        self.bulk_create([
+            self.model(homebuyer=homebuyer, page=page, cell=key,
+                       seq=seqs[keys[key]])
+            for key in fresh])
+        return set(keys[key] for key in fresh)
+
+
+class SliderChange(BaseModel):
+    """
+    The seq of the last slider change applied for a cell (a score or a
+    weight) from one page of a homebuyer.  Pages number their changes, and
+    a batch can reach the server after a newer one from the same page, e.g.
+    when it is retried or sent on leaving the page; these records let the
+    slider-changes view skip the older changes.
+    """
+    homebuyer = models.ForeignKey('core.Homebuyer', verbose_name="Homebuyer")
+    page = models.CharField(max_length=32, verbose_name="Page")
+    cell = models.CharField(max_length=64, verbose_name="Cell")
+    seq = models.PositiveIntegerField(verbose_name="Seq")
+    applied_at = models.DateTimeField(default=timezone.now, db_index=True,
+                                      verbose_name="Applied At")
+
+    objects = SliderChangeManager()
+
+    def __unicode__(self):
+        return u"{cell} #{seq} from {page}".format(cell=self.cell,
+                                                   seq=self.seq,
+                                                   page=self.page)
+
+    class Meta:
+        ordering = ['homebuyer', 'page', 'cell']
+        unique_together = (('homebuyer', 'page', 'cell'),)
+        verbose_name = "Slider Change"
+        verbose_name_plural = "Slider Changes"
+
+
+class OutgoingEmailManager(models.Manager):
+    def enqueue(self, subject, message, recipient, from_email=None):
+        """
+        Queues an email to be sent by the send_queued_email worker.  Emails
+        are only picked up once the surrounding transaction commits.
+        """
+        return self.create(subject=subject, message=message,
+                           recipient=recipient,
+                           from_email=from_email or settings.EMAIL_HOST_USER)
+
+    def due(self, now=None):
+        now = now or timezone.now()
+        return (self.filter(status=OutgoingEmail.QUEUED,
+                            next_attempt__lte=now)
+                .order_by('next_attempt', 'id'))
+
+    def send_queued(self, limit=None, connection=None, now=None):
+        """
+        Sends the emails that are due over a single email backend connection
+        and returns (sent, failed) counts.  A failed email is retried with
+        exponential backoff, starting at settings.EMAIL_OUTBOX_RETRY_DELAY
+        seconds, and is given up on after settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+        attempts.  The connection is reopened after a failure, in case the
+        server dropped it.  If the connection cannot be opened, every email
+        not sent yet counts as a failed attempt, so it backs off the same
+        way.
+        """
+        now = now or timezone.now()
+        emails = self.due(now)
+        if limit:
+            emails = emails[:limit]
+        emails = list(emails)
+        if not emails:
+            return (0, 0)
+
+        connection = connection or get_connection()
+        sent = failed = 0
+        error = self._open(connection)
+        try:
+            while emails and error is None:
+                email = emails.pop(0)
+                try:
+                    EmailMessage(email.subject, email.message,
+                                 email.from_email, [email.recipient],
+                                 connection=connection).send()
+                except Exception as e:
+                    email.retry_later(e, now)
+                    failed += 1
+                    metrics.EMAILS.inc(status='failed')
+                    connection.close()
+                    error = self._open(connection)
+                else:
+                    email.status = OutgoingEmail.SENT
+                    email.attempts += 1
+                    email.sent_at = now
+                    email.last_error = ''
+                    email.save(update_fields=['status', 'attempts', 'sent_at',
+                                              'last_error'])
+                    sent += 1
+                    metrics.EMAILS.inc(status='sent')
+        finally:
+            connection.close()
+
+        # The server could not be reached, so the rest of the batch waits for
+        # its next attempt.
+        for email in emails:
+            email.retry_later(error, now)
+            failed += 1
+            metrics.EMAILS.inc(status='failed')
+        return (sent, failed)
+
+    def _open(self, connection):
+        """
+        Opens the connection, returning the error instead of raising it.
+        """
+        try:
+            connection.open()
+        except Exception as e:
+            return e
+        return None
+
+
+class OutgoingEmail(BaseModel):
+    """
+    An email waiting to be sent, or the record of one that was.  Views
+    queue emails here instead of talking to the SMTP server during the
+    request; the send_queued_email management command delivers them.
+    """
+    QUEUED = 'queued'
+    SENT = 'sent'
+    FAILED = 'failed'
+    _STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    subject = models.CharField(max_length=255, verbose_name="Subject")
+    message = models.TextField(verbose_name="Message")
+    from_email = models.CharField(max_length=254, blank=True,
+                                  verbose_name="From")
+    recipient = models.EmailField(max_length=254, verbose_name="Recipient")
+    status = models.CharField(max_length=10, choices=_STATUS_CHOICES,
+                              default=QUEUED, verbose_name="Status")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Attempts")
+    last_error = models.TextField(blank=True, verbose_name="Last Error")
+    created_at = models.DateTimeField(auto_now_add=True,
+                                      verbose_name="Created At")
+    next_attempt = models.DateTimeField(default=timezone.now, db_index=True,
+                                        verbose_name="Next Attempt")
+    sent_at = models.DateTimeField(blank=True, null=True,
+                                   verbose_name="Sent At")
+
+    objects = OutgoingEmailManager()
+
+    def __unicode__(self):
+        return u"{subject} to {recipient} ({status})".format(
+            subject=self.subject, recipient=self.recipient,
+            status=self.get_status_display())
+
+    def retry_later(self, error, now=None):
+        """
+        Records a failed attempt and schedules the next one, or marks the
+        email as failed once it has used up its attempts.
+        """
+        now = now or timezone.now()
+        self.attempts += 1
+        self.last_error = unicode(error) or error.__class__.__name__
+        if self.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            self.status = OutgoingEmail.FAILED
+        else:
+            delay = settings.EMAIL_OUTBOX_RETRY_DELAY
+            self.next_attempt = now + datetime.timedelta(
+                seconds=delay * 2 ** (self.attempts - 1))
+        self.save(update_fields=['attempts', 'last_error', 'status',
+                                 'next_attempt'])
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Outgoing Email"
+        verbose_name_plural = "Outgoing Emails"
+
+
 class Realtor(Person):
     """
     Represents a realtor.  Each Couple instance has a required foreign key to
@@ -644,17 +1335,41 @@ class Realtor(Person):
                                   .format(user=self.user))
         return super(Realtor, self).clean()
 
-    def get_couples_and_pending_couples(self):
+    def get_couples_and_pending_couples(self, search=None):
         """
         Returns a 2-tuple where the first item is a queryset of Couple
         instances, and the second item is a queryset of PendingCouple instances
         for the realtor.  The Couple query is filtered to exclude those where
-        only one of the homebuyers has registered.
+        only one of the homebuyers has registered.  If search is given, only
+        couples with a (pending) homebuyer whose name or email contains it
+        are returned.
+
+        Everything the realtor dashboard shows for each row is prefetched:
+        homebuyers with their users, and pending homebuyers annotated with
+        their registration status, so iterating the couples is a fixed
+        number of queries no matter how many there are.
         """
-        pending_couples = self.pendingcouple_set.all()
+        PendingHomebuyer = apps.get_model('pending', 'PendingHomebuyer')
+        pending_couples = self.pendingcouple_set.prefetch_related(
+            models.Prefetch('pendinghomebuyer_set',
+                            queryset=(PendingHomebuyer.objects
+                                      .with_registration_status())))
         emails = pending_couples.values_list(
             'pendinghomebuyer__email', flat=True)
-        couples = self.couple_set.exclude(homebuyer__user__email__in=emails)
+        couples = (self.couple_set
+                   .exclude(homebuyer__user__email__in=emails)
+                   .prefetch_related(models.Prefetch(
+                       'homebuyer_set',
+                       queryset=Homebuyer.objects.select_related('user'))))
+        if search:
+            couples = couples.filter(
+                models.Q(homebuyer__user__first_name__icontains=search) |
+                models.Q(homebuyer__user__last_name__icontains=search) |
+                models.Q(homebuyer__user__email__icontains=search)).distinct()
+            pending_couples = pending_couples.filter(
+                models.Q(pendinghomebuyer__first_name__icontains=search) |
+                models.Q(pendinghomebuyer__last_name__icontains=search) |
+                models.Q(pendinghomebuyer__email__icontains=search)).distinct()
         return (couples, pending_couples)
 
     @property
@@ -805,7 +1520,7 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     def send_email_confirmation(self, request):
         """
-        Sends out the email confirmation link to a new user.  Does nothing if
+        Queues the email confirmation link for a new user.  Does nothing if
         the email is already confirmed.
         """
         if self.email_confirmed:
@@ -822,9 +1537,5 @@ class User(AbstractBaseUser, PermissionsMixin):
             name=self.get_short_name(),
             app_name=app_name,
             email_confirmation_link=email_confirmation_link)
-        try:
-            self.email_user(subject, message,
-                            from_email=settings.EMAIL_HOST_USER)
-        except:
-            return False
+        OutgoingEmail.objects.enqueue(subject, message, self.email)
         return True
@@ -0,0 +1,158 @@
+"""
+Opt-in request profiler for production.  With settings.PROFILER_ENABLED,
+ProfilerMiddleware runs cProfile over:
+
+* one in every settings.PROFILER_SAMPLE_RATE requests (0 for none),
+* every request by a user listed in settings.PROFILER_USERS, and
+* every request whose path starts with one of settings.PROFILER_PATHS,
+
+so a page that is only slow for one client can be profiled on the server
+it is slow on.  Each profile is written to settings.PROFILER_DIR as a
+pstats file, which snakeviz, gprof2dot or flameprof can turn into a call
+graph or flame graph, with a JSON file of the request details next to it.
+Only the settings.PROFILER_KEEP slowest profiles of each view are kept.
+
+The profiles are listed, slowest first, on the staff-only /profiles/
+page.
+"""
+import cProfile
+import glob
+import json
+import os
+import pstats
+import random
+import re
+import time
+import uuid
+from StringIO import StringIO
+
+from django.conf import settings
+from django.utils import timezone
+
+__all__ = ['ProfilerMiddleware', 'profile_stats', 'profiles_by_view']
+
+_NAME = re.compile(r'^[\w.-]+$')
+
+
+def _should_profile(request):
+    if request.path.startswith(tuple(settings.PROFILER_PATHS)):
+        return True
+    user = getattr(request, 'user', None)
+    if (user is not None and user.is_authenticated() and
+            user.email in settings.PROFILER_USERS):
+        return True
+    rate = settings.PROFILER_SAMPLE_RATE
+    return bool(rate) and random.randint(1, rate) == 1
+
+
+def _metadata_paths():
+    return glob.glob(os.path.join(settings.PROFILER_DIR, '*.json'))
+
+
+def _load(path):
+    try:
+        with open(path) as data:
+            return json.load(data)
+    except (IOError, ValueError):
+        return None
+
+
+def profiles_by_view():
+    """
+    Returns a list of (view, profiles) pairs, with each view's profiles
+    slowest first.  Each profile is the dict of request details saved with
+    it, including its `name`.
+    """
+    views = {}
+    for path in _metadata_paths():
+        profile = _load(path)
+        if profile is not None:
+            views.setdefault(profile['view'], []).append(profile)
+    return [(view, sorted(profiles, key=lambda p: p['ms'], reverse=True))
+            for view, profiles in sorted(views.items())]
+
+
+def profile_path(name):
+    """
+    Returns the path of the pstats file of the named profile, or None if
+    there is no such profile.
+    """
+    if not _NAME.match(name):
+        return None
+    path = os.path.join(settings.PROFILER_DIR, name + '.prof')
+    return path if os.path.exists(path) else None
+
+
+def profile_stats(name, limit=40):
+    """
+    Returns the named profile's functions with the most cumulative time, as
+    printed by pstats.
+    """
+    output = StringIO()
+    stats = pstats.Stats(profile_path(name), stream=output)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return output.getvalue()
+
+
+def _prune(view):
+    """
+    Deletes all but the settings.PROFILER_KEEP slowest profiles of a view.
+    """
+    profiles = [profile for profile in map(_load, _metadata_paths())
+                if profile is not None and profile['view'] == view]
+    profiles.sort(key=lambda profile: profile['ms'], reverse=True)
+    for profile in profiles[settings.PROFILER_KEEP:]:
+        for extension in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(settings.PROFILER_DIR,
+                                       profile['name'] + extension))
+            except OSError:
+                pass
+
+
+class ProfilerMiddleware(object):
+    """
+    Should be last in MIDDLEWARE_CLASSES, so that the user is known when
+    deciding whether to profile.  The view and the rendering of its
+    response are profiled; the other middleware are not.
+    """
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.PROFILER_ENABLED or not _should_profile(request):
+            return None
+        request._profiler = cProfile.Profile()
+        request._profiler_start = time.time()
+        request._profiler.enable()
+        return None
+
+    def process_response(self, request, response):
+        profiler = getattr(request, '_profiler', None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        del request._profiler
+        elapsed = time.time() - request._profiler_start
+
+        match = request.resolver_match
+        view = (match.url_name or match.func.__name__) if match else None
+        view = view or 'unresolved'
+        name = '{view}-{stamp}-{token}'.format(
+            view=view, stamp=int(time.time()), token=uuid.uuid4().hex[:8])
+        if not os.path.isdir(settings.PROFILER_DIR):
+            os.makedirs(settings.PROFILER_DIR)
+        path = os.path.join(settings.PROFILER_DIR, name)
+        profiler.dump_stats(path + '.prof')
+        user = getattr(request, 'user', None)
+        with open(path + '.json', 'w') as output:
+            json.dump({
+                'name': name,
+                'view': view,
+                'method': request.method,
+                'path': request.get_full_path(),
+                'user': (user.email if user is not None and
+                         user.is_authenticated() else None),
+                'status': response.status_code,
+                'ms': round(elapsed * 1000, 1),
+                'time': timezone.now().isoformat(),
+            }, output)
+        _prune(view)
+        return response
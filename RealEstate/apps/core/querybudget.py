@@ -0,0 +1,179 @@
+"""
+Per-request SQL instrumentation.  QueryBudgetMiddleware records the number
+of queries, the total database time and any repeated query shapes for each
+request, keyed by the name of the view that handled it.
+
+In debug mode the numbers are sent back in an X-Query-Stats header; in
+production they are logged.  settings.QUERY_BUDGETS maps view names to the
+most queries each view should need, and a request over its budget is
+logged as a warning either way.  Tests can use QueryBudgetTestMixin to
+fail when a view goes over budget, so that an N+1 regression shows up in
+the test run rather than in production.
+
+Only queries run before the response is returned are counted, so the rows
+of a StreamingHttpResponse read while streaming are not included.
+"""
+import logging
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.db.backends.utils import CursorDebugWrapper
+
+__all__ = ['QueryBudgetMiddleware', 'QueryBudgetTestMixin', 'QueryStats',
+           'fingerprint']
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'X-Query-Stats'
+
+# The SQLite backend logs queries as "QUERY = '...' - PARAMS = (...)".
+_SQLITE_QUERY = re.compile(r"^QUERY = u?(['\"])(.*)\1 - PARAMS = ", re.S)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN \((?:\?, )*\?\)")
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """
+    Returns the shape of a query: literals replaced with ? and IN lists of
+    any length folded together, so the same query run for different rows
+    has the same fingerprint.
+    """
+    match = _SQLITE_QUERY.match(sql)
+    if match:
+        sql = match.group(2).replace('%s', '?')
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class QueryStats(object):
+    """
+    The queries run for one request.  `duplicates` lists the fingerprints
+    that were run more than once, most repeated first, as (count,
+    fingerprint) pairs.
+    """
+    def __init__(self, view, queries):
+        self.view = view
+        self.count = len(queries)
+        self.db_time = sum(float(query['time']) for query in queries)
+        counts = Counter(fingerprint(query['sql']) for query in queries)
+        self.duplicates = sorted(
+            ((count, shape) for shape, count in counts.items() if count > 1),
+            reverse=True)
+
+    @property
+    def budget(self):
+        return getattr(settings, 'QUERY_BUDGETS', {}).get(self.view)
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.count > self.budget
+
+    def __str__(self):
+        return ('view={view} queries={count} db_ms={db_ms:.1f} '
+                'duplicates={duplicates}').format(
+                    view=self.view, count=self.count,
+                    db_ms=self.db_time * 1000,
+                    duplicates=sum(count for count, _ in self.duplicates))
+
+
+def _view_name(request):
+    """
+    The URL name of the view, or the view's class or function name for
+    unnamed URLs such as the API endpoints.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    return match.url_name or match.func.__name__
+
+
+class _RecordingCursor(CursorDebugWrapper):
+    """
+    A debug cursor that also keeps each query it logs in `queries`, since
+    connection.queries_log only holds the most recent queries.
+    """
+    def __init__(self, cursor, db, queries):
+        super(_RecordingCursor, self).__init__(cursor, db)
+        self.queries = queries
+
+    def execute(self, sql, params=None):
+        try:
+            return super(_RecordingCursor, self).execute(sql, params)
+        finally:
+            self.queries.append(self.db.queries_log[-1])
+
+    def executemany(self, sql, param_list):
+        try:
+            return super(_RecordingCursor, self).executemany(sql, param_list)
+        finally:
+            self.queries.append(self.db.queries_log[-1])
+
+
+class QueryBudgetMiddleware(object):
+    """
+    Should be first in MIDDLEWARE_CLASSES, so that the session and user
+    lookups of the other middleware are counted too.  The stats are left on
+    the response as `query_stats`.
+
+    The database debug cursor is switched on for each request so that
+    queries are recorded even with DEBUG off, and swapped for one that
+    keeps the request's queries in a list of its own.  The connection's
+    query log is capped, so counting from it would undercount a request
+    that ran more queries than the cap.
+    """
+    def process_request(self, request):
+        queries = request._query_budget_queries = []
+        request._query_budget_debug_cursor = connection.force_debug_cursor
+        connection.force_debug_cursor = True
+        connection.make_debug_cursor = (
+            lambda cursor: _RecordingCursor(cursor, connection, queries))
+
+    def process_response(self, request, response):
+        queries = getattr(request, '_query_budget_queries', None)
+        if queries is None:
+            return response
+        connection.force_debug_cursor = request._query_budget_debug_cursor
+        del connection.make_debug_cursor
+        del request._query_budget_queries
+
+        stats = QueryStats(_view_name(request), queries)
+        response.query_stats = stats
+        if settings.DEBUG:
+            response[HEADER] = str(stats)
+        else:
+            logger.info("%s %s", request.path, stats)
+        if stats.over_budget:
+            logger.warning(
+                "%s is over its query budget of %d: %s\nRepeated: %s",
+                request.path, stats.budget, stats,
+                "; ".join("{0}x {1}".format(count, shape)
+                          for count, shape in stats.duplicates) or "none")
+        return response
+
+
+class QueryBudgetTestMixin(object):
+    """
+    TestCase mixin for checking the queries a view ran against its entry
+    in settings.QUERY_BUDGETS.
+    """
+    def assertWithinQueryBudget(self, response, view=None):
+        stats = response.query_stats
+        if view is not None:
+            self.assertEqual(stats.view, view)
+        if stats.budget is None:
+            self.fail("No query budget for view {view}; add it to "
+                      "settings.QUERY_BUDGETS.".format(view=stats.view))
+        if stats.over_budget:
+            self.fail("{view} ran {count} queries, over its budget of "
+                      "{budget}.  Repeated queries:\n{duplicates}".format(
+                          view=stats.view, count=stats.count,
+                          budget=stats.budget,
+                          duplicates="\n".join(
+                              "{0}x {1}".format(count, shape)
+                              for count, shape in stats.duplicates)))
@@ -0,0 +1,322 @@
+"""
+Report computations for a single Couple.  All of the grades and category
+weights for the couple are loaded up front into a (homebuyer x house x
+category) score matrix and a (homebuyer x category) weight matrix, and the
+per-category figures on the report page are derived from those two matrices
+without issuing any further queries.  The overall score of each house is
+read from the HouseScore aggregates, the same way PortfolioReport reads it,
+so both pages show the same number for a house.
+
+Computed report contexts are cached per couple version.  Couple.version is
+bumped in the same transaction as any change to the couple's homebuyers,
+houses, categories, grades or weights, so a report computed from rows read
+before a change commits is stored under a version no later request asks
+for.  The context only holds plain values, so nothing in it goes stale on
+its own.
+
+PortfolioReport summarizes every couple of a realtor side by side, from the
+HouseScore aggregates and grouped counts rather than per-couple reports.
+"""
+import math
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import models
+
+from RealEstate.apps.core.models import (Category, CategoryWeight, Grade,
+                                         House, HouseScore)
+
+__all__ = ['CoupleReport', 'PortfolioReport', 'REPORT_COLORS', 'ReportCache',
+           'report_cache']
+
+
+REPORT_COLORS = ["#286090", "#9BCE7D", "#639BF1", "#3D3C3A", "#98002F",
+                 "#B6A754", "#0193B7", "#5F6024", "#856941", "#ED6639",
+                 "#AB3334", "#0FB493", "#262C3A", "#57102C"]
+
+
+def _matrix(rows, columns, fill):
+    return [[fill] * columns for _ in xrange(rows)]
+
+
+def _color(index):
+    return REPORT_COLORS[index % len(REPORT_COLORS)]
+
+
+class CoupleReport(object):
+    """
+    Builds the report for a Couple.  Homebuyers, categories and houses are
+    kept in their default model ordering, and the matrices below are indexed
+    in that same order:
+
+        scores[homebuyer][house][category]  raw Grade scores
+        weights[homebuyer][category]        raw CategoryWeight weights
+        normalized_weights[homebuyer][category]
+        house_scores[house][category]       weighted score averaged over
+                                            both homebuyers
+        house_totals[house]                 overall score, from HouseScore
+
+    Missing Grade/CategoryWeight rows are treated as the model defaults.
+    """
+    def __init__(self, couple):
+        self.couple = couple
+        self.homebuyers = list(couple.homebuyer_set.select_related('user'))
+        self.categories = list(couple.category_set.all())
+        self.houses = list(couple.house_set.all())
+        self._load_matrices()
+        self._load_totals()
+        self._compute()
+
+    def _load_matrices(self):
+        """
+        Fill the score and weight matrices with one query each.
+        """
+        homebuyer_index = {hb.id: i for i, hb in enumerate(self.homebuyers)}
+        category_index = {c.id: i for i, c in enumerate(self.categories)}
+        house_index = {h.id: i for i, h in enumerate(self.houses)}
+        default_score = Grade._meta.get_field('score').default
+        default_weight = CategoryWeight._meta.get_field('weight').default
+
+        self.scores = [
+            _matrix(len(self.houses), len(self.categories), default_score)
+            for _ in self.homebuyers]
+        self.weights = _matrix(len(self.homebuyers), len(self.categories),
+                               default_weight)
+
+        category_weights = (
+            CategoryWeight.objects
+            .filter(homebuyer__couple=self.couple)
+            .order_by().values_list('homebuyer_id', 'category_id', 'weight'))
+        for homebuyer_id, category_id, weight in category_weights:
+            b = homebuyer_index[homebuyer_id]
+            self.weights[b][category_index[category_id]] = weight
+
+        grades = (Grade.objects
+                  .filter(homebuyer__couple=self.couple)
+                  .order_by()
+                  .values_list('homebuyer_id', 'house_id', 'category_id',
+                               'score'))
+        for homebuyer_id, house_id, category_id, score in grades:
+            b = homebuyer_index[homebuyer_id]
+            h = house_index[house_id]
+            self.scores[b][h][category_index[category_id]] = score
+
+    def _load_totals(self):
+        """
+        Read the overall score of every house from the HouseScore
+        aggregates, with one query.  Summing the rounded per-category
+        scores instead would drift from PortfolioReport by a cent or two.
+        """
+        totals = HouseScore.objects.totals_by_couple(
+            [self.couple],
+            weight_totals={homebuyer.id: homebuyer.category_weight_total
+                           for homebuyer in self.homebuyers})
+        totals = totals.get(self.couple.id, {})
+        self.house_totals = [totals.get(house.id, 0.0)
+                             for house in self.houses]
+
+    def _compute(self):
+        """
+        Derive the normalized weights and weighted per-category house scores
+        from the raw matrices.
+        """
+        self.weight_totals = [sum(row) for row in self.weights]
+        self.normalized_weights = [
+            [float(weight) / total if total else 0.0 for weight in row]
+            for row, total in zip(self.weights, self.weight_totals)]
+
+        # Each homebuyer's weighted score is rounded before averaging, which
+        # matches how the numbers have always been presented on the report.
+        weighted = [
+            [[round(score * weight, 2)
+              for score, weight in zip(house_row, weight_row)]
+             for house_row in homebuyer_scores]
+            for homebuyer_scores, weight_row in zip(self.scores,
+                                                    self.normalized_weights)]
+        count = len(self.homebuyers) or 1
+        self.house_scores = [
+            [round(sum(cells) / count, 2) for cells in zip(*house_cells)]
+            for house_cells in zip(*weighted)]
+
+    def context(self):
+        """
+        Returns the template context for the report page.
+        """
+        categories = [category.summary for category in self.categories]
+        houses = [house.nickname for house in self.houses]
+        num_categories = len(categories)
+        num_houses = len(houses)
+        first, second = self.normalized_weights[0], self.normalized_weights[1]
+
+        category_importance = zip(categories, first, second)
+        largest_weight = max([0.01] + first + second)
+
+        combined_total = sum(self.weight_totals)
+        combined_weights = [sum(column) for column in zip(*self.weights)]
+        pie_average = [
+            (_color(c), summary,
+             int(float(combined_weights[c]) / combined_total * 100)
+             if combined_total else 0)
+            for c, summary in enumerate(categories)]
+
+        category_data = [
+            (summary,
+             [(houses[h], self.house_scores[h][c],
+               _color(num_categories + c * num_houses + h))
+              for h in xrange(num_houses)])
+            for c, summary in enumerate(categories)]
+        house_data = [
+            (nickname,
+             [(categories[c], self.house_scores[h][c],
+               _color(num_houses + h * num_categories + c))
+              for c in xrange(num_categories)])
+            for h, nickname in enumerate(houses)]
+        largest_score = max(
+            [0.01] + [score for row in self.house_scores for score in row])
+
+        total_score = OrderedDict(zip(houses, self.house_totals))
+        min_val = max(min([5.0] + self.house_totals) - 1, 0.0)
+        max_val = min(max([0.0] + self.house_totals) + 0.5, 5.0)
+
+        return {
+            'homebuyer1': {'full_name': self.homebuyers[0].full_name},
+            'homebuyer2': {'full_name': self.homebuyers[1].full_name},
+            'categoryImportance': category_importance,
+            'pieAve': pie_average,
+            'categoryData': category_data,
+            'houseData': house_data,
+            'totalScore': total_score,
+            'largestScore': largest_score,
+            'largestWeight': largest_weight,
+            'categoryNum': int(math.ceil(0.7 * num_categories)),
+            'categoryWidth': num_categories * 65,
+            'houseNum': int(math.ceil(0.7 * num_houses)),
+            'houseWidth': num_houses * 65,
+            'minVal': min_val,
+            'maxVal': max_val,
+        }
+
+
+class PortfolioReport(object):
+    """
+    One summary row per registered couple of a realtor: their best house,
+    the spread between their best and worst house, and how much of the
+    (homebuyer x house x category) grade matrix has been scored.  Everything
+    is read with grouped queries over all of the couples at once, so the
+    number of queries does not depend on how many couples the realtor has.
+
+    Unless settings.SPARSE_GRADES is on, every cell of the matrix has a Grade
+    row from the start at the default score, so only grades that differ from
+    the default count as scored; a deliberate default score cannot be told
+    apart from an untouched one.
+    """
+    FIELDS = ('couple', 'homebuyers', 'emails', 'houses', 'categories',
+              'top_house', 'top_score', 'score_spread', 'grades',
+              'grades_expected', 'completeness', 'report_url')
+
+    def __init__(self, realtor):
+        self.realtor = realtor
+        self.couples = list(realtor.get_couples_and_pending_couples()[0])
+
+    def _count_by_couple(self, queryset, couple_field):
+        return dict(queryset.order_by().values(couple_field)
+                    .annotate(count=models.Count('id'))
+                    .values_list(couple_field, 'count'))
+
+    def rows(self):
+        couple_ids = [couple.id for couple in self.couples]
+        houses = {}
+        for house_id, couple_id, nickname in (
+                House.objects.filter(couple_id__in=couple_ids)
+                .order_by().values_list('id', 'couple_id', 'nickname')):
+            houses.setdefault(couple_id, {})[house_id] = nickname
+        categories = self._count_by_couple(
+            Category.objects.filter(couple_id__in=couple_ids), 'couple_id')
+        scored = Grade.objects.filter(homebuyer__couple_id__in=couple_ids)
+        if not settings.SPARSE_GRADES:
+            scored = scored.exclude(
+                score=Grade._meta.get_field('score').default)
+        grades = self._count_by_couple(scored, 'homebuyer__couple_id')
+        totals = HouseScore.objects.totals_by_couple(couple_ids)
+
+        rows = []
+        for couple in self.couples:
+            homebuyers = couple.homebuyer_set.all()
+            nicknames = houses.get(couple.id, {})
+            scores = sorted(
+                ((score, nicknames[house_id])
+                 for house_id, score in totals.get(couple.id, {}).items()
+                 if house_id in nicknames),
+                key=lambda item: (-item[0], item[1]))
+            expected = (len(homebuyers) * len(nicknames) *
+                        categories.get(couple.id, 0))
+            graded = grades.get(couple.id, 0)
+            rows.append({
+                'couple': couple.id,
+                'homebuyers': u", ".join(
+                    homebuyer.full_name for homebuyer in homebuyers),
+                'emails': couple.emails(),
+                'houses': len(nicknames),
+                'categories': categories.get(couple.id, 0),
+                'top_house': scores[0][1] if scores else None,
+                'top_score': scores[0][0] if scores else None,
+                'score_spread': (round(scores[0][0] - scores[-1][0], 2)
+                                 if scores else None),
+                'grades': graded,
+                'grades_expected': expected,
+                'completeness': (round(float(graded) / expected, 2)
+                                 if expected else None),
+                'report_url': couple.report_url(),
+            })
+        return rows
+
+
+class ReportCache(object):
+    """
+    Stores the computed CoupleReport context for each couple version in the
+    cache backend named by settings.REPORT_CACHE_ALIAS.  The backend is
+    pluggable, but should be shared between worker processes so that a
+    report computed by one process is reused by the others.  Entries for
+    old versions are never read again and are left to expire.  Hit/miss
+    counters are kept per process.
+    """
+    _KEY = 'report:{couple_id}:{version}'
+
+    def __init__(self, alias=None):
+        self.alias = alias or settings.REPORT_CACHE_ALIAS
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _key(self, couple):
+        return self._KEY.format(couple_id=couple.id, version=couple.version)
+
+    def get_context(self, couple):
+        """
+        Returns the report context for the couple, computing and storing it
+        if there is no cached copy.  The couple should be freshly loaded, as
+        its version picks the cache entry.
+        """
+        key = self._key(couple)
+        context = self.cache.get(key)
+        if context is not None:
+            self.hits += 1
+            return context
+        self.misses += 1
+        context = CoupleReport(couple).context()
+        self.cache.set(key, context)
+        return context
+
+    def clear(self):
+        self.cache.clear()
+        self.hits = self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+report_cache = ReportCache()
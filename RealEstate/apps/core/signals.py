@@ -0,0 +1,197 @@
+"""
+Model signal handlers for the core app.  Every handler is bound to the
+specific senders it cares about, so saving unrelated models (sessions,
+users, pending invites, ...) never reaches them.
+
+Creating a Homebuyer, Category or House fills in the couple's
+CategoryWeight/Grade matrix.  Bulk operations can wrap their work in
+defer_grade_matrix() so that the fill runs once per couple when the block
+exits, rather than once per saved object.
+
+Any change to a couple's homebuyers (including their names), houses,
+categories, grades or weights bumps the couple's version, which
+conditional responses use in their ETags.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import models, transaction
+from django.dispatch import receiver
+
+from RealEstate.apps.core import models as core_models
+from RealEstate.apps.core.models import (Category, CategoryWeight, Couple,
+                                         Grade, Homebuyer, House, HouseScore,
+                                         Tombstone, User,
+                                         grade_matrix_changed)
+
+__all__ = ['couple_id_of', 'defer_grade_matrix']
+
+_state = threading.local()
+
+
+@contextmanager
+def defer_grade_matrix():
+    """
+    Collects the couples whose grade matrix needs filling while the block
+    runs, and fills each of them once on a clean exit.  Nested blocks defer
+    to the outermost one.  The block and the fills run in one transaction,
+    so if the block raises, whatever it saved is rolled back rather than
+    left without its grades.
+    """
+    if getattr(_state, 'pending', None) is not None:
+        yield
+        return
+
+    with transaction.atomic():
+        _state.pending = set()
+        try:
+            yield
+            couple_ids = _state.pending
+        finally:
+            _state.pending = None
+        for couple_id in sorted(couple_ids):
+            Couple(id=couple_id).fill_grade_matrix()
+
+
+def couple_id_of(instance):
+    """
+    Returns the couple ID a Homebuyer, Category, House, Grade,
+    CategoryWeight or homebuyer's User belongs to, or None if it can no
+    longer be determined (e.g. the Homebuyer was deleted) or the User is
+    not a homebuyer.
+    """
+    if isinstance(instance, (Homebuyer, Category, House)):
+        return instance.couple_id
+    if isinstance(instance, User):
+        return (Homebuyer.objects.filter(user_id=instance.pk)
+                .values_list('couple_id', flat=True).first())
+    try:
+        return instance.homebuyer.couple_id
+    except Homebuyer.DoesNotExist:
+        return None
+
+
+def _fill_grade_matrix(couple_id):
+    pending = getattr(_state, 'pending', None)
+    if pending is not None:
+        pending.add(couple_id)
+    else:
+        Couple(id=couple_id).fill_grade_matrix()
+
+
+@receiver(models.signals.post_save, sender=Couple)
+def _add_default_categories(sender, instance, created, **kwargs):
+    """
+    Add default categories for a couple when the first Homebuyer registers.
+    """
+    if created:
+        couple = instance
+        categories = [Category(couple_id=couple.id, **category_data)
+                      for category_data in core_models._DEFAULT_CATEGORIES]
+        with transaction.atomic():
+            created_categories = Category.objects.bulk_create(categories)
+            homebuyers = couple.homebuyer_set.all()
+            category_weights = [
+                CategoryWeight(category=category, homebuyer=homebuyer)
+                for category in created_categories
+                for homebuyer in homebuyers]
+            CategoryWeight.objects.bulk_create(category_weights)
+            if category_weights:
+                Homebuyer.objects.sync_category_weight_totals(homebuyers)
+    return
+
+
+@receiver(models.signals.post_save, sender=Homebuyer)
+@receiver(models.signals.post_save, sender=Category)
+@receiver(models.signals.post_save, sender=House)
+def _add_default_weights_and_grades(sender, instance, created, **kwargs):
+    """
+    When a Homebuyer, Category, or House gets created, make sure
+    CategoryWeight/Grade instances exist for all Homebuyers and all
+    Category/House combinations.  Updates to existing instances cannot add
+    cells to the matrix, so they are skipped.
+    """
+    if created:
+        _fill_grade_matrix(instance.couple_id)
+    return
+
+
+@receiver(models.signals.post_delete, sender=Category)
+def _rebuild_house_scores(sender, instance, **kwargs):
+    """
+    Removing a Category removes its weighted score from every house.  The
+    cascaded Grade/CategoryWeight rows are already gone at this point.
+    """
+    HouseScore.objects.rebuild(
+        homebuyers=Homebuyer.objects.filter(couple_id=instance.couple_id))
+    return
+
+
+@receiver(models.signals.post_delete, sender=Category)
+@receiver(models.signals.post_delete, sender=House)
+def _add_tombstone(sender, instance, **kwargs):
+    """
+    Record the deletion for clients syncing changes.
+    """
+    Tombstone.objects.create(
+        kind=Tombstone.HOUSE if sender is House else Tombstone.CATEGORY,
+        object_id=instance.id, couple_id=instance.couple_id)
+    return
+
+
+@receiver(models.signals.post_delete, sender=Couple)
+def _delete_tombstones(sender, instance, **kwargs):
+    """
+    The couple's houses and categories are deleted before the couple, so
+    drop the tombstones they left behind.
+    """
+    Tombstone.objects.filter(couple_id=instance.id).delete()
+    return
+
+
+@receiver(models.signals.post_delete, sender=CategoryWeight)
+def _subtract_category_weight(sender, instance, **kwargs):
+    """
+    Take a deleted weight off the homebuyer's stored total.  This runs in
+    the transaction of the delete, including cascades from Category.
+    """
+    Homebuyer.objects.add_to_category_weight_total(instance.homebuyer_id,
+                                                   -instance.weight)
+    return
+
+
+@receiver(models.signals.post_save, sender=Homebuyer)
+@receiver(models.signals.post_save, sender=Grade)
+@receiver(models.signals.post_save, sender=CategoryWeight)
+@receiver(models.signals.post_save, sender=Category)
+@receiver(models.signals.post_save, sender=House)
+@receiver(models.signals.post_delete, sender=Homebuyer)
+@receiver(models.signals.post_delete, sender=Grade)
+@receiver(models.signals.post_delete, sender=CategoryWeight)
+@receiver(models.signals.post_delete, sender=Category)
+@receiver(models.signals.post_delete, sender=House)
+def _bump_couple_version(sender, instance, **kwargs):
+    """
+    Mark the couple's data as changed, for conditional responses.
+    """
+    Couple.objects.bump_version(couple_id_of(instance))
+    return
+
+
+@receiver(models.signals.post_save, sender=User)
+def _bump_couple_version_after_user_change(sender, instance, update_fields,
+                                           **kwargs):
+    """
+    Homebuyers' names are shown on the couple's pages.  Saves of other
+    fields only, such as last_login on every login, are skipped.
+    """
+    if update_fields and not {'first_name', 'last_name'} & update_fields:
+        return
+    Couple.objects.bump_version(couple_id_of(instance))
+    return
+
+
+@receiver(grade_matrix_changed)
+def _bump_couple_version_after_bulk_write(sender, couple_id, **kwargs):
+    Couple.objects.bump_version(couple_id)
+    return
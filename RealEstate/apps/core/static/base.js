@@ -67,29 +67,94 @@ function deleteData(deleteID) {
     });
 }
 
-// Post slider data.
-function slideChange (slideEvt) {
-    var timer;
-    clearTimeout(timer);
-    var id = $(this).attr("id").toString().replace(/category_/i, "");
+// Slider changes waiting to be saved, by cell. Each change has a seq, which
+// increases with every change, so the server can acknowledge everything up
+// to the latest change it has received. The page token scopes the seqs to
+// this page, so the server can skip changes older than ones it has applied.
+var sliderChanges = {
+    pending: {},
+    seq: 0,
+    saving: false,
+    page: Math.random().toString(36).slice(2, 12) + new Date().getTime().toString(36)
+};
+
+// Posts the pending slider changes to the url in one request. Only one
+// request is in flight at a time; changes made meanwhile are sent with the
+// next one, and a failed request is retried.
+function saveSliderChanges(url) {
+    var batch = $.map(sliderChanges.pending, function(change) {
+        return change;
+    });
+    if (sliderChanges.saving || !batch.length)
+        return;
+    sliderChanges.saving = true;
     $("#save-status").text("saving...").css("color", "#888");
     $.ajax({
         type: "POST",
+        url: url,
         data: {
             csrfmiddlewaretoken: document.getElementsByName('csrfmiddlewaretoken')[0].value,
-            id: id,
-            value: slideEvt.value.newValue,
-            type: "update"
+            page: sliderChanges.page,
+            changes: JSON.stringify(batch)
         },
         success: function(data) {
-            timer = setTimeout(function(){
-                $("#update_"+id).parent().parent().parent().css("background-color", "rgba(0, 255, 0,0.5)");
+            $.each(batch, function(i, change) {
+                var key = change.type + "_" + change.category + "_" + change.house;
+                if (sliderChanges.pending[key] && sliderChanges.pending[key].seq <= data.ack)
+                    delete sliderChanges.pending[key];
+                if ($.inArray(change.seq, data.rejected) < 0) {
+                    $("#update_"+change.category).parent().parent().parent()
+                        .css("background-color", "rgba(0, 255, 0,0.5)")
+                        .animate({backgroundColor: "#fff"}, 3000);
+                }
+            });
+            if ($.isEmptyObject(sliderChanges.pending))
                 $("#save-status").text("All changes saved.").show().css("color", "#333");
-                $("#update_"+id).parent().parent().parent().animate({backgroundColor: "#fff"}, 3000);
-            }, 1500);
+        },
+        complete: function(xhr) {
+            sliderChanges.saving = false;
+            if (!$.isEmptyObject(sliderChanges.pending))
+                setTimeout(function() {
+                    saveSliderChanges(url);
+                }, xhr.status === 200 ? 0 : 3000);
         }
     });
-};
+}
+
+// Queues slider changes and saves them in batches. Sliders need a
+// category_<id> id and a data-change-type of "score" or "weight"; score
+// sliders also need a data-house. Changes still pending when the page is
+// left are sent with sendBeacon where the browser supports it.
+// EXAMPLE: queueSliderChanges(".slide", "/slider-changes/")
+function queueSliderChanges(selector, url) {
+    var save = $.debounce(700, function() {
+        saveSliderChanges(url);
+    });
+    $(selector).change(function(slideEvt) {
+        var change = {
+            seq: ++sliderChanges.seq,
+            type: $(this).data("change-type"),
+            category: $(this).attr("id").toString().replace(/category_/i, ""),
+            house: $(this).data("house") || null,
+            value: slideEvt.value.newValue
+        };
+        sliderChanges.pending[change.type + "_" + change.category + "_" + change.house] = change;
+        $("#save-status").text("saving...").css("color", "#888");
+        save();
+    });
+    $(window).on("pagehide", function() {
+        var batch = $.map(sliderChanges.pending, function(change) {
+            return change;
+        });
+        if (!batch.length || !navigator.sendBeacon)
+            return;
+        var data = new FormData();
+        data.append("csrfmiddlewaretoken", document.getElementsByName('csrfmiddlewaretoken')[0].value);
+        data.append("page", sliderChanges.page);
+        data.append("changes", JSON.stringify(batch));
+        navigator.sendBeacon(url, data);
+    });
+}
 
 
 // Close dismissable message windows.
@@ -122,3 +187,62 @@ function openModalOnError(id) {
         $(id).modal();
     }
 }
+
+// Loads the next page of rows into a server-paginated list. The list needs
+// data-url (returns {html, next}) and data-next (the cursor, empty once
+// everything is loaded) attributes. With replace, the list is reloaded from
+// the first page, e.g. after the search changes.
+function loadRows($list, replace) {
+    var next = $list.data("next");
+    if ($list.data("loading") || (!replace && !next))
+        return;
+    $list.data("loading", true);
+    $.ajax({
+        type: "GET",
+        url: $list.data("url"),
+        data: {
+            after: replace ? "" : next,
+            q: $list.data("search") || ""
+        },
+        success: function(data) {
+            if (replace)
+                $list.empty();
+            $list.append(data.html);
+            $list.data("next", data.next || "");
+        },
+        complete: function() {
+            $list.data("loading", false);
+        }
+    });
+}
+
+// Loads more rows into the first unfinished list when the user scrolls near
+// the bottom of the page.
+// EXAMPLE: loadRowsOnScroll(".dashboard-rows")
+function loadRowsOnScroll(selector) {
+    $(window).scroll($.throttle(250, function() {
+        var bottom = $(window).scrollTop() + $(window).height();
+        if (bottom < $(document).height() - 200)
+            return;
+        var $lists = $(selector).filter(function() {
+            return $(this).data("next");
+        });
+        if ($lists.length)
+            loadRows($lists.first());
+    }));
+}
+
+// Filters server-paginated lists as the user types in a search input.
+// EXAMPLE: searchRows("#client-search", ".dashboard-rows")
+function searchRows(input, selector) {
+    $(input).closest("form").submit(function(e) {
+        e.preventDefault();
+    });
+    $(input).on("input", $.debounce(300, function() {
+        var search = $(this).val();
+        $(selector).each(function() {
+            $(this).data("search", search);
+            loadRows($(this), true);
+        });
+    }));
+}
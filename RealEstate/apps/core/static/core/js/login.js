@@ -37,8 +37,14 @@
                   resetForm(self, "Login Failed");
               }
           },
-          error: function() {
-              resetForm(self, "Server Error");
+          error: function(xhr) {
+              if (xhr.status === 429) {
+                  var wait = xhr.getResponseHeader('Retry-After');
+                  resetForm(self, "Too many login attempts. Try again in " +
+                                  wait + " seconds.");
+              } else {
+                  resetForm(self, "Server Error");
+              }
           },
         });
     });
@@ -0,0 +1,104 @@
+"""
+Delta sync for offline-capable clients.  changes() returns a homebuyer's
+houses, categories, grades and weights that changed since a cursor, plus
+tombstones for the houses and categories deleted since then, so a client
+only downloads what it does not have yet.
+
+The cursor is a number of microseconds since the epoch, compared with the
+updated_at column of each row.  A row saved by a transaction that commits
+after another one can carry the earlier timestamp, so the next cursor
+lags settings.SYNC_CURSOR_LAG seconds behind the time of the request:
+rows changed within that window are sent again by the next sync, which
+clients apply idempotently, rather than being skipped.  Without a cursor,
+everything is returned and there are no tombstones.
+"""
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from RealEstate.apps.core.models import (Category, CategoryWeight, Grade,
+                                         House, Tombstone)
+
+__all__ = ['changes', 'parse_cursor']
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _to_cursor(moment):
+    delta = moment - _EPOCH
+    return ((delta.days * 86400 + delta.seconds) * 10 ** 6 +
+            delta.microseconds)
+
+
+def _from_cursor(cursor):
+    return _EPOCH + datetime.timedelta(microseconds=cursor)
+
+
+def parse_cursor(value):
+    """
+    Returns the cursor in a `since` parameter, or None if it is empty.
+    Raises ValueError if it is not a cursor, including one in the future:
+    changes() never hands those out, and one would hide every change made
+    until then.
+    """
+    if not value:
+        return None
+    cursor = int(value)
+    if cursor < 0:
+        raise ValueError("Cursors are not negative.")
+    if cursor > _to_cursor(timezone.now()):
+        raise ValueError("Cursors are not in the future.")
+    return cursor
+
+
+def changes(homebuyer, since=None):
+    """
+    Returns a dict of the homebuyer's couple's houses and categories and
+    the homebuyer's own grades and weights that changed after the `since`
+    cursor (all of them if it is None), the IDs of the houses and
+    categories deleted after it, and the cursor to send next time.
+    """
+    now = timezone.now()
+    couple_id = homebuyer.couple_id
+    houses = House.objects.filter(couple_id=couple_id)
+    categories = Category.objects.filter(couple_id=couple_id)
+    grades = Grade.objects.filter(homebuyer=homebuyer)
+    weights = CategoryWeight.objects.filter(homebuyer=homebuyer)
+    deleted = {'houses': [], 'categories': []}
+    if since is not None:
+        changed_after = _from_cursor(since)
+        houses = houses.filter(updated_at__gt=changed_after)
+        categories = categories.filter(updated_at__gt=changed_after)
+        grades = grades.filter(updated_at__gt=changed_after)
+        weights = weights.filter(updated_at__gt=changed_after)
+        for kind, object_id in (
+                Tombstone.objects.filter(couple_id=couple_id,
+                                         deleted_at__gt=changed_after)
+                .order_by('id').values_list('kind', 'object_id')):
+            deleted['houses' if kind == Tombstone.HOUSE
+                    else 'categories'].append(object_id)
+
+    lagged = _to_cursor(now - datetime.timedelta(
+        seconds=settings.SYNC_CURSOR_LAG))
+    return {
+        'cursor': max(lagged, since or 0),
+        'full': since is None,
+        'houses': [
+            {'id': pk, 'nickname': nickname, 'address': address}
+            for pk, nickname, address in houses.order_by('id').values_list(
+                'id', 'nickname', 'address')],
+        'categories': [
+            {'id': pk, 'summary': summary, 'description': description}
+            for pk, summary, description in categories.order_by('id')
+            .values_list('id', 'summary', 'description')],
+        'grades': [
+            {'house': house, 'category': category, 'score': score}
+            for house, category, score in grades.order_by('id').values_list(
+                'house_id', 'category_id', 'score')],
+        'weights': [
+            {'category': category, 'weight': weight}
+            for category, weight in weights.order_by('id').values_list(
+                'category_id', 'weight')],
+        'deleted': deleted,
+    }
@@ -0,0 +1,32 @@
+"""
+Test runner for the project, set as settings.TEST_RUNNER.
+"""
+import shutil
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from RealEstate.apps.core import metrics
+
+__all__ = ['TestRunner']
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs the tests with METRICS_DIR pointed at a temporary directory, which
+    is removed afterwards, so that the requests made by tests neither leave
+    files in the shared metrics directory nor show up in its numbers.
+    """
+    def setup_test_environment(self, **kwargs):
+        super(TestRunner, self).setup_test_environment(**kwargs)
+        self.metrics_dir = tempfile.mkdtemp(prefix='realestate-metrics-')
+        self.metrics_settings = override_settings(
+            METRICS_DIR=self.metrics_dir)
+        self.metrics_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.metrics_settings.disable()
+        metrics.registry.discard(self.metrics_dir)
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        super(TestRunner, self).teardown_test_environment(**kwargs)
@@ -0,0 +1,1139 @@
+import datetime
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from collections import OrderedDict
+from StringIO import StringIO
+
+from django.core import mail
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from RealEstate.apps.core.models import (Category, CategoryWeight, Couple,
+                                         Grade, Homebuyer, House, HouseScore,
+                                         OutgoingEmail, Realtor, User)
+from RealEstate.apps.core import (benchmarks, metrics, profiling,
+                                  querybudget)
+from RealEstate.apps.core.exports import _rows
+from RealEstate.apps.core.identity import get_identity
+from RealEstate.apps.core.querybudget import (QueryBudgetTestMixin,
+                                              QueryStats, fingerprint)
+from RealEstate.apps.core.imports import HouseImport, parse_house_rows
+from RealEstate.apps.core.reports import (CoupleReport, PortfolioReport,
+                                          report_cache)
+from RealEstate.apps.core.signals import defer_grade_matrix
+from RealEstate.apps.core.throttling import LoginThrottle
+from RealEstate.apps.pending.models import PendingCouple, PendingHomebuyer
+
+
+class CoupleTestMixin(object):
+    """
+    Creates a Realtor with a single fully registered Couple.  The Couple
+    starts out with the default categories and no houses.
+    """
+    def _create_user(self, email):
+        return User.objects.create_user(email=email, password='password',
+                                        first_name=email.split('@')[0],
+                                        last_name='Test')
+
+    def _create_couple(self, realtor=None, prefix='hb'):
+        realtor = realtor or self.realtor
+        couple = Couple.objects.create(realtor=realtor)
+        homebuyers = [
+            Homebuyer.objects.create(
+                user=self._create_user('{prefix}{n}@test.com'
+                                       .format(prefix=prefix, n=n)),
+                couple=couple)
+            for n in (1, 2)]
+        return couple, homebuyers
+
+    def setUp(self):
+        super(CoupleTestMixin, self).setUp()
+        report_cache.clear()
+        self.realtor = Realtor.objects.create(
+            user=self._create_user('realtor@test.com'))
+        self.couple, self.homebuyers = self._create_couple()
+
+
+class GradedCoupleMixin(CoupleTestMixin):
+    """
+    Two categories and two houses, with a handful of non-default grades and
+    weights so the report numbers are easy to check by hand.
+    """
+    def setUp(self):
+        super(GradedCoupleMixin, self).setUp()
+        Category.objects.filter(couple=self.couple).exclude(
+            summary='Condition').delete()
+        self.category = Category.objects.get(couple=self.couple)
+        Category.objects.create(couple=self.couple, summary='Kitchen')
+        self.house_a = House.objects.create(couple=self.couple, nickname='A')
+        self.house_b = House.objects.create(couple=self.couple, nickname='B')
+        first, second = self.homebuyers
+        self._set_weight(first, self.category, 1)
+        self._set_score(first, self.house_a, self.category, 5)
+        self._set_score(second, self.house_b, self.category, 1)
+
+    def _set_weight(self, homebuyer, category, weight):
+        category_weight = CategoryWeight.objects.get(homebuyer=homebuyer,
+                                                     category=category)
+        category_weight.weight = weight
+        category_weight.save()
+
+    def _set_score(self, homebuyer, house, category, score):
+        grade = Grade.objects.get(homebuyer=homebuyer, house=house,
+                                  category=category)
+        grade.score = score
+        grade.save()
+
+
+class CoupleReportTest(GradedCoupleMixin, TestCase):
+    def test_matrices_loaded_in_fixed_number_of_queries(self):
+        with self.assertNumQueries(6):
+            report = CoupleReport(self.couple)
+        self.assertEqual(report.weights, [[1, 3], [3, 3]])
+        self.assertEqual(report.scores[0], [[5, 3], [3, 3]])
+        self.assertEqual(report.scores[1], [[3, 3], [1, 3]])
+
+    def test_context(self):
+        context = CoupleReport(self.couple).context()
+        self.assertEqual(context['categoryImportance'],
+                         [('Condition', 0.25, 0.5), ('Kitchen', 0.75, 0.5)])
+        self.assertEqual(context['pieAve'][0][1:], ('Condition', 40))
+        condition, kitchen = context['categoryData']
+        self.assertEqual([(h, s) for h, s, _ in condition[1]],
+                         [('A', 1.38), ('B', 0.63)])
+        self.assertEqual([(h, s) for h, s, _ in kitchen[1]],
+                         [('A', 1.88), ('B', 1.88)])
+        self.assertEqual(context['totalScore'].items(),
+                         [('A', 3.25), ('B', 2.5)])
+        self.assertAlmostEqual(context['minVal'], 1.5)
+        self.assertAlmostEqual(context['maxVal'], 3.75)
+
+
+class ReportViewTest(QueryBudgetTestMixin, GradedCoupleMixin, TestCase):
+    def test_report_renders(self):
+        self.client.login(email='realtor@test.com', password='password')
+        response = self.client.get(self.couple.report_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response, 'report')
+        self.assertEqual(response.context['totalScore']['A'], 3.25)
+
+
+class PortfolioReportTest(GradedCoupleMixin, TestCase):
+    def test_rows(self):
+        other_couple, _ = self._create_couple(prefix='other')
+        with self.assertNumQueries(7):
+            rows = PortfolioReport(self.realtor).rows()
+        row, other_row = sorted(rows, key=lambda row: row['couple'])
+        self.assertEqual(row['top_house'], 'A')
+        self.assertEqual(row['top_score'], 3.25)
+        self.assertEqual(row['score_spread'], 0.75)
+        self.assertEqual((row['grades'], row['grades_expected']), (2, 8))
+        self.assertEqual(row['completeness'], 0.25)
+        self.assertEqual(row['emails'], 'hb1@test.com,hb2@test.com')
+        self.assertEqual(other_row['houses'], 0)
+        self.assertIsNone(other_row['top_house'])
+        self.assertIsNone(other_row['completeness'])
+
+    def test_top_score_matches_report(self):
+        self._set_score(self.homebuyers[1], self.house_a, self.category, 4)
+        row = PortfolioReport(self.realtor).rows()[0]
+        context = CoupleReport(self.couple).context()
+        self.assertEqual(row['top_house'], 'A')
+        self.assertEqual(row['top_score'], context['totalScore']['A'])
+        self.assertEqual(row['score_spread'],
+                         round(context['totalScore']['A'] -
+                               context['totalScore']['B'], 2))
+
+    @override_settings(SPARSE_GRADES=True)
+    def test_completeness_sparse(self):
+        couple, homebuyers = self._create_couple(prefix='sparse')
+        house = House.objects.create(couple=couple, nickname='A')
+        category = Category.objects.filter(couple=couple).first()
+        Grade.objects.set_scores(homebuyers[0], {(house.id, category.id): 3})
+        row = [row for row in PortfolioReport(self.realtor).rows()
+               if row['couple'] == couple.id][0]
+        self.assertEqual((row['grades'], row['grades_expected']), (1, 6))
+        self.assertEqual(row['completeness'], 0.17)
+
+    def test_query_count_independent_of_couples(self):
+        for n in range(5):
+            couple, _ = self._create_couple(prefix='c{n}-'.format(n=n))
+            House.objects.create(couple=couple, nickname='A')
+        with self.assertNumQueries(7):
+            self.assertEqual(len(PortfolioReport(self.realtor).rows()), 6)
+
+    def test_view_formats(self):
+        self.client.login(email='realtor@test.com', password='password')
+        data = json.loads(self.client.get('/portfolio/').content)
+        self.assertEqual(data['couples'][0]['top_house'], 'A')
+        response = self.client.get('/portfolio/', {'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        header, row = response.content.splitlines()
+        self.assertEqual(header.split(',')[:2], ['couple', 'homebuyers'])
+        self.assertIn(',A,3.25,0.75,2,8,0.25,', row)
+
+
+class ExportTest(GradedCoupleMixin, TestCase):
+    def test_batches_cover_every_row(self):
+        with self.assertNumQueries(3):
+            ids = [row[0] for row in _rows('grades', batch_size=3)]
+        self.assertEqual(ids, list(Grade.objects.order_by('id')
+                                   .values_list('id', flat=True)))
+
+    def test_view_streams_only_realtor_rows(self):
+        other_realtor = Realtor.objects.create(
+            user=self._create_user('other-realtor@test.com'))
+        self._create_couple(realtor=other_realtor, prefix='other')
+        self.client.login(email='realtor@test.com', password='password')
+
+        response = self.client.get('/export/grades/')
+        self.assertTrue(response.streaming)
+        lines = ''.join(response.streaming_content).splitlines()
+        self.assertEqual(lines[0], 'id,couple,homebuyer,house_id,house,'
+                                   'category_id,category,score')
+        self.assertEqual(len(lines), 1 + 2 * 2 * 2)
+        self.assertIn(',hb1@test.com,{id},A,'.format(id=self.house_a.id),
+                      lines[1])
+
+        response = self.client.get('/export/weights/', {
+            'format': 'ndjson', 'couple': self.couple.id})
+        records = [json.loads(line, object_pairs_hook=OrderedDict)
+                   for line in ''.join(response.streaming_content)
+                   .splitlines()]
+        self.assertEqual(len(records), 2 * 2)
+        self.assertEqual(records[0].keys(), ['id', 'couple', 'homebuyer',
+                                             'category_id', 'category',
+                                             'weight'])
+        self.assertEqual(records[0]['weight'], 1)
+
+    def test_updated_window(self):
+        self.client.login(email='realtor@test.com', password='password')
+        since = timezone.now()
+        Grade.objects.set_scores(self.homebuyers[1],
+                                 {(self.house_a.id, self.category.id): 2})
+
+        def scores(**params):
+            response = self.client.get('/export/grades/',
+                                       dict(params, format='ndjson'))
+            self.assertEqual(response.status_code, 200)
+            return [json.loads(line)['score'] for line in
+                    ''.join(response.streaming_content).splitlines()]
+
+        self.assertEqual(scores(since=since.isoformat()), [2])
+        self.assertEqual(len(scores(until=since.isoformat())), 2 * 2 * 2 - 1)
+        self.assertEqual(scores(since='2000-01-01', until='2000-01-02'), [])
+        self.assertEqual(self.client.get('/export/grades/', {
+            'since': 'yesterday'}).status_code, 400)
+
+        output = StringIO()
+        call_command('export_grades', '--since', since.isoformat(),
+                     stdout=output)
+        self.assertEqual(len(output.getvalue().splitlines()), 1 + 1)
+
+
+class HouseImportTest(GradedCoupleMixin, TestCase):
+    def test_valid_rows_imported_and_errors_reported(self):
+        other_couple, _ = self._create_couple(
+            realtor=Realtor.objects.create(
+                user=self._create_user('other-realtor@test.com')),
+            prefix='other')
+        rows = parse_house_rows(
+            'couple,nickname,address\n'
+            '{id},C,1 Main St\n'
+            '{id},A,\n'
+            '{id},C,\n'
+            '{other},D,\n'
+            'x,E,\n'
+            '{id},,\n'
+            '{id},F,\n'.format(id=self.couple.id, other=other_couple.id),
+            'csv')
+        report_cache.get_context(Couple.objects.get(id=self.couple.id))
+
+        created, errors = HouseImport(rows, realtor=self.realtor).run()
+        self.assertEqual(created, 2)
+        self.assertEqual([error['row'] for error in errors], [2, 3, 4, 5, 6])
+        self.assertEqual(errors[0]['errors'], [u"House 'A' already exists."])
+        self.assertEqual(errors[2]['errors'], [u"No such couple."])
+        self.assertIn('nickname', errors[4]['errors'][0])
+
+        house = House.objects.get(couple=self.couple, nickname='C')
+        self.assertEqual(house.address, '1 Main St')
+        self.assertEqual(
+            Grade.objects.filter(house__couple=self.couple).count(),
+            2 * 4 * 2)
+        self.assertEqual(
+            HouseScore.objects.filter(couple=self.couple).count(), 2 * 4)
+        context = report_cache.get_context(
+            Couple.objects.get(id=self.couple.id))
+        self.assertEqual(sorted(context['totalScore']), ['A', 'B', 'C', 'F'])
+
+    def test_multi_line_address(self):
+        rows = parse_house_rows(
+            'couple,nickname,address\r\n'
+            '{id},C,"1 Main St\nApt 2"\r\n'.format(id=self.couple.id), 'csv')
+        self.assertEqual(HouseImport(rows).run(), (1, []))
+        self.assertEqual(House.objects.get(nickname='C').address,
+                         '1 Main St\nApt 2')
+
+    def test_malformed_rows_reported(self):
+        rows = parse_house_rows(
+            'couple,nickname\n'
+            '{id},C,extra\n'
+            '{id},D\n'.format(id=self.couple.id), 'csv')
+        rows.extend([{'couple': self.couple.id, 'nickname': 5},
+                     {'couple': self.couple.id, 'nickname': 'E',
+                      'address': ['1 Main St']}])
+        created, errors = HouseImport(rows, realtor=self.realtor).run()
+        self.assertEqual(created, 1)
+        self.assertEqual(errors, [
+            {'row': 1, 'errors': [u"Row has more fields than the header."]},
+            {'row': 3, 'errors': [u"nickname: must be text."]},
+            {'row': 4, 'errors': [u"address: must be text."]}])
+
+    def test_fixed_query_count(self):
+        rows = [{'couple': self.couple.id, 'nickname': 'H{n}'.format(n=n)}
+                for n in range(50)]
+        with self.assertNumQueries(26):
+            created, errors = HouseImport(rows, realtor=self.realtor).run()
+        self.assertEqual((created, errors), (50, []))
+
+    def test_view(self):
+        self.client.login(email='realtor@test.com', password='password')
+        upload = SimpleUploadedFile('houses.json', json.dumps(
+            [{'couple': self.couple.id, 'nickname': 'C'}, {}]))
+        data = json.loads(self.client.post(
+            '/import/houses/', {'file': upload}).content)
+        self.assertEqual(data['created'], 1)
+        self.assertEqual(data['errors'][0]['row'], 2)
+
+        upload = SimpleUploadedFile('houses.csv', 'nickname\nC\n')
+        response = self.client.post('/import/houses/', {'file': upload})
+        self.assertEqual(response.status_code, 400)
+
+
+class BenchmarkTest(TestCase):
+    def test_seed_run_and_clear(self):
+        benchmarks.seed(realtors=2, couples=2, houses=3, categories=4,
+                        password='benchmark')
+        self.assertEqual(Couple.objects.count(), 2 * 2)
+        self.assertEqual(Category.objects.count(), 2 * 2 * 4)
+        self.assertEqual(Grade.objects.count(), 2 * 2 * 2 * 3 * 4)
+        self.assertEqual(HouseScore.objects.count(), 2 * 2 * 2 * 3)
+        self.assertEqual(HouseScore.objects.rebuild(dry_run=True), [])
+
+        results = benchmarks.run('benchmark', repeat=2)
+        self.assertEqual([result['name'] for result in results['benchmarks']],
+                         [name for name, _, _ in benchmarks.BENCHMARKS])
+        for result in results['benchmarks']:
+            self.assertEqual([run['status'] for run in result['runs']],
+                             [200, 200], result['name'])
+            self.assertTrue(result['first']['queries'])
+        self.assertEqual(results['counts']['grades'], 96)
+        json.dumps(results)
+
+        self.assertEqual(benchmarks.clear(), 2 * (1 + 2 * 2))
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Grade.objects.exists())
+        self.assertFalse(Couple.objects.exists())
+
+
+class ConditionalReportTest(GradedCoupleMixin, TestCase):
+    def setUp(self):
+        super(ConditionalReportTest, self).setUp()
+        self.url = self.couple.report_url()
+        self.client.login(email='hb1@test.com', password='password')
+
+    def _get(self, etag):
+        return self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_not_modified_until_couple_changes(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(self._get(etag).status_code, 304)
+
+        Grade.objects.set_scores(self.homebuyers[1],
+                                 {(self.house_a.id, self.category.id): 1})
+        response = self._get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        etag = response['ETag']
+
+        self._set_weight(self.homebuyers[1], self.category, 4)
+        response = self._get(etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        user = self.homebuyers[1].user
+        user.last_name = 'Renamed'
+        user.save()
+        self.assertEqual(self._get(etag).status_code, 200)
+
+        self.client.login(email='realtor@test.com', password='password')
+        self.assertEqual(self._get(etag).status_code, 200)
+
+    def test_updated_at(self):
+        before = timezone.now()
+        grade = Grade.objects.get(homebuyer=self.homebuyers[1],
+                                  house=self.house_a, category=self.category)
+        self.assertLess(grade.updated_at, before)
+        Grade.objects.set_scores(self.homebuyers[1],
+                                 {(self.house_a.id, self.category.id): 1})
+        grade = Grade.objects.get(id=grade.id)
+        self.assertGreaterEqual(grade.updated_at, before)
+
+
+class ReportCacheTest(GradedCoupleMixin, TestCase):
+    def _context(self, couple=None):
+        couple = Couple.objects.get(id=(couple or self.couple).id)
+        return report_cache.get_context(couple)
+
+    def test_second_read_is_a_hit(self):
+        couple = Couple.objects.get(id=self.couple.id)
+        report_cache.get_context(couple)
+        with self.assertNumQueries(0):
+            context = report_cache.get_context(couple)
+        self.assertEqual(context['totalScore']['A'], 3.25)
+        self.assertEqual(report_cache.stats(), {'hits': 1, 'misses': 1})
+
+    def test_grade_save_invalidates_only_that_couple(self):
+        other_couple, _ = self._create_couple(prefix='other')
+        self._context()
+        self._context(other_couple)
+
+        self._set_score(self.homebuyers[0], self.house_a, self.category, 1)
+
+        context = self._context()
+        self.assertEqual(context['totalScore']['A'], 2.75)
+        self._context(other_couple)
+        self.assertEqual(report_cache.stats(), {'hits': 1, 'misses': 3})
+
+    def test_stale_version_is_not_read(self):
+        stale = Couple.objects.get(id=self.couple.id)
+        self._set_score(self.homebuyers[0], self.house_a, self.category, 1)
+        # A report computed from rows read before the change committed is
+        # stored under the old version, which later requests do not use.
+        report_cache.get_context(stale)
+        context = self._context()
+        self.assertEqual(context['totalScore']['A'], 2.75)
+        self.assertEqual(report_cache.stats(), {'hits': 0, 'misses': 2})
+
+    def test_name_change_invalidates(self):
+        self._context()
+        user = self.homebuyers[0].user
+        User.objects.get(id=user.id).save(update_fields=['last_login'])
+        couple = Couple.objects.get(id=self.couple.id)
+        with self.assertNumQueries(0):
+            report_cache.get_context(couple)
+
+        user.first_name = 'Renamed'
+        user.save()
+        context = self._context()
+        self.assertEqual(context['homebuyer1'], {'full_name': 'Renamed Test'})
+        self.assertEqual(report_cache.stats(), {'hits': 1, 'misses': 2})
+
+    def test_house_delete_invalidates(self):
+        self._context()
+        self.house_b.delete()
+        context = self._context()
+        self.assertEqual(context['totalScore'].keys(), ['A'])
+
+
+class HouseScoreTest(GradedCoupleMixin, TestCase):
+    def _assert_in_sync(self):
+        self.assertEqual(HouseScore.objects.rebuild(dry_run=True), [])
+
+    def test_maintained_through_writes(self):
+        self._assert_in_sync()
+        self.assertEqual(
+            HouseScore.objects.get(house=self.house_a,
+                                   homebuyer=self.homebuyers[0]).weighted_sum,
+            5 * 1 + 3 * 3)
+
+        self._set_weight(self.homebuyers[1], self.category, 5)
+        self._assert_in_sync()
+        Grade.objects.update_or_create(
+            homebuyer=self.homebuyers[1], house=self.house_a,
+            category=self.category, defaults={'score': 4})
+        self._assert_in_sync()
+
+        Category.objects.create(couple=self.couple, summary='Noise')
+        House.objects.create(couple=self.couple, nickname='C')
+        self._assert_in_sync()
+        Category.objects.get(couple=self.couple, summary='Kitchen').delete()
+        self._assert_in_sync()
+
+    def test_totals_match_report(self):
+        totals = HouseScore.objects.totals(self.couple)
+        self.assertEqual(totals, {self.house_a.id: 3.25,
+                                  self.house_b.id: 2.5})
+
+    def test_rebuild_repairs_drift(self):
+        HouseScore.objects.filter(house=self.house_a).update(weighted_sum=0)
+        HouseScore.objects.filter(house=self.house_b).delete()
+        self.assertEqual(len(HouseScore.objects.rebuild()), 4)
+        self._assert_in_sync()
+
+
+class CategoryWeightTotalTest(GradedCoupleMixin, TestCase):
+    def _assert_in_sync(self):
+        self.assertEqual(
+            Homebuyer.objects.sync_category_weight_totals(dry_run=True), [])
+
+    def _total(self, homebuyer):
+        return Homebuyer.objects.get(id=homebuyer.id).category_weight_total
+
+    def test_maintained_through_writes(self):
+        first, second = self.homebuyers
+        self._assert_in_sync()
+        self.assertEqual(self._total(first), 1 + 3)
+
+        self._set_weight(second, self.category, 5)
+        self.assertEqual(self._total(second), 5 + 3)
+        Category.objects.create(couple=self.couple, summary='Noise')
+        self.assertEqual(self._total(second), 5 + 3 + 3)
+        self._assert_in_sync()
+
+        first = Homebuyer.objects.get(id=first.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(first.category_weight_total, 1 + 3 + 3)
+        self.category.delete()
+        self.assertEqual(self._total(second), 3 + 3)
+        self._assert_in_sync()
+
+    def test_command_repairs_drift(self):
+        Homebuyer.objects.update(category_weight_total=0)
+        with self.assertRaises(CommandError):
+            call_command('sync_category_weight_totals', verify=True,
+                         stdout=StringIO())
+        call_command('sync_category_weight_totals', stdout=StringIO())
+        self._assert_in_sync()
+
+
+class CategoryManagerTest(GradedCoupleMixin, TestCase):
+    def test_with_scores_and_weights(self):
+        first = self.homebuyers[0]
+        # Large IDs are not interned, so they used to be missed by an `is`
+        # comparison when merging in Python.
+        Category.objects.create(id=1000, couple=self.couple, summary='Yard')
+        with self.assertNumQueries(1):
+            scores = Category.objects.with_scores(first, self.house_a)
+        self.assertEqual([(c.summary, score) for c, score in scores],
+                         [('Condition', 5), ('Kitchen', 3), ('Yard', 3)])
+        with self.assertNumQueries(1):
+            weights = Category.objects.with_weights(first)
+        self.assertEqual([(c.summary, weight) for c, weight in weights],
+                         [('Condition', 1), ('Kitchen', 3), ('Yard', 3)])
+
+        Grade.objects.filter(category_id=1000).delete()
+        self.assertEqual(Category.objects.with_scores(first,
+                                                      self.house_a)[2][1],
+                         None)
+
+
+class SliderChangesTest(QueryBudgetTestMixin, GradedCoupleMixin, TestCase):
+    def _post(self, changes, page='page1'):
+        return self.client.post('/slider-changes/',
+                                {'changes': json.dumps(changes),
+                                 'page': page})
+
+    def test_latest_change_per_cell_applied(self):
+        first = self.homebuyers[0]
+        other_couple, _ = self._create_couple(prefix='other')
+        other_category = Category.objects.filter(couple=other_couple).first()
+        kitchen = Category.objects.get(couple=self.couple, summary='Kitchen')
+        self.client.login(email='hb1@test.com', password='password')
+        response = self._post([
+            {'seq': 1, 'type': 'score', 'category': self.category.id,
+             'house': self.house_a.id, 'value': 2},
+            {'seq': 3, 'type': 'score', 'category': self.category.id,
+             'house': self.house_a.id, 'value': 4},
+            {'seq': 2, 'type': 'score', 'category': self.category.id,
+             'house': self.house_a.id, 'value': 1},
+            {'seq': 4, 'type': 'score', 'category': kitchen.id,
+             'house': self.house_b.id, 'value': 9},
+        ])
+        self.assertWithinQueryBudget(response, 'slider-changes')
+        self.assertEqual(json.loads(response.content),
+                         {'ack': 4, 'changed': 1, 'rejected': [4]})
+        response = self._post([
+            {'seq': 5, 'type': 'weight', 'category': kitchen.id, 'value': 5},
+            {'seq': 6, 'type': 'weight', 'category': other_category.id,
+             'value': 5},
+        ])
+        self.assertWithinQueryBudget(response, 'slider-changes')
+        self.assertEqual(json.loads(response.content),
+                         {'ack': 6, 'changed': 1, 'rejected': [6]})
+        self.assertEqual(Grade.objects.get(homebuyer=first,
+                                           house=self.house_a,
+                                           category=self.category).score, 4)
+        self.assertEqual(CategoryWeight.objects.get(homebuyer=first,
+                                                    category=kitchen).weight,
+                         5)
+        self.assertEqual(HouseScore.objects.rebuild(dry_run=True), [])
+        self.assertEqual(
+            Homebuyer.objects.sync_category_weight_totals(dry_run=True), [])
+
+    def test_late_batch_skipped(self):
+        self.client.login(email='hb1@test.com', password='password')
+
+        def post(seq, value, page='page1'):
+            response = self._post([
+                {'seq': seq, 'type': 'score', 'category': self.category.id,
+                 'house': self.house_b.id, 'value': value}], page)
+            self.assertWithinQueryBudget(response, 'slider-changes')
+            return json.loads(response.content)['changed'], Grade.objects.get(
+                homebuyer=self.homebuyers[0], house=self.house_b,
+                category=self.category).score
+
+        self.assertEqual(post(5, 4), (1, 4))
+        self.assertEqual(post(3, 2), (0, 4))
+        # Seqs from another page are not compared with this page's.
+        self.assertEqual(post(1, 2, page='page2'), (1, 2))
+
+    def test_malformed(self):
+        self.client.login(email='hb1@test.com', password='password')
+        self.assertEqual(self._post({'seq': 1}).status_code, 400)
+        self.assertEqual(self._post([{'type': 'weight'}]).status_code, 400)
+        self.client.login(email='realtor@test.com', password='password')
+        self.assertEqual(self._post([]).status_code, 403)
+
+
+class DeferGradeMatrixTest(CoupleTestMixin, TestCase):
+    def test_fill_runs_once_on_exit(self):
+        with defer_grade_matrix():
+            for nickname in ('A', 'B', 'C'):
+                House.objects.create(couple=self.couple, nickname=nickname)
+            with defer_grade_matrix():
+                Category.objects.create(couple=self.couple, summary='Noise')
+            self.assertFalse(Grade.objects.exists())
+        self.assertEqual(Grade.objects.count(), 2 * 3 * 4)
+        self.assertEqual(HouseScore.objects.rebuild(dry_run=True), [])
+
+    def test_rolled_back_when_block_raises(self):
+        with self.assertRaises(ValueError):
+            with defer_grade_matrix():
+                House.objects.create(couple=self.couple, nickname='A')
+                with defer_grade_matrix():
+                    Category.objects.create(couple=self.couple,
+                                            summary='Noise')
+                raise ValueError
+        self.assertFalse(House.objects.exists())
+        self.assertFalse(Category.objects.filter(summary='Noise').exists())
+        self.assertFalse(Grade.objects.exists())
+        self.assertEqual(HouseScore.objects.rebuild(dry_run=True), [])
+
+
+@override_settings(SPARSE_GRADES=True)
+class SparseGradesTest(CoupleTestMixin, TestCase):
+    def setUp(self):
+        super(SparseGradesTest, self).setUp()
+        self.house = House.objects.create(couple=self.couple, nickname='A')
+        self.category = Category.objects.filter(couple=self.couple).first()
+
+    def test_no_grades_created(self):
+        self.assertFalse(Grade.objects.exists())
+        self.assertEqual(CategoryWeight.objects.count(), 2 * 3)
+        self.assertEqual(HouseScore.objects.rebuild(dry_run=True), [])
+        self.assertEqual(HouseScore.objects.totals(self.couple),
+                         {self.house.id: 3.0})
+
+    def test_first_score_creates_grade(self):
+        Grade.objects.update_or_create(
+            homebuyer=self.homebuyers[0], house=self.house,
+            category=self.category, defaults={'score': 5})
+        self.assertEqual(Grade.objects.count(), 1)
+        self.assertEqual(HouseScore.objects.rebuild(dry_run=True), [])
+        report = CoupleReport(self.couple)
+        self.assertEqual(report.scores[0][0],
+                         [5 if category == self.category else 3
+                          for category in report.categories])
+
+
+class RequestIdentityTest(CoupleTestMixin, TestCase):
+    def _request(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        return request
+
+    def test_resolved_once_per_request(self):
+        homebuyer = self.homebuyers[0]
+        identity = get_identity(self._request(User.objects.get(
+            pk=homebuyer.user_id)))
+        with self.assertNumQueries(2):
+            self.assertEqual(identity.role, homebuyer)
+            self.assertEqual(identity.couple, self.couple)
+            self.assertEqual(identity.homebuyers, self.homebuyers)
+            self.assertEqual(identity.role, homebuyer)
+            self.assertEqual([hb.user.email for hb in identity.homebuyers],
+                             ['hb1@test.com', 'hb2@test.com'])
+
+    def test_realtor_and_user_change(self):
+        request = self._request(self.realtor.user)
+        identity = get_identity(request)
+        self.assertEqual(identity.realtor, self.realtor)
+        self.assertIsNone(identity.couple)
+        self.assertEqual(identity.homebuyers, [])
+
+        request.user = self.homebuyers[1].user
+        self.assertIs(get_identity(request), identity)
+        self.assertEqual(identity.homebuyer, self.homebuyers[1])
+        self.assertIsNone(identity.realtor)
+
+    def test_page_query_counts(self):
+        house = House.objects.create(couple=self.couple, nickname='A')
+        self.client.login(email='hb1@test.com', password='password')
+        for url, queries in (('/dashboard/', 8), ('/categories/', 4),
+                             ('/eval/{id}/'.format(id=house.id), 6)):
+            with self.assertNumQueries(queries):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class QueryBudgetTest(QueryBudgetTestMixin, GradedCoupleMixin, TestCase):
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint("SELECT a FROM t WHERE id IN (1, 2, 3) AND "
+                        "name = 'it''s' LIMIT 21"),
+            "SELECT a FROM t WHERE id IN (...) AND name = ? LIMIT ?")
+        self.assertEqual(
+            fingerprint("QUERY = u'SELECT a FROM t WHERE id = %s' "
+                        "- PARAMS = (7,)"),
+            "SELECT a FROM t WHERE id = ?")
+
+    def test_pages_within_budget(self):
+        self.client.login(email='hb1@test.com', password='password')
+        for url, view in (
+                ('/dashboard/', 'dashboard'),
+                ('/report/{id}/'.format(id=self.couple.id), 'report'),
+                ('/eval/{id}/'.format(id=self.house_a.id), 'eval'),
+                ('/categories/', 'categories')):
+            self.assertWithinQueryBudget(self.client.get(url), view)
+        self.client.login(email='realtor@test.com', password='password')
+        self.assertWithinQueryBudget(self.client.get('/dashboard/'))
+
+    def test_header_and_duplicates(self):
+        self.client.login(email='hb1@test.com', password='password')
+        response = self.client.get('/dashboard/')
+        self.assertNotIn('X-Query-Stats', response)
+        with override_settings(DEBUG=True):
+            response = self.client.get(
+                '/report/{id}/'.format(id=self.couple.id))
+        self.assertTrue(response['X-Query-Stats'].startswith(
+            'view=report queries={count} '.format(
+                count=response.query_stats.count)))
+        self.assertEqual(response.query_stats.duplicates, [])
+        stats = QueryStats('report', [
+            {'sql': "SELECT a FROM t WHERE id = 1", 'time': '0.001'},
+            {'sql': "SELECT a FROM t WHERE id = 2", 'time': '0.001'}])
+        self.assertEqual(stats.duplicates,
+                         [(2, "SELECT a FROM t WHERE id = ?")])
+
+    def test_counted_past_query_log_limit(self):
+        middleware = querybudget.QueryBudgetMiddleware()
+        request = RequestFactory().get('/')
+        middleware.process_request(request)
+        self.addCleanup(connection.queries_log.clear)
+        for _ in range(connection.queries_limit + 1):
+            connection.queries_log.append({'sql': 'SELECT 1', 'time': '0'})
+        list(House.objects.all())
+        list(Category.objects.all())
+        response = middleware.process_response(request, HttpResponse())
+        self.assertEqual(response.query_stats.count, 2)
+
+    @override_settings(QUERY_BUDGETS={'dashboard': 1})
+    def test_over_budget_fails(self):
+        self.client.login(email='hb1@test.com', password='password')
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        handlers, querybudget.logger.handlers = (
+            querybudget.logger.handlers, [handler])
+        try:
+            response = self.client.get('/dashboard/')
+        finally:
+            querybudget.logger.handlers = handlers
+        self.assertTrue(response.query_stats.over_budget)
+        self.assertEqual([record.levelname for record in records],
+                         ['WARNING'])
+        with self.assertRaises(AssertionError):
+            self.assertWithinQueryBudget(response)
+
+
+class MetricsTest(CoupleTestMixin, TestCase):
+    def setUp(self):
+        super(MetricsTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.addCleanup(metrics.registry.discard, self.directory)
+        settings = override_settings(METRICS_DIR=self.directory,
+                                     METRICS_FLUSH_INTERVAL=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_histogram_and_counter_exposition(self):
+        registry = metrics.Registry()
+        latency = registry.histogram('latency', "Latency.", ['view'],
+                                     buckets=(0.1, 1))
+        emails = registry.counter('emails', "Emails.", ['status'])
+        for value in (0.05, 0.5, 5):
+            latency.observe(value, view='report')
+        emails.inc(status='sent')
+        emails.inc(2, status='sent')
+        with self.assertRaises(ValueError):
+            emails.inc(view='report')
+
+        lines = registry.exposition().splitlines()
+        self.assertEqual(lines[:2], ['# HELP latency Latency.',
+                                     '# TYPE latency histogram'])
+        self.assertEqual(lines[2:7], [
+            'latency_bucket{view="report",le="0.1"} 1',
+            'latency_bucket{view="report",le="1"} 2',
+            'latency_bucket{view="report",le="+Inf"} 3',
+            'latency_sum{view="report"} 5.55',
+            'latency_count{view="report"} 3'])
+        self.assertIn('emails{status="sent"} 3', lines)
+
+    def test_summed_across_processes(self):
+        # Another worker's file, as flushed by that process.
+        with open(os.path.join(self.directory, 'metrics-1-abc.json'),
+                  'w') as data:
+            json.dump({'counters': [[['realestate_login_throttled_total'],
+                                     4]],
+                       'histograms': []}, data)
+        with override_settings(LOGIN_THROTTLE_RATES={'ip': (1, 60),
+                                                     'account': (1, 60)}):
+            throttle = LoginThrottle('10.0.0.1', 'someone@test.com')
+            throttle.attempt(now=0)
+            self.assertTrue(throttle.attempt(now=1))
+        self.assertIn('realestate_login_throttled_total 5',
+                      metrics.registry.exposition().splitlines())
+
+    def test_exited_processes_merged(self):
+        # A worker that has exited, as flushed by that process.
+        worker = subprocess.Popen(['true'])
+        worker.wait()
+        path = os.path.join(self.directory,
+                            'metrics-{pid}-abc.json'.format(pid=worker.pid))
+        with open(path, 'w') as data:
+            json.dump({'counters': [[['realestate_login_throttled_total'],
+                                     4]],
+                       'histograms': []}, data)
+        for _ in range(2):
+            self.assertIn('realestate_login_throttled_total 4',
+                          metrics.registry.exposition().splitlines())
+            self.assertFalse(os.path.exists(path))
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.directory)
+                   if not name.startswith('metrics-{pid}-'
+                                          .format(pid=os.getpid()))),
+            ['.lock', 'totals.json'])
+
+    def test_view_is_staff_only_and_records_requests(self):
+        self.client.login(email='realtor@test.com', password='password')
+        self.client.get('/dashboard/')
+        self.assertEqual(self.client.get('/metrics/').status_code, 302)
+
+        User.objects.create_superuser(email='admin@test.com',
+                                      password='password',
+                                      first_name='Admin', last_name='Test')
+        self.client.login(email='admin@test.com', password='password')
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('realestate_request_duration_seconds_count'
+                      '{view="dashboard"} 1', response.content)
+        self.assertIn('realestate_request_db_seconds_count'
+                      '{view="dashboard"} 1', response.content)
+
+
+class ProfilerTest(CoupleTestMixin, TestCase):
+    def setUp(self):
+        super(ProfilerTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.addCleanup(metrics.registry.discard, self.directory)
+        settings = override_settings(PROFILER_ENABLED=True,
+                                     PROFILER_DIR=self.directory,
+                                     PROFILER_USERS=('hb1@test.com',),
+                                     PROFILER_PATHS=('/categories/',))
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_selected_requests_profiled(self):
+        self.client.login(email='hb2@test.com', password='password')
+        self.client.get('/dashboard/')
+        self.client.get('/categories/')
+        self.client.login(email='hb1@test.com', password='password')
+        self.client.get('/dashboard/')
+
+        views = dict(profiling.profiles_by_view())
+        self.assertEqual(sorted(views), ['categories', 'dashboard'])
+        profile = views['dashboard'][0]
+        self.assertEqual((profile['user'], profile['path'],
+                          profile['status']),
+                         ('hb1@test.com', '/dashboard/', 200))
+        self.assertIn('function calls', profiling.profile_stats(
+            profile['name']))
+
+    @override_settings(PROFILER_KEEP=2)
+    def test_only_slowest_kept(self):
+        self.client.login(email='hb1@test.com', password='password')
+        for _ in range(4):
+            self.client.get('/dashboard/')
+        profiles = dict(profiling.profiles_by_view())['dashboard']
+        self.assertEqual(len(profiles), 2)
+        self.assertEqual(len(os.listdir(self.directory)), 2 * 2)
+        self.assertGreaterEqual(profiles[0]['ms'], profiles[1]['ms'])
+
+    def test_pages_staff_only(self):
+        self.client.login(email='hb1@test.com', password='password')
+        self.client.get('/dashboard/')
+        name = dict(profiling.profiles_by_view())['dashboard'][0]['name']
+        self.assertEqual(self.client.get('/profiles/').status_code, 302)
+
+        User.objects.create_superuser(email='admin@test.com',
+                                      password='password',
+                                      first_name='Admin', last_name='Test')
+        self.client.login(email='admin@test.com', password='password')
+        self.assertContains(self.client.get('/profiles/'), name)
+        self.assertContains(
+            self.client.get('/profiles/{name}/'.format(name=name)),
+            'cumulative')
+        response = self.client.get('/profiles/{name}/'.format(name=name),
+                                   {'download': ''})
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        self.assertEqual(self.client.get('/profiles/missing/').status_code,
+                         404)
+
+
+@override_settings(LOGIN_THROTTLE_RATES={'ip': (3, 10), 'account': (2, 60)})
+class LoginThrottleTest(CoupleTestMixin, TestCase):
+    def setUp(self):
+        super(LoginThrottleTest, self).setUp()
+        caches['default'].clear()
+
+    def _login(self, password, ip='127.0.0.1'):
+        return self.client.post(
+            '/login-handler/', {'username': 'hb1@test.com',
+                                'password': password},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest', REMOTE_ADDR=ip)
+
+    def test_buckets_refill(self):
+        throttle = LoginThrottle('10.0.0.1')
+        self.assertEqual([throttle.attempt(now=100) for _ in range(4)],
+                         [0, 0, 0, 10])
+        self.assertEqual(throttle.attempt(now=105), 5)
+        self.assertEqual(throttle.attempt(now=110), 0)
+
+    def test_account_limited_across_ips(self):
+        self.assertEqual(self._login('wrong', ip='10.0.0.1').status_code, 200)
+        self.assertEqual(self._login('wrong', ip='10.0.0.2').status_code, 200)
+        response = self._login('password', ip='10.0.0.3')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+
+    def test_success_refills_account(self):
+        # Every attempt comes from its own IP, so only the account bucket
+        # can throttle them.
+        self._login('wrong', ip='10.0.0.1')
+        self.assertTrue(json.loads(
+            self._login('password', ip='10.0.0.2').content)['success'])
+        self.client.logout()
+        self.assertEqual(self._login('wrong', ip='10.0.0.3').status_code, 200)
+        self.assertEqual(self._login('wrong', ip='10.0.0.4').status_code, 200)
+        response = self._login('wrong', ip='10.0.0.5')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+
+
+class _FlakyConnection(object):
+    """
+    Stand-in email backend connection that fails the first `failures`
+    sends.
+    """
+    def __init__(self, failures):
+        self.failures = failures
+        self.opened = 0
+        self.sent = []
+
+    def open(self):
+        self.opened += 1
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        if self.failures:
+            self.failures -= 1
+            raise IOError("connection reset")
+        self.sent.extend(messages)
+        return len(messages)
+
+
+class _DownConnection(_FlakyConnection):
+    """
+    Stand-in email backend connection whose server is unreachable from
+    the `after`th open on.
+    """
+    def __init__(self, failures=0, after=1):
+        super(_DownConnection, self).__init__(failures)
+        self.after = after
+
+    def open(self):
+        super(_DownConnection, self).open()
+        if self.opened >= self.after:
+            raise IOError("connection refused")
+
+
+@override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=3, EMAIL_OUTBOX_RETRY_DELAY=60)
+class OutgoingEmailTest(CoupleTestMixin, TestCase):
+    def test_signup_queues_confirmation(self):
+        self.client.post('/', {'email': 'new@test.com', 'first_name': 'New',
+                               'last_name': 'Realtor', 'phone': '',
+                               'password': 'Password1',
+                               'password_confirmation': 'Password1'})
+        self.assertEqual(len(mail.outbox), 0)
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.recipient, 'new@test.com')
+
+        call_command('send_queued_email', verbosity=0)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['new@test.com'])
+        self.assertEqual(OutgoingEmail.objects.get().status,
+                         OutgoingEmail.SENT)
+
+    def test_realtor_invite_queues_two_emails(self):
+        self.client.login(email='realtor@test.com', password='password')
+        self.client.post('/dashboard/', {
+            'homebuyer1_first': 'One', 'homebuyer1_last': 'Buyer',
+            'homebuyer1_email': 'one@test.com',
+            'homebuyer2_first': 'Two', 'homebuyer2_last': 'Buyer',
+            'homebuyer2_email': 'two@test.com'})
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            sorted(OutgoingEmail.objects.values_list('recipient', flat=True)),
+            ['one@test.com', 'two@test.com'])
+
+    def test_retry_with_backoff(self):
+        for n in range(2):
+            OutgoingEmail.objects.enqueue('Subject', 'Body',
+                                          'to{n}@test.com'.format(n=n))
+        start = OutgoingEmail.objects.latest('id').next_attempt
+        connection = _FlakyConnection(failures=1)
+        self.assertEqual(OutgoingEmail.objects.send_queued(
+            connection=connection, now=start), (1, 1))
+        self.assertEqual(connection.opened, 2)
+
+        failed = OutgoingEmail.objects.get(status=OutgoingEmail.QUEUED)
+        self.assertEqual(failed.attempts, 1)
+        self.assertEqual(failed.last_error, 'connection reset')
+        self.assertEqual(failed.next_attempt,
+                         start + datetime.timedelta(seconds=60))
+        self.assertFalse(OutgoingEmail.objects.due(start).exists())
+
+        later = start + datetime.timedelta(seconds=60)
+        connection = _FlakyConnection(failures=2)
+        OutgoingEmail.objects.send_queued(connection=connection, now=later)
+        later += datetime.timedelta(seconds=120)
+        OutgoingEmail.objects.send_queued(connection=connection, now=later)
+        failed = OutgoingEmail.objects.get(pk=failed.pk)
+        self.assertEqual(failed.status, OutgoingEmail.FAILED)
+        self.assertEqual(failed.attempts, 3)
+
+    def test_server_down(self):
+        for n in range(3):
+            OutgoingEmail.objects.enqueue('Subject', 'Body',
+                                          'to{n}@test.com'.format(n=n))
+        start = OutgoingEmail.objects.latest('id').next_attempt
+        self.assertEqual(OutgoingEmail.objects.send_queued(
+            connection=_DownConnection(), now=start), (0, 3))
+        self.assertEqual(
+            set(OutgoingEmail.objects.values_list('attempts', 'last_error',
+                                                  'next_attempt')),
+            set([(1, 'connection refused',
+                  start + datetime.timedelta(seconds=60))]))
+
+        # The server goes away when reopened after a failed send.
+        later = start + datetime.timedelta(seconds=60)
+        self.assertEqual(OutgoingEmail.objects.send_queued(
+            connection=_DownConnection(failures=1, after=2), now=later),
+            (0, 3))
+        self.assertEqual(
+            sorted(OutgoingEmail.objects.values_list('last_error', flat=True)),
+            ['connection refused', 'connection refused', 'connection reset'])
+        self.assertFalse(OutgoingEmail.objects.filter(attempts=1).exists())
+
+
+class RealtorDashboardTest(CoupleTestMixin, TestCase):
+    def _add_clients(self, first, last):
+        for n in range(first, last):
+            self._create_couple(prefix='c{n}-'.format(n=n))
+            pending_couple = PendingCouple.objects.create(realtor=self.realtor)
+            for m in (1, 2):
+                PendingHomebuyer.objects.create(
+                    pending_couple=pending_couple, first_name='Pending',
+                    last_name='Test',
+                    email='p{n}-{m}@test.com'.format(n=n, m=m))
+
+    def _get(self):
+        self.client.login(email='realtor@test.com', password='password')
+        with self.assertNumQueries(7):
+            response = self.client.get('/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_query_count_independent_of_clients(self):
+        self._add_clients(0, 1)
+        self._get()
+        self._add_clients(1, 6)
+        response = self._get()
+        self.assertEqual(len(response.context['couples']), 7)
+        self.assertEqual(len(response.context['pending_couples']), 6)
+
+    @override_settings(DASHBOARD_PAGE_SIZE=2)
+    def test_keyset_pages_and_search(self):
+        self._add_clients(0, 3)
+        self.client.login(email='realtor@test.com', password='password')
+        response = self.client.get('/dashboard/')
+        self.assertEqual(len(response.context['couples']), 2)
+        cursor = response.context['next_couple']
+        self.assertEqual(cursor, response.context['couples'][-1].id)
+
+        data = json.loads(self.client.get(
+            '/dashboard/couples/', {'after': cursor}).content)
+        self.assertIsNone(data['next'])
+        self.assertEqual(data['html'].count('couple_row'), 2)
+
+        data = json.loads(self.client.get(
+            '/dashboard/pending/', {'q': 'P1-2'}).content)
+        self.assertIn('p1-2@test.com', data['html'])
+        self.assertEqual(data['html'].count('couple_row'), 1)
+        data = json.loads(self.client.get(
+            '/dashboard/couples/', {'q': 'nobody'}).content)
+        self.assertIn('No homebuyers have registered', data['html'])
+
+    def test_registration_status_and_emails(self):
+        half_registered = PendingCouple.objects.create(realtor=self.realtor)
+        for email in ('hb1@test.com', 'new@test.com'):
+            PendingHomebuyer.objects.create(
+                pending_couple=half_registered, first_name='Pending',
+                last_name='Test', email=email)
+        couples, pending_couples = (
+            self.realtor.get_couples_and_pending_couples())
+        self.assertEqual(list(couples), [])
+        pending_couple = pending_couples.get()
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [(p.email, p.registered)
+                 for p in pending_couple.pendinghomebuyer_set.all()],
+                [('hb1@test.com', True), ('new@test.com', False)])
+            self.assertEqual(pending_couple.emails(),
+                             'hb1@test.com,new@test.com')
@@ -0,0 +1,116 @@
+"""
+Login throttling.  Every login attempt takes a token from two token buckets,
+one for the client IP and one for the account being logged into, which are
+stored in the cache backend named by settings.LOGIN_THROTTLE_CACHE_ALIAS.
+When either bucket is empty the attempt is rejected straight away with the
+number of seconds until a token is available; nothing ever sleeps in the
+request thread.
+
+The buckets are read and written with plain cache get/set, so concurrent
+attempts can occasionally both take the last token.  That is an acceptable
+error for a rate limit, and avoids needing an atomic cache backend.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from RealEstate.apps.core.metrics import LOGIN_THROTTLED
+
+__all__ = ['LoginThrottle', 'TokenBucket']
+
+
+class TokenBucket(object):
+    """
+    A bucket holding up to `capacity` tokens, refilled at one token every
+    `interval` seconds.  The state is stored in the cache as a
+    (tokens, timestamp) pair, and expires once the bucket would be full
+    again, so an absent key simply means a full bucket.
+    """
+    def __init__(self, cache, key, capacity, interval):
+        self.cache = cache
+        self.key = key
+        self.capacity = capacity
+        self.interval = float(interval)
+
+    def tokens(self, now):
+        state = self.cache.get(self.key)
+        if state is None:
+            return float(self.capacity)
+        tokens, stamp = state
+        return min(float(self.capacity),
+                   tokens + max(now - stamp, 0) / self.interval)
+
+    def wait(self, now):
+        """
+        Returns the number of seconds until a token is available, or 0.
+        """
+        tokens = self.tokens(now)
+        return 0 if tokens >= 1 else (1 - tokens) * self.interval
+
+    def consume(self, now):
+        tokens = self.tokens(now) - 1
+        timeout = int(math.ceil((self.capacity - tokens) * self.interval))
+        self.cache.set(self.key, (tokens, now), timeout)
+
+    def reset(self):
+        self.cache.delete(self.key)
+
+
+class LoginThrottle(object):
+    """
+    The per-IP and per-account buckets for one login attempt.  Rates come
+    from settings.LOGIN_THROTTLE_RATES, a dict with 'ip' and 'account'
+    entries of (capacity, seconds per token).
+    """
+    _KEY = 'login-throttle:{scope}:{ident}'
+
+    def __init__(self, ip, username=None):
+        cache = caches[settings.LOGIN_THROTTLE_CACHE_ALIAS]
+        rates = settings.LOGIN_THROTTLE_RATES
+        self.ip_bucket = TokenBucket(
+            cache, self._key('ip', ip or 'unknown'), *rates['ip'])
+        self.account_bucket = None
+        if username:
+            self.account_bucket = TokenBucket(
+                cache, self._key('account', username.strip().lower()),
+                *rates['account'])
+
+    @classmethod
+    def from_request(cls, request, username=None):
+        return cls(request.META.get('REMOTE_ADDR'), username)
+
+    def _key(self, scope, ident):
+        # Hashed so that arbitrary usernames are valid cache keys.
+        digest = hashlib.sha1(ident.encode('utf-8')).hexdigest()
+        return self._KEY.format(scope=scope, ident=digest)
+
+    @property
+    def buckets(self):
+        return [bucket for bucket in (self.ip_bucket, self.account_bucket)
+                if bucket is not None]
+
+    def attempt(self, now=None):
+        """
+        Records a login attempt.  Returns 0 if it is allowed, otherwise the
+        whole number of seconds the client should wait before retrying.  A
+        rejected attempt does not use up any tokens.
+        """
+        now = time.time() if now is None else now
+        wait = max(bucket.wait(now) for bucket in self.buckets)
+        if wait:
+            LOGIN_THROTTLED.inc()
+            return int(math.ceil(wait))
+        for bucket in self.buckets:
+            bucket.consume(now)
+        return 0
+
+    def succeeded(self):
+        """
+        A successful login refills the account bucket, so that a user who
+        mistyped their password a few times is not locked out later.
+        """
+        if self.account_bucket is not None:
+            self.account_bucket.reset()
@@ -1,17 +1,20 @@
+import csv
 import json
-import time
-import math
 
 from django.conf import settings
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm
 from django.core.exceptions import PermissionDenied
 from django.core.urlresolvers import reverse
 from django.db import transaction
-from django.http import HttpResponse
+from django.http import (Http404, HttpResponse, HttpResponseBadRequest,
+                         StreamingHttpResponse)
+from django.middleware.csrf import get_token
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.utils.decorators import method_decorator
 from django.utils.html import escape
 from django.views.decorators.cache import never_cache
@@ -26,13 +29,59 @@ from RealEstate.apps.core.forms import (AddCategoryForm, EditCategoryForm,
 
 
 from RealEstate.apps.core.models import (Category, CategoryWeight, Couple,
-                                         Grade, House, Realtor, User)
+                                         Grade, House, Realtor, SliderChange,
+                                         User)
 from RealEstate.apps.core import models
+from RealEstate.apps.core.conditional import couple_condition, couple_etag
+from RealEstate.apps.core.exports import (FORMATS, export_lines,
+                                          parse_moment)
+from RealEstate.apps.core.imports import HouseImport, parse_house_rows
+from RealEstate.apps.core.metrics import registry
+from RealEstate.apps.core.profiling import (profile_path, profile_stats,
+                                            profiles_by_view)
+from RealEstate.apps.core.reports import PortfolioReport, report_cache
+from RealEstate.apps.core.throttling import LoginThrottle
 
 from RealEstate.apps.pending.models import PendingCouple, PendingHomebuyer
 from RealEstate.apps.pending.forms import InviteHomebuyerForm
 
-LOGIN_DELAY = 1.2   # Seconds
+
+def _keyset_page(queryset, after, size):
+    """
+    Returns up to `size` rows of the queryset with an ID greater than
+    `after`, in ID order, and the cursor for the next page (None if this is
+    the last page).  Unlike OFFSET paging, every page costs the same to
+    fetch, and rows added while paging do not shift later pages.
+    """
+    if after:
+        queryset = queryset.filter(id__gt=after)
+    rows = list(queryset.order_by('id')[:size + 1])
+    next_cursor = rows[size - 1].id if len(rows) > size else None
+    return (rows[:size], next_cursor)
+
+
+def _report_couple(request, couple_id):
+    """
+    Returns the couple a report request is for, or None if there is no such
+    couple.  The permission check, the ETag and the view all need it, so it
+    is fetched once and kept on the request.
+    """
+    if not hasattr(request, '_report_couple'):
+        request._report_couple = Couple.objects.filter(
+            id=int(couple_id)).first()
+    return request._report_couple
+
+
+def _report_etag(request, *args, **kwargs):
+    """
+    The report page also shows the user's pending messages and a form with
+    their CSRF token, so a page with messages is never answered with a 304
+    and the token is part of the ETag.
+    """
+    if len(messages.get_messages(request)):
+        return None
+    return couple_etag(request, _report_couple(request, kwargs['couple_id']),
+                       get_token(request))
 
 
 @sensitive_post_parameters()
@@ -41,18 +90,29 @@ LOGIN_DELAY = 1.2   # Seconds
 def async_login_handler(request, *args, **kwargs):
     """
     Login requests are handled asynchronously from the modal login window.
-    These should always be AJAX POST requests.  The login delay is a crude
-    method to reduce login attempt spam.  If the login attempt is successful,
-    the redirect location is returned (currently just the home page).
+    These should always be AJAX POST requests.  Attempts are throttled per
+    client IP and per account; a throttled attempt gets a 429 response with
+    the number of seconds to wait.  If the login attempt is successful, the
+    redirect location is returned (currently just the home page).
     """
     if not (request.is_ajax() and request.method == 'POST'):
         raise PermissionDenied
 
-    time.sleep(LOGIN_DELAY)
+    throttle = LoginThrottle.from_request(request,
+                                          request.POST.get('username'))
+    retry_after = throttle.attempt()
+    if retry_after:
+        response = HttpResponse(
+            json.dumps({'success': False, 'retry_after': retry_after}),
+            content_type="application/json", status=429)
+        response['Retry-After'] = str(retry_after)
+        return response
+
     response = {'success': False}
     form = AuthenticationForm(data=request.POST)
     if form.is_valid():
         login(request, form.get_user())
+        throttle.succeeded()
         response = {
             'location': reverse(settings.LOGIN_REDIRECT_URL),
             'success': True,
@@ -60,6 +120,56 @@ def async_login_handler(request, *args, **kwargs):
     return HttpResponse(json.dumps(response), content_type="application/json")
 
 
+@staff_member_required
+@never_cache
+def metrics_view(request):
+    """
+    Request latency, database time, outbox and login throttle metrics,
+    summed over every worker process, in the Prometheus text format.
+    """
+    return HttpResponse(registry.exposition(),
+                        content_type="text/plain; version=0.0.4; "
+                                     "charset=utf-8")
+
+
+@staff_member_required
+@never_cache
+def profiles_view(request):
+    """
+    The request profiles captured by ProfilerMiddleware, slowest first for
+    each view.
+    """
+    return render(request, 'core/profiles.html', {
+        'title': "Request profiles",
+        'views': profiles_by_view(),
+        'enabled': settings.PROFILER_ENABLED,
+    })
+
+
+@staff_member_required
+@never_cache
+def profile_view(request, name):
+    """
+    The slowest functions of one profile, or with ?download the pstats file
+    itself.
+    """
+    path = profile_path(name)
+    if path is None:
+        raise Http404
+    if 'download' in request.GET:
+        with open(path, 'rb') as data:
+            response = HttpResponse(data.read(),
+                                    content_type="application/octet-stream")
+        response['Content-Disposition'] = (
+            'attachment; filename="{name}.prof"'.format(name=name))
+        return response
+    return render(request, 'core/profile.html', {
+        'title': name,
+        'name': name,
+        'stats': profile_stats(name),
+    })
+
+
 class RealtorSignupView(View):
     """
     This form is the landing page used to sign up realtors.
@@ -104,11 +214,7 @@ class RealtorSignupView(View):
                     last_name=cleaned_data['last_name'],
                     phone=cleaned_data['phone'])
                 Realtor.objects.create(user=user)
-            email_sent = user.send_email_confirmation(request)
-            if not email_sent:
-                user.delete()
-                messages.error(request, "Failed to send email confirmation")
-                return redirect(reverse(settings.LOGIN_URL))
+                user.send_email_confirmation(request)
             user = authenticate(email=email, password=password)
             login(request, user)
             messages.success(request, "Welcome!")
@@ -137,7 +243,7 @@ class BaseView(View):
 
     @method_decorator(login_required)
     def dispatch(self, request, *args, **kwargs):
-        role = request.user.role_object
+        role = request.identity.role
         if role and role.role_type in self._USER_TYPES_ALLOWED:
             if self._permission_check(request, role, *args, **kwargs):
                 return super(BaseView, self).dispatch(request, *args, **kwargs)
@@ -183,27 +289,13 @@ class CategoryView(BaseView):
                                 content_type="application/json")
 
         # Renders standard category page
-        homebuyer = request.user.role_object
-        couple = homebuyer.couple
-        categories = Category.objects.filter(couple=couple)
-        weights = CategoryWeight.objects.filter(homebuyer=homebuyer)
-
-        weighted = []
-        for category in categories:
-            missing = True
-            for weight in weights:
-                if weight.category.id is category.id:
-                    weighted.append((category, weight.weight))
-                    missing = False
-                    break
-            if missing:
-                weighted.append((category, None))
+        homebuyer = request.identity.role
         choices = []
         for key, value in models._CATEGORIES.items():
             choices.append((key, value["summary"]))
 
         context = {
-            'weights': weighted,
+            'weights': Category.objects.with_weights(homebuyer),
             'form': AddCategoryForm(),
             'editForm': EditCategoryForm()
         }
@@ -217,7 +309,7 @@ class CategoryView(BaseView):
         leave. In the meantime, it saves new data, recreates the same form and
         posts a success message.
         """
-        homebuyer = request.user.role_object
+        homebuyer = request.identity.role
         couple = homebuyer.couple
 
         # ajax calls implement weight and delete category commands.
@@ -315,22 +407,8 @@ class CategoryView(BaseView):
                             u"Category '{summary}' added".format(
                                 summary=summary))
 
-            weights = CategoryWeight.objects.filter(homebuyer=homebuyer)
-            categories = Category.objects.filter(couple=couple)
-
-            weighted = []
-            for category in categories:
-                missing = True
-                for weight in weights:
-                    if weight.category.id is category.id:
-                        weighted.append((category, weight.weight))
-                        missing = False
-                        break
-                if missing:
-                    weighted.append((category, None))
-
             context = {
-                'weights': weighted,
+                'weights': Category.objects.with_weights(homebuyer),
                 'form': AddCategoryForm(),
                 'editForm': EditCategoryForm()
             }
@@ -432,16 +510,34 @@ class DashboardView(BaseView):
         }
         return render(request, self.homebuyer_template_name, context)
 
+    def _realtor_rows_context(self, request, realtor):
+        """
+        The first page of couples and pending couples, and the cursors the
+        dashboard uses to load the rest (see RealtorClientsView).
+        """
+        search = request.GET.get('q', '').strip()
+        couples, pending_couples = realtor.get_couples_and_pending_couples(
+            search=search)
+        couples, next_couple = _keyset_page(
+            couples, None, settings.DASHBOARD_PAGE_SIZE)
+        pending_couples, next_pending_couple = _keyset_page(
+            pending_couples, None, settings.DASHBOARD_PAGE_SIZE)
+        return {
+            'couples': couples,
+            'next_couple': next_couple,
+            'pending_couples': pending_couples,
+            'next_pending_couple': next_pending_couple,
+            'search': search,
+        }
+
     def _realtor_get(self, request, realtor, *args, **kwargs):
-        couples, pending_couples = realtor.get_couples_and_pending_couples()
         invite_form = InviteHomebuyerForm()
         context = {
             'form': AddRealtorHomeForm(),
-            'couples': couples,
-            'pending_couples': pending_couples,
             'invite_form': invite_form,
             'realtor': realtor,
         }
+        context.update(self._realtor_rows_context(request, realtor))
         return render(request, self.realtor_template_name, context)
 
     def _realtor_post(self, request, realtor, *args, **kwargs):
@@ -473,22 +569,18 @@ class DashboardView(BaseView):
                     first_name=cleaned_data['homebuyer2_first'],
                     last_name=cleaned_data['homebuyer2_last'],
                     email=cleaned_data['homebuyer2_email'])
-                pending_couple = PendingCouple(realtor=request.user.realtor)
-
-                email_success = all([
-                    first_pending_hb.send_email_invite(request),
-                    second_pending_hb.send_email_invite(request)
-                ])
-                if not email_success:
-                    messages.error(request, "Failed to send email invitations")
-                    return redirect(reverse(settings.LOGIN_REDIRECT_URL))
+                pending_couple = PendingCouple(realtor=realtor)
 
+                # The invitations are queued in the same transaction, so
+                # they are only sent if the pending couple is saved.
                 with transaction.atomic():
                     pending_couple.save()
                     first_pending_hb.pending_couple = pending_couple
                     second_pending_hb.pending_couple = pending_couple
                     first_pending_hb.save()
                     second_pending_hb.save()
+                    first_pending_hb.send_email_invite(request)
+                    second_pending_hb.send_email_invite(request)
 
                 success_msg = (
                     "Email invitations sent to '{first}' and '{second}'"
@@ -497,18 +589,16 @@ class DashboardView(BaseView):
                 messages.success(request, success_msg)
                 return redirect(reverse(settings.LOGIN_REDIRECT_URL))
 
-        couples, pending_couples = realtor.get_couples_and_pending_couples()
         context = {
-            'couples': couples,
-            'pending_couples': pending_couples,
             'form': AddRealtorHomeForm(),
             'invite_form': invite_form,
             'realtor': realtor,
         }
+        context.update(self._realtor_rows_context(request, realtor))
         return render(request, self.realtor_template_name, context)
 
     def get(self, request, *args, **kwargs):
-        role = request.user.role_object
+        role = request.identity.role
         handlers = {
             'Homebuyer': self._homebuyer_get,
             'Realtor': self._realtor_get,
@@ -516,7 +606,7 @@ class DashboardView(BaseView):
         return handlers[role.role_type](request, role, *args, **kwargs)
 
     def post(self, request, *args, **kwargs):
-        role = request.user.role_object
+        role = request.identity.role
         handlers = {
             'Homebuyer': self._homebuyer_post,
             'Realtor': self._realtor_post,
@@ -524,6 +614,231 @@ class DashboardView(BaseView):
         return handlers[role.role_type](request, role, *args, **kwargs)
 
 
+class RealtorClientsView(BaseView):
+    """
+    Returns the next page of rows for one of the lists on the realtor
+    dashboard as JSON: the rendered rows and the cursor for the page after
+    them (null on the last page).  The dashboard calls this as the user
+    scrolls, and with ?q= to search by name or email.
+    """
+    _USER_TYPES_ALLOWED = User._REALTOR_ONLY
+    _LISTS = {
+        'couples': ('couples', 'core/realtor_couple_rows.html'),
+        'pending': ('pending_couples',
+                    'core/realtor_pending_couple_rows.html'),
+    }
+
+    def get(self, request, *args, **kwargs):
+        try:
+            after = int(request.GET.get('after') or 0)
+        except ValueError:
+            return HttpResponseBadRequest()
+        realtor = request.identity.role
+        couples, pending_couples = realtor.get_couples_and_pending_couples(
+            search=request.GET.get('q', '').strip())
+        name, template = self._LISTS[kwargs['kind']]
+        queryset = couples if name == 'couples' else pending_couples
+        rows, next_cursor = _keyset_page(queryset, after,
+                                         settings.DASHBOARD_PAGE_SIZE)
+        html = render_to_string(
+            template, {name: rows, 'first_page': not after}, request=request)
+        return HttpResponse(json.dumps({'html': html, 'next': next_cursor}),
+                            content_type="application/json")
+
+
+class PortfolioView(BaseView):
+    """
+    Summary of every registered couple of the realtor, as JSON, or as a CSV
+    download with ?format=csv.
+    """
+    _USER_TYPES_ALLOWED = User._REALTOR_ONLY
+
+    def get(self, request, *args, **kwargs):
+        report = PortfolioReport(request.identity.role)
+        rows = report.rows()
+        if request.GET.get('format') != 'csv':
+            return HttpResponse(json.dumps({'couples': rows}),
+                                content_type="application/json")
+
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = (
+            'attachment; filename="portfolio.csv"')
+        writer = csv.writer(response)
+        writer.writerow(report.FIELDS)
+        for row in rows:
+            writer.writerow([
+                unicode(row[field]).encode('utf-8')
+                if row[field] is not None else ''
+                for field in report.FIELDS])
+        return response
+
+
+class ExportView(BaseView):
+    """
+    Streams the realtor's Grade or CategoryWeight rows as CSV (default) or
+    NDJSON (?format=ndjson), optionally for a single couple (?couple=ID) and
+    for rows updated in a window (?since=DATE&until=DATE, ISO 8601 dates or
+    dates and times, until exclusive).
+    """
+    _USER_TYPES_ALLOWED = User._REALTOR_ONLY
+
+    def get(self, request, *args, **kwargs):
+        kind = kwargs['kind']
+        format = request.GET.get('format', 'csv')
+        couple = request.GET.get('couple') or None
+        if format not in FORMATS or (couple and not couple.isdigit()):
+            return HttpResponseBadRequest()
+        window = {}
+        for name in ('since', 'until'):
+            if request.GET.get(name):
+                try:
+                    window[name] = parse_moment(request.GET[name])
+                except ValueError:
+                    return HttpResponseBadRequest()
+
+        response = StreamingHttpResponse(
+            export_lines(kind, format, realtor=request.identity.role,
+                         couple=couple, **window),
+            content_type=FORMATS[format])
+        response['Content-Disposition'] = (
+            'attachment; filename="{kind}.{format}"'.format(kind=kind,
+                                                           format=format))
+        return response
+
+
+class HouseImportView(BaseView):
+    """
+    Imports houses for the realtor's couples from an uploaded CSV or JSON
+    file (see core/imports.py).  Returns the number of houses created and
+    the errors for each row that was skipped.
+    """
+    _USER_TYPES_ALLOWED = User._REALTOR_ONLY
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return HttpResponseBadRequest()
+        format = request.POST.get('format') or (
+            'json' if upload.name.lower().endswith('.json') else 'csv')
+        try:
+            rows = parse_house_rows(upload.read(), format)
+        except ValueError as e:
+            return HttpResponse(json.dumps({'error': unicode(e)}), status=400,
+                                content_type="application/json")
+
+        created, errors = HouseImport(
+            rows, realtor=request.identity.role).run()
+        return HttpResponse(json.dumps({'created': created, 'errors': errors}),
+                            content_type="application/json")
+
+
+class SliderChangesView(BaseView):
+    """
+    Saves a batch of slider changes from the eval and category pages.  The
+    `changes` parameter is a JSON list of {"seq": n, "type": "score" or
+    "weight", "category": id, "house": id (scores only), "value": n}, where
+    seq is a number the page increases with every change.  Only the change
+    with the highest seq is applied for each cell, and all scores and
+    weights are written in one transaction with Grade.objects.set_scores()
+    and CategoryWeight.objects.set_weights().  The `page` parameter is a
+    token the page picks when it loads: changes with a seq no newer than the
+    last one applied from the same page are skipped (see SliderChange), so
+    a batch that arrives late cannot undo a newer one.
+
+    The response acknowledges the highest seq received, so the page can drop
+    every change up to it, and lists the seqs of changes that were rejected.
+    """
+    _USER_TYPES_ALLOWED = User._HOMEBUYER_ONLY
+
+    _FIELDS = {
+        'score': Grade._meta.get_field('score'),
+        'weight': CategoryWeight._meta.get_field('weight'),
+    }
+
+    def _parse(self, change):
+        """
+        Returns (cell, value) for a change, where cell is (type, category_id,
+        house_id).  Raises ValueError if it is malformed.
+        """
+        kind = change.get('type')
+        if kind not in self._FIELDS:
+            raise ValueError
+        house = int(change['house']) if kind == 'score' else None
+        value = int(change['value'])
+        if value not in dict(self._FIELDS[kind].choices):
+            raise ValueError
+        return (kind, int(change['category']), house), value
+
+    def post(self, request, *args, **kwargs):
+        homebuyer = request.identity.role
+        try:
+            changes = json.loads(request.POST['changes'])
+        except (KeyError, ValueError):
+            return HttpResponseBadRequest()
+        if not isinstance(changes, list):
+            return HttpResponseBadRequest()
+
+        try:
+            seqs = [int(change['seq']) for change in changes]
+        except (KeyError, TypeError, ValueError):
+            return HttpResponseBadRequest()
+
+        rejected = []
+        latest = {}
+        for seq, change in zip(seqs, changes):
+            try:
+                cell, value = self._parse(change)
+            except (KeyError, TypeError, ValueError):
+                rejected.append(seq)
+                continue
+            if cell not in latest or latest[cell][0] < seq:
+                latest[cell] = (seq, value)
+
+        category_ids = set(
+            Category.objects.filter(
+                couple_id=homebuyer.couple_id,
+                id__in=set(category for _, category, _ in latest))
+            .order_by().values_list('id', flat=True))
+        house_ids = set(
+            House.objects.filter(
+                couple_id=homebuyer.couple_id,
+                id__in=set(house for _, _, house in latest if house))
+            .order_by().values_list('id', flat=True))
+
+        valid = {}
+        for cell, (seq, value) in latest.items():
+            kind, category, house = cell
+            if category not in category_ids or (
+                    kind == 'score' and house not in house_ids):
+                rejected.append(seq)
+            else:
+                valid[cell] = (seq, value)
+
+        page = request.POST.get('page')
+        with transaction.atomic():
+            if page:
+                fresh = SliderChange.objects.claim(
+                    homebuyer, page[:32],
+                    {cell: seq for cell, (seq, _) in valid.items()})
+            else:
+                fresh = valid
+            scores = {}
+            weights = {}
+            for cell in fresh:
+                kind, category, house = cell
+                if kind == 'score':
+                    scores[(house, category)] = valid[cell][1]
+                else:
+                    weights[category] = valid[cell][1]
+            changed = (Grade.objects.set_scores(homebuyer, scores) +
+                       CategoryWeight.objects.set_weights(homebuyer, weights))
+        return HttpResponse(
+            json.dumps({'ack': max(seqs) if seqs else None,
+                        'changed': changed,
+                        'rejected': sorted(rejected)}),
+            content_type="application/json")
+
+
 class EmailConfirmationView(BaseView):
     """
     Used to confirm that a Realtor has signed up with a valid email address.
@@ -594,29 +909,15 @@ class EvalView(BaseView):
         }
 
     def get(self, request, *args, **kwargs):
-        homebuyer = request.user.role_object
+        homebuyer = request.identity.role
         couple = homebuyer.couple
-        categories = Category.objects.filter(couple=couple)
         house = get_object_or_404(House, id=kwargs["house_id"])
-        grades = Grade.objects.filter(house=house, homebuyer=homebuyer)
-
-        # Merging grades and categories to provide object with both
-        # information. Data Structure: [(cat1, score1), (cat2, score2), ...]
-        graded = []
-        for category in categories:
-            missing = True
-            for grade in grades:
-                if grade.category.id is category.id:
-                    graded.append((category, grade.score))
-                    missing = False
-                    break
-            if missing:
-                graded.append((category, None))
 
+        # Data Structure: [(cat1, score1), (cat2, score2), ...]
         context = {
             'couple': couple,
             'house': house,
-            'grades': graded,
+            'grades': Category.objects.with_scores(homebuyer, house),
             'form': AddCategoryFromEvalForm()
         }
         context.update(self._weight_context())
@@ -630,7 +931,7 @@ class EvalView(BaseView):
         leave. In the meantime, it saves new data, recreates the same form and
         posts a success message.
         """
-        homebuyer = request.user.role_object
+        homebuyer = request.identity.role
 
         if request.is_ajax():
             house = get_object_or_404(House, id=kwargs["house_id"])
@@ -670,24 +971,11 @@ class EvalView(BaseView):
                     request,
                     u"Category '{summary}' added".format(summary=summary))
 
-            categories = Category.objects.filter(couple=couple)
             house = get_object_or_404(House, id=kwargs["house_id"])
-            grades = Grade.objects.filter(house=house, homebuyer=homebuyer)
-            graded = []
-            for category in categories:
-                missing = True
-                for grade in grades:
-                    if grade.category.id is category.id:
-                        graded.append((category, grade.score))
-                        missing = False
-                        break
-                if missing:
-                    graded.append((category, None))
-
             context = {
                 'couple': couple,
                 'house': house,
-                'grades': graded,
+                'grades': Category.objects.with_scores(homebuyer, house),
                 'form': AddCategoryFromEvalForm()
             }
             context.update(self._weight_context())
@@ -719,13 +1007,14 @@ class ReportView(BaseView):
         Homebuyers can only see their own report.  Realtors can see reports
         for any of their Couples
         """
-        couple_id = int(kwargs.get('couple_id', 0))
-        get_object_or_404(Couple, id=couple_id)
-        return role.can_view_report_for_couple(couple_id)
+        couple = _report_couple(request, kwargs.get('couple_id', 0))
+        if couple is None:
+            raise Http404
+        return role.can_view_report_for_couple(couple.id)
 
+    @method_decorator(couple_condition(_report_etag))
     def get(self, request, *args, **kwargs):
-        couple_id = int(kwargs.get('couple_id', 0))
-        couple = Couple.objects.get(id=couple_id)
+        couple = _report_couple(request, kwargs.get('couple_id', 0))
         registered = couple.registered
         categories = couple.category_set.all()
         houses = couple.house_set.all()
@@ -737,135 +1026,5 @@ class ReportView(BaseView):
             }
             return render(request, self.incomplete_template_name, context)
 
-        homebuyers = couple.homebuyer_set.all()
-        first = 0
-        second = 1
-        largestScore = 0.01
-        largestWeight = 0.01
-        data1 = homebuyers[first].report_data
-        data2 = homebuyers[second].report_data
-        data3 = homebuyers[first].home_report_data
-        data4 = homebuyers[second].home_report_data
-        colors = ["#286090", "#9BCE7D", "#639BF1", "#3D3C3A", "#98002F", "#B6A754", "#0193B7",
-                  "#5F6024", "#856941", "#ED6639", "#AB3334", "#0FB493", "#262C3A", "#57102C"]
-
-        categoryImportance = []
-        for category in data1:
-            weight1 = float(data1[category]["weight"]) / homebuyers[first].category_weight_total
-            weight2 = float(data2[category]["weight"]) / homebuyers[second].category_weight_total
-            categoryImportance.append((category, weight1, weight2))
-
-            if weight1 > largestWeight:
-                largestWeight = weight1
-
-            if weight2 > largestWeight:
-                largestWeight = weight2
-
-        weightsAve = []
-        weights1 = []
-        weights2 = []
-        index1 = 0
-        index2 = 0
-        for category in data1:
-            weightAve = (float(data1[category]["weight"]) + float(data2[category]["weight"])) / (homebuyers[first].category_weight_total + homebuyers[second].category_weight_total)
-            weight1 = float(data1[category]["weight"]) / homebuyers[first].category_weight_total
-            weight2 = float(data2[category]["weight"]) / homebuyers[second].category_weight_total
-            weightsAve.append((colors[index1], category, int(weightAve * 100)))
-            weights1.append((colors[index1], category, int(weight1 * 100)))
-            index1 = (index1 + 1) % len(colors)
-            weights2.append((colors[index2], category, int(weight2 * 100)))
-            index2 = (index2 + 1) % len(colors)
-
-        categoryData = []
-        for category in data1:
-            weight1 = float(data1[category]["weight"]) / homebuyers[first].category_weight_total
-            weight2 = float(data1[category]["weight"]) / homebuyers[second].category_weight_total
-            scores = []
-            for house in data1[category]["houses"]:
-                score1 = round((data1[category]["houses"][house] * weight1), 2)
-                score2 = round((data2[category]["houses"][house] * weight2), 2)
-                averageScore = round(((score1 + score2) / 2), 2)
-                scores.append((house, averageScore, colors[index1]))
-                index1 = (index1 + 1) % len(colors)
-
-            for houses, score, color in scores:
-                if score > largestScore:
-                    largestScore = score
-
-            categoryData.append((category, scores))
-
-        index3 = 0
-        index4 = 0
-        weights3 = []
-        weights4 = []
-        for houses in data3:
-            weight3 = float(data3[houses]["weight"]) / homebuyers[first].category_weight_total
-            weight4 = float(data4[houses]["weight"]) / homebuyers[second].category_weight_total
-            weights3.append((colors[index3], category, int(weight3 * 100)))
-            index3 = (index3 + 1) % len(colors)
-            weights4.append((colors[index4], category, int(weight4 * 100)))
-            index4 = (index4 + 1) % len(colors)
-
-        houseData = []
-        for houses in data3:
-            weight3 = float(data3[houses]["weight"]) / homebuyers[first].category_weight_total
-            weight4 = float(data4[houses]["weight"]) / homebuyers[second].category_weight_total
-            scores = []
-            for category in data3[houses]["categories"]:
-                score3 = round((data3[houses]["categories"][category] * weight3), 2)
-                score4 = round((data4[houses]["categories"][category] * weight4), 2)
-                averageScore = round(((score3 + score4) / 2), 2)
-                scores.append((category, averageScore, colors[index3]))
-                index3 = (index3 + 1) % len(colors)
-
-            houseData.append((houses, scores))
-
-        minVal = 5.0
-        maxVal = 0.0
-        totalScore = {}
-        for category, homes in categoryData:
-            for home, score, color in homes:
-                if(home in totalScore.keys()):
-                    totalScore[home] += score
-                else:
-                    totalScore[home] = score
-
-        for home in totalScore:
-            if minVal > totalScore[home]:
-                minVal = totalScore[home]
-            if maxVal < totalScore[home]:
-                maxVal = totalScore[home]
-
-
-        minVal = minVal - 1
-        maxVal = maxVal + 0.5
-
-        if minVal < 0:
-            minVal = 0.0
-
-        if maxVal > 5:
-            maxVal = 5.0
-
-        houseNum = (int(math.ceil(0.7* len(data1.values()[0].values()[0])))
-            if data1 is not None else 0)
-        houseWidth = (len(data1.values()[0].values()[0]) * 65 if data1 is
-            not None else 0 )
-
-        context = {
-            'homebuyer1': homebuyers[0],
-            'homebuyer2': homebuyers[1],
-            'categoryImportance': categoryImportance,
-            'pieAve': weightsAve,
-            'categoryData': categoryData,
-            'houseData': houseData,
-            'totalScore': totalScore,
-            'largestScore': largestScore,
-            'largestWeight': largestWeight,
-            'categoryNum': int(math.ceil(0.7*len(data1))),
-            'categoryWidth': len(data1) * 65,
-            'houseNum': houseNum,
-            'houseWidth': houseWidth,
-            'minVal': minVal,
-            'maxVal': maxVal
-        }
+        context = report_cache.get_context(couple)
         return render(request, self.template_name, context)
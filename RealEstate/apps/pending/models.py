@@ -4,12 +4,12 @@ invited to the app but have not yet registered.
 """
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.core.mail import send_mail
 from django.core.urlresolvers import reverse
 from django.db import IntegrityError, models
 from django.utils.crypto import get_random_string, hashlib
 
-from RealEstate.apps.core.models import BaseModel, Couple, Homebuyer
+from RealEstate.apps.core.models import (BaseModel, Couple, Homebuyer,
+                                         OutgoingEmail, User)
 
 
 def _generate_registration_token():
@@ -51,8 +51,9 @@ class PendingCouple(BaseModel):
         return None
 
     def emails(self):
-        return ','.join(
-            self.pendinghomebuyer_set.values_list('email', flat=True))
+        # Iterates pendinghomebuyer_set.all() so a prefetched set is reused.
+        return ','.join(pending_homebuyer.email for pending_homebuyer
+                        in self.pendinghomebuyer_set.all())
 
     @property
     def registered(self):
@@ -70,6 +71,29 @@ class PendingCouple(BaseModel):
         verbose_name_plural = "Pending Couples"
 
 
+class PendingHomebuyerManager(models.Manager):
+    def with_registration_status(self):
+        """
+        Annotates each PendingHomebuyer with is_registered, computed in the
+        same query, which the registered property then uses instead of
+        running its own query.
+        """
+        user_table = User._meta.db_table
+        homebuyer_table = Homebuyer._meta.db_table
+        registered_sql = (
+            "EXISTS (SELECT 1 FROM {homebuyer} INNER JOIN {user} "
+            "ON {homebuyer}.{user_column} = {user}.{user_pk} "
+            "WHERE {user}.{email} = {pending}.{pending_email})".format(
+                homebuyer=homebuyer_table, user=user_table,
+                user_column=Homebuyer._meta.get_field('user').column,
+                user_pk=User._meta.pk.column,
+                email=User._meta.get_field('email').column,
+                pending=self.model._meta.db_table,
+                pending_email=self.model._meta.get_field('email').column))
+        return self.get_queryset().extra(
+            select={'is_registered': registered_sql})
+
+
 class PendingHomebuyer(BaseModel):
     """
     Represents a Homebuyer that has been invited but not yet registered in the
@@ -95,6 +119,8 @@ class PendingHomebuyer(BaseModel):
     pending_couple = models.ForeignKey('pending.PendingCouple',
                                        verbose_name="Pending Couple")
 
+    objects = PendingHomebuyerManager()
+
     def __unicode__(self):
         return u"{first} {last} <{email}>".format(first=self.first_name,
                                                   last=self.last_name,
@@ -148,6 +174,8 @@ class PendingHomebuyer(BaseModel):
         homebuyer.  The homebuyer is considered registered if the email exists
         in the User table.
         """
+        if hasattr(self, 'is_registered'):
+            return bool(self.is_registered)
         return Homebuyer.objects.filter(user__email=self.email).exists()
 
     @property
@@ -156,7 +184,7 @@ class PendingHomebuyer(BaseModel):
 
     def send_email_invite(self, request):
         """
-        Sends out the email to the potential homebuyer, which includes a link
+        Queues the email to the potential homebuyer, which includes a link
         to their custom signup page.  Does nothing if they are already
         registered.
         """
@@ -169,11 +197,7 @@ class PendingHomebuyer(BaseModel):
             name=self.first_name,
             app_name=app_name,
             signup_link=self._signup_link(request.get_host()))
-        try:
-            send_mail(subject, message, settings.EMAIL_HOST_USER, [self.email],
-                      fail_silently=False)
-        except:
-            return False
+        OutgoingEmail.objects.enqueue(subject, message, self.email)
         return True
 
     class Meta:
@@ -17,6 +17,7 @@ either dev.py or prod.py.
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 import os
 import datetime
+import tempfile
 from os.path import abspath, dirname
 
 BASE_DIR = dirname(dirname(dirname(abspath(__file__))))
@@ -92,14 +93,18 @@ LOGIN_URL = 'signup'
 LOGIN_REDIRECT_URL = 'dashboard'
 
 MIDDLEWARE_CLASSES = (
+    'RealEstate.apps.core.metrics.MetricsMiddleware',
+    'RealEstate.apps.core.querybudget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.auth.middleware.SessionAuthenticationMiddleware',
+    'RealEstate.apps.core.identity.RequestIdentityMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'RealEstate.apps.core.profiling.ProfilerMiddleware',
 )
 
 ROOT_URLCONF = 'RealEstate.urls'
@@ -123,6 +128,118 @@ TEMPLATES = [ {
 
 WSGI_APPLICATION = 'RealEstate.wsgi.application'
 
+# When True, Grade rows are only stored once a homebuyer has scored a
+# house/category; missing rows are read as the default score.  When False,
+# every house/category combination gets a Grade row up front.
+SPARSE_GRADES = False
+
+# Caching
+# https://docs.djangoproject.com/en/1.8/topics/cache/
+#
+# Computed report pages are cached per couple in their own cache so they can
+# be sized and evicted independently of anything else.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'reports': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'reports',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+}
+
+REPORT_CACHE_ALIAS = 'reports'
+
+# Rows per page on the realtor dashboard; further pages are loaded as the
+# realtor scrolls.
+DASHBOARD_PAGE_SIZE = 25
+
+# Emails are queued in the OutgoingEmail table and delivered by the
+# send_queued_email management command.  Failed sends are retried after
+# EMAIL_OUTBOX_RETRY_DELAY seconds, doubling each time, up to
+# EMAIL_OUTBOX_MAX_ATTEMPTS attempts in total.
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = 60
+
+# Login attempts (web and /api/auth/) are limited by token buckets, one per
+# client IP and one per account: (capacity, seconds to refill one token).
+# The cache must be shared between worker processes in production.
+LOGIN_THROTTLE_CACHE_ALIAS = 'default'
+LOGIN_THROTTLE_RATES = {
+    'ip': (20, 15),
+    'account': (5, 60),
+}
+
+# Most queries each view should need per request, keyed by URL name (or view
+# class name for the API).  QueryBudgetMiddleware logs a warning for any
+# request over budget, and QueryBudgetTestMixin fails tests that are.
+QUERY_BUDGETS = {
+    'dashboard': 10,
+    'dashboard-rows': 8,
+    'portfolio': 12,
+    'report': 15,
+    'eval': 12,
+    'categories': 10,
+    'slider-changes': 30,
+    'APIHouseView': 6,
+    'APICategoryView': 5,
+    'APIGradeBatchView': 20,
+    'APISyncView': 8,
+}
+
+# The last slider change applied from each page is remembered this many
+# seconds, so that a late batch from the page cannot undo newer changes.
+SLIDER_PAGE_TTL = 24 * 60 * 60
+
+# /api/sync/ cursors lag this many seconds behind the time of the request, so
+# that rows written by transactions still running then are sent by the next
+# sync (see core/sync.py).  Must be longer than any write transaction.
+SYNC_CURSOR_LAG = 5
+
+# Metrics are kept per process and flushed to a file in METRICS_DIR at most
+# every METRICS_FLUSH_INTERVAL seconds; /metrics/ sums the files of every
+# process, merging those of exited processes into one.  All worker processes
+# (and the send_queued_email worker) must share the directory, on one host.
+METRICS_DIR = os.path.join(tempfile.gettempdir(), 'realestate-metrics')
+METRICS_FLUSH_INTERVAL = 1.0
+
+# Runs the tests with their own METRICS_DIR, see core/testrunner.py.
+TEST_RUNNER = 'RealEstate.apps.core.testrunner.TestRunner'
+
+# Opt-in request profiling, see core/profiling.py.  When enabled, requests
+# are profiled one in PROFILER_SAMPLE_RATE at random (0 for none), and always
+# for the user emails in PROFILER_USERS and paths starting with one of
+# PROFILER_PATHS.  The PROFILER_KEEP slowest profiles per view are kept in
+# PROFILER_DIR and listed at /profiles/.
+PROFILER_ENABLED = False
+PROFILER_SAMPLE_RATE = 0
+PROFILER_USERS = ()
+PROFILER_PATHS = ()
+PROFILER_DIR = os.path.join(tempfile.gettempdir(), 'realestate-profiles')
+PROFILER_KEEP = 20
+
+# Over-budget warnings from QueryBudgetMiddleware go to the console.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'RealEstate.apps.core.querybudget': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+    },
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/1.8/topics/i18n/
 
@@ -23,6 +23,30 @@ DATABASES = {
     }
 }
 
+# The report cache should be shared by every worker process, so that a
+# report computed by one worker is reused by the others.  Entries for old
+# couple versions are dropped when they time out.
+# Create the table with: python manage.py createcachetable
+CACHES['reports'] = {
+    'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+    'LOCATION': 'report_cache',
+    'TIMEOUT': 60 * 60,
+    'OPTIONS': {
+        'MAX_ENTRIES': 1000,
+    },
+}
+
+# Login throttling buckets, shared by every worker process for the same
+# reason.  Created by the same createcachetable command.
+CACHES['throttle'] = {
+    'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+    'LOCATION': 'login_throttle_cache',
+}
+LOGIN_THROTTLE_CACHE_ALIAS = 'throttle'
+
+# Log the query count of every request, not just those over budget.
+LOGGING['loggers']['RealEstate.apps.core.querybudget']['level'] = 'INFO'
+
 PASSWORD_MIN_LENGTH = 8
 PASSWORD_COMPLEXITY = {
     'LOWER': 1,
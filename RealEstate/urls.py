@@ -37,6 +37,13 @@ urlpatterns = [
         CoreViews.EmailConfirmationView.as_view(), name='confirm-email'),
 
     url(r'^dashboard/$', CoreViews.DashboardView.as_view(), name='dashboard'),
+    url(r'^dashboard/(?P<kind>couples|pending)/$',
+        CoreViews.RealtorClientsView.as_view(), name='dashboard-rows'),
+    url(r'^portfolio/$', CoreViews.PortfolioView.as_view(), name='portfolio'),
+    url(r'^export/(?P<kind>grades|weights)/$',
+        CoreViews.ExportView.as_view(), name='export'),
+    url(r'^import/houses/$',
+        CoreViews.HouseImportView.as_view(), name='import-houses'),
     url(r'^homebuyer-signup/(?P<registration_token>[0-9a-f]{64})/$',
         PendingViews.HomebuyerSignupView.as_view(), name='homebuyer-signup'),
     url(r'^eval/(?P<house_id>[\d]+)/$',
@@ -44,4 +51,10 @@ urlpatterns = [
     url(r'^report/(?P<couple_id>[\d]+)/$',
         CoreViews.ReportView.as_view(), name='report'),
     url(r'^categories/$', CoreViews.CategoryView.as_view(), name='categories'),
+    url(r'^slider-changes/$',
+        CoreViews.SliderChangesView.as_view(), name='slider-changes'),
+    url(r'^metrics/$', CoreViews.metrics_view, name='metrics'),
+    url(r'^profiles/$', CoreViews.profiles_view, name='profiles'),
+    url(r'^profiles/(?P<name>[\w.-]+)/$',
+        CoreViews.profile_view, name='profile'),
 ]